@@ -0,0 +1,172 @@
+import numpy as np
+
+from coilCalculator import Coordinate, Path, Straight, ClockwiseArc, CounterClockwiseArc
+from coilGeometry import coordinateTable
+
+#Vectorized geometry for design sweeps over many saddle coils.
+#
+#SaddleCoil builds its corner points one Coordinate at a time. For a sweep over thousands of
+#(h, r, alpha, width, cornerRadius) combinations this is slow, so SaddleCoilBatch evaluates the same
+#expressions on numpy arrays, one column per design. The coordinates come from coilGeometry.coordinateTable, like
+#those of SaddleCoil, and the arithmetic is done in the same order as in SaddleCoil._compute_points and
+#SaddleCoil.generatePathFromPoints, so the results are identical to the scalar class.
+
+#bend sequences as used by SaddleCoil. s: small radius, l: large radius
+BENDS = "sslslllssssssllllssslsls"
+BENDS_LEG = "ssss"
+
+
+class SaddleCoilBatch(object):
+    """Vectorized counterpart of SaddleCoil for many designs at once.
+
+    All parameters accept scalars or 1D arrays, which are broadcast against each other.
+    After construction the following arrays are available (n: number of designs):
+
+    - points: (n, 24, 2) corner points of the first cut (n, 20, 2) for compact coils
+    - points2: (n, 4, 2) corner points of the leg cut
+    - arcStarts, arcStops, arcOffsets: (n, n_points, 2) per cut, the k-th entry belongs to the arc at point k+1
+    - clockwise: (n, n_points) per cut, True where a G2 (clockwise) arc is cut
+    - maxX, maxY: (n,) size of the coil
+
+    The results for design k are identical to SaddleCoil(h[k], r[k], ...)."""
+
+    def __init__(self, h, r, alpha, width, cutterDiameter, gap = 1, legLength = 10, cornerRadius = 0.5, compact = False):
+        """Compute the corner points and arcs of all designs. The parameters are those of SaddleCoil.__init__,
+        only compact has to be a single value for the whole batch, since it changes the number of points."""
+        h, r, alpha, width, cutterDiameter, gap, legLength, cornerRadius = [np.atleast_1d(np.asarray(p, dtype = float)) for p in
+                                                                              np.broadcast_arrays(h, r, alpha, width, cutterDiameter, gap, legLength, cornerRadius)]
+
+        assert np.all(cornerRadius >= cutterDiameter), "Corner Radius required to be greater / equal cutter Diameter."
+
+        self.h = h
+        self.r = r
+        self.alpha = alpha
+        self.width = width
+        self.cD = cutterDiameter
+        self.gap = gap
+        self.legLength = legLength
+        self.cornerRadius = cornerRadius
+        self.compact = compact
+
+        t = coordinateTable(h, r, alpha, width, cutterDiameter)
+        cD2 = t["cD2"]
+        w2 = t["w2"]
+
+        self.radii = {"s" : cornerRadius - cD2, "l" : cornerRadius + cD2}
+
+        yOuterBottom = t["yOuterBottom"]
+        yOuterTop = t["yOuterTop"]
+        yInnerBottom = t["yInnerBottom"]
+        yInnerTop = t["yInnerTop"]
+
+        x0 = t["x180"] - 3*w2 - 3*cD2 - gap
+        y0 = yOuterBottom - legLength
+        y1 = y0 + (legLength - gap - 2*w2 - 2*cD2)
+        x2 = t["xAlpha"] - 3*w2 - 3*cD2 - gap
+
+        #same numbering as in the drawing in SaddleCoil.__init__
+        x = [x0, x0, x2, x2,
+             t["xOuterLeft_Left"], t["xOuterLeft_Left"], t["xOuterLeft_Right"], t["xOuterLeft_Right"],
+             t["xInnerRight_Right"], t["xInnerRight_Right"], t["xInnerRight_Left"], t["xInnerRight_Left"],
+             t["xOuterRight_Left"], t["xOuterRight_Left"], t["xOuterRight_Right"], t["xOuterRight_Right"],
+             t["xInnerLeft_Right"], t["xInnerLeft_Right"], t["xInnerLeft_Left"], t["xInnerLeft_Left"],
+             t["xInnerLeft_Right"] - gap, t["xInnerLeft_Right"] - gap, x0 + 2*w2 + 2*cD2, x0 + (2*w2 + 2*cD2)]
+        y = [y0, y1, y1, yOuterBottom,
+             yOuterBottom, yOuterTop, yOuterTop, yInnerBottom,
+             yInnerBottom, yInnerTop, yInnerTop, yInnerBottom + gap,
+             yInnerBottom + gap, yOuterTop, yOuterTop, yOuterBottom,
+             yOuterBottom, yInnerTop, yInnerTop, yInnerBottom,
+             yInnerBottom, yOuterBottom - gap, yOuterBottom - gap, y0]
+
+        points = np.empty((len(h), len(x), 2))
+        for i in range(len(x)):
+            points[:, i, 0] = x[i]
+            points[:, i, 1] = y[i]
+
+        bends = BENDS
+        if compact == True:
+            points[:, 2, 0] = points[:, 5, 0]
+            points[:, 21, 0] = points[:, 18, 0]
+
+            points = np.delete(points, [3, 4, 19, 20], axis = 1)
+            bends = bends[:3] + bends[5:19] + bends[21:]
+
+        xL = t["xOuterRight_Left"]
+        yL = yOuterBottom - 2*cD2 - gap
+        points2 = np.empty((len(h), 4, 2))
+        points2[:, 0, 0] = xL
+        points2[:, 0, 1] = yL
+        points2[:, 1, 0] = xL + (legLength + 2*w2 + gap + cD2)
+        points2[:, 1, 1] = yL
+        points2[:, 2, 0] = points2[:, 1, 0]
+        points2[:, 2, 1] = yL + (-2*w2 - 2*cD2)
+        points2[:, 3, 0] = xL
+        points2[:, 3, 1] = yL + (-2*w2 - 2*cD2)
+
+        minX = np.minimum(points[:, :, 0].min(axis = 1), points2[:, :, 0].min(axis = 1))
+        minY = np.minimum(points[:, :, 1].min(axis = 1), points2[:, :, 1].min(axis = 1))
+
+        #shift points so that all cuts have x,y>0.
+        shift = np.empty((len(h), 1, 2))
+        shift[:, 0, 0] = minX - cD2
+        shift[:, 0, 1] = minY - cD2
+        points = points - shift
+        points2 = points2 - shift
+
+        self.points = points
+        self.points2 = points2
+        self.bends = bends
+        self.bends_leg = BENDS_LEG
+
+        self.arcStarts, self.arcStops, self.arcOffsets, self.clockwise = self.arcsFromPoints(points, bends)
+        self.arcStarts2, self.arcStops2, self.arcOffsets2, self.clockwise2 = self.arcsFromPoints(points2, BENDS_LEG)
+
+        self.maxX = np.maximum(points[:, :, 0].max(axis = 1), points2[:, :, 0].max(axis = 1))
+        self.maxY = np.maximum(points[:, :, 1].max(axis = 1), points2[:, :, 1].max(axis = 1))
+
+    def __len__(self):
+        return self.points.shape[0]
+
+    def arcsFromPoints(self, points, bends):
+        """Vectorized version of SaddleCoil.generatePathFromPoints.
+
+        Returns arcStarts, arcStops, arcOffsets and clockwise for a (n, n_points, 2) array of closed paths."""
+        thisPoint = np.roll(points, -1, axis = 1)
+        nextPoint = np.roll(points, -2, axis = 1)
+
+        direction = thisPoint - points
+        direction = direction/np.sqrt(direction[:, :, 0]**2 + direction[:, :, 1]**2)[:, :, np.newaxis]
+
+        direction2 = nextPoint - thisPoint
+        direction2 = direction2/np.sqrt(direction2[:, :, 0]**2 + direction2[:, :, 1]**2)[:, :, np.newaxis]
+
+        #radius of the arc at thisPoint, i.e. at point k+1 for segment k
+        radius = np.empty(points.shape[:2])
+        for k in range(points.shape[1]):
+            radius[:, k] = self.radii[bends[(k + 1) % len(bends)]]
+        radius = radius[:, :, np.newaxis]
+
+        arcStarts = thisPoint - direction*radius
+        arcStops = thisPoint + direction2*radius
+        arcOffsets = direction2*radius
+
+        clockwise = np.logical_not(direction[:, :, 0]*direction2[:, :, 1] - direction[:, :, 1]*direction2[:, :, 0] > 0)
+
+        return arcStarts, arcStops, arcOffsets, clockwise
+
+    def cuts(self, k):
+        """Return the cuts of design k as a list of Path objects, as in SaddleCoil.cuts."""
+        return [self._path(self.points[k], self.arcStarts[k], self.arcStops[k], self.arcOffsets[k], self.clockwise[k]),
+                self._path(self.points2[k], self.arcStarts2[k], self.arcStops2[k], self.arcOffsets2[k], self.clockwise2[k])]
+
+    def _path(self, points, arcStarts, arcStops, arcOffsets, clockwise):
+        cut = Path(Coordinate(float(points[0, 0]), float(points[0, 1])))
+        for i in range(len(points)):
+            cut.path.append(Straight(Coordinate(float(arcStarts[i, 0]), float(arcStarts[i, 1]))))
+
+            arcStop = Coordinate(float(arcStops[i, 0]), float(arcStops[i, 1]))
+            if clockwise[i]:
+                cut.path.append(ClockwiseArc(arcStop, float(arcOffsets[i, 0]), float(arcOffsets[i, 1])))
+            else:
+                cut.path.append(CounterClockwiseArc(arcStop, float(arcOffsets[i, 0]), float(arcOffsets[i, 1])))
+        return cut
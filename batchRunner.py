@@ -0,0 +1,229 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+
+import profiler
+from coilCalculator import SaddleCoil
+from toolpath import Toolpath
+
+#Run many SaddleCoil jobs from a CSV or JSON spec file on a process pool.
+#
+#Every spec holds the constructor arguments of SaddleCoil plus the output options:
+#
+#  name, h, r, alpha, width, cutterDiameter, gap, legLength, cornerRadius, compact, feed, gcode, tikz, scale, includePoints
+#
+#Only h, r, alpha, width and cutterDiameter are required. gcode and tikz are the output file names,
+#they default to <name>.txt and <name>.tex. Set them to an empty string to skip that output.
+#A failing job (e.g. cornerRadius < cutterDiameter, or a row with h = abc) is recorded in the manifest and does not
+#stop the others.
+#
+#Example:
+#  python batchRunner.py coils.csv --output-dir out --processes 8
+
+COIL_ARGUMENTS = ["h", "r", "alpha", "width", "cutterDiameter", "gap", "legLength", "cornerRadius", "compact"]
+FLOAT_OPTIONS = ["feed", "scale"]
+BOOL_OPTIONS = ["compact", "includePoints"]
+
+
+def parseBool(value):
+    if isinstance(value, basestring):
+        return value.strip().lower() in ("1", "true", "yes", "y")
+    return bool(value)
+
+
+def normalizeSpec(spec, index):
+    """Convert a spec as read from CSV or JSON into typed values and fill in the defaults."""
+    spec = dict((k.strip(), v) for k, v in spec.items() if v is not None and k is not None)
+
+    for k in COIL_ARGUMENTS + FLOAT_OPTIONS:
+        if k in spec and k not in BOOL_OPTIONS:
+            if isinstance(spec[k], basestring) and spec[k].strip() == "":
+                del spec[k]
+            else:
+                try:
+                    spec[k] = float(spec[k])
+                except (TypeError, ValueError):
+                    raise ValueError("{0} = {1!r} is not a number".format(k, spec[k]))
+
+    for k in BOOL_OPTIONS:
+        if k in spec:
+            spec[k] = parseBool(spec[k])
+
+    spec.setdefault("name", "coil{0}".format(index))
+    spec.setdefault("gcode", spec["name"] + ".txt")
+    spec.setdefault("tikz", spec["name"] + ".tex")
+    return spec
+
+
+def invalidSpec(spec, index, error):
+    """Return the spec of a row that could not be read. runJob records it as a failed job."""
+    name = spec.get("name") if isinstance(spec, dict) else None
+    if not isinstance(name, basestring) or not name.strip():
+        name = "coil{0}".format(index)
+    return {"name" : name.strip(), "error" : "{0}: {1}".format(type(error).__name__, error)}
+
+
+def readSpecs(filename):
+    """Read a list of coil specs from a .csv or .json file.
+
+    A row that cannot be converted (e.g. h = abc) does not stop the others, it is returned as a spec with only name
+    and error, see invalidSpec."""
+    if filename.lower().endswith(".json"):
+        f = open(filename)
+        specs = json.load(f)
+        f.close()
+    else:
+        f = open(filename, "rb")
+        specs = list(csv.DictReader(f))
+        f.close()
+
+    result = []
+    for i, s in enumerate(specs):
+        try:
+            result.append(normalizeSpec(s, i))
+        except Exception as e:
+            result.append(invalidSpec(s, i, e))
+    return result
+
+
+def runJob(job):
+    """Generate G-Code and TikZ for one spec. Returns the manifest entry of the job.
+
+    job is a tuple (index, spec, outputDir, profile), so that the function can be used with Pool.imap_unordered.
+    With profile = True the entry holds the profiler report of the job."""
+    index, spec, outputDir, profile = job
+    entry = {"index" : index, "name" : spec["name"], "timings" : {}}
+    if "error" in spec:
+        entry.update({"status" : "error", "error" : spec["error"]})
+        entry["timings"]["total"] = 0.
+        if profile:
+            entry["profile"] = {"timers" : {}, "counters" : {}}
+        return entry
+
+    wasEnabled = profiler.enabled
+    if profile:
+        profiler.reset()
+        profiler.enable()
+
+    start = time.time()
+    stdout = sys.stdout
+    try:
+        #generateTikzCode prints the code, keep the worker output clean
+        sys.stdout = open(os.devnull, "w")
+
+        t = time.time()
+        coil = SaddleCoil(**dict((k, spec[k]) for k in COIL_ARGUMENTS if k in spec))
+        entry["timings"]["geometry"] = time.time() - t
+
+        entry["maxX"] = coil.maxX
+        entry["maxY"] = coil.maxY
+        entry["pathLength"] = sum(Toolpath.fromPath(p).length() for p in coil.cuts)
+
+        if spec["gcode"]:
+            t = time.time()
+            entry["gcode"] = os.path.join(outputDir, spec["gcode"])
+            coil.generateGCode(feed = spec.get("feed", 7.5), filename = entry["gcode"])
+            entry["timings"]["gcode"] = time.time() - t
+
+        if spec["tikz"]:
+            t = time.time()
+            entry["tikz"] = os.path.join(outputDir, spec["tikz"])
+            coil.generateTikzCode(filename = entry["tikz"], scale = spec.get("scale", 1), includePoints = spec.get("includePoints", False))
+            entry["timings"]["tikz"] = time.time() - t
+
+        entry["status"] = "ok"
+    except Exception as e:
+        entry["status"] = "error"
+        entry["error"] = "{0}: {1}".format(type(e).__name__, e)
+        entry["traceback"] = traceback.format_exc()
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    entry["timings"]["total"] = time.time() - start
+
+    if profile:
+        entry["profile"] = profiler.report()
+        if not wasEnabled:
+            profiler.disable()
+    return entry
+
+
+def runBatch(specs, outputDir = ".", processes = None, manifest = "manifest.json", profile = False):
+    """Run all specs on a pool of processes and write the manifest.
+
+    - specs: list of spec dictionaries, see readSpecs
+    - outputDir: directory for the generated files
+    - processes: number of worker processes, defaults to the number of cores
+    - manifest: file name of the manifest, relative to outputDir. Pass an empty string to skip writing it.
+    - profile: record the stages of every job with the profiler, the sum is stored as "profile" in the manifest
+
+    Returns the manifest as a dictionary."""
+    if not os.path.isdir(outputDir):
+        os.makedirs(outputDir)
+
+    jobs = [(i, s, outputDir, profile) for i, s in enumerate(specs)]
+
+    start = time.time()
+    if processes == 1:
+        entries = [runJob(j) for j in jobs]
+    else:
+        pool = multiprocessing.Pool(processes)
+        #jobs take a few ms each, hand them out in chunks to keep the inter process overhead small
+        chunksize = max(1, len(jobs)//(4*(processes or multiprocessing.cpu_count())))
+        try:
+            entries = list(pool.imap_unordered(runJob, jobs, chunksize))
+        finally:
+            pool.close()
+            pool.join()
+    wallTime = time.time() - start
+
+    entries.sort(key = lambda e: e["index"])
+
+    result = {"jobs" : entries,
+              "succeeded" : sum(1 for e in entries if e["status"] == "ok"),
+              "failed" : sum(1 for e in entries if e["status"] != "ok"),
+              "processes" : processes or multiprocessing.cpu_count(),
+              "wallTime" : wallTime,
+              "cpuTime" : sum(e["timings"]["total"] for e in entries)}
+    if profile:
+        result["profile"] = profiler.merge([e.pop("profile") for e in entries])
+
+    if manifest:
+        f = open(os.path.join(outputDir, manifest), "w")
+        json.dump(result, f, indent = 2, sort_keys = True)
+        f.close()
+
+    return result
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Generate G-Code and TikZ files for many saddle coils.")
+    parser.add_argument("specs", help = "CSV or JSON file with one coil spec per row / entry")
+    parser.add_argument("--output-dir", default = ".", help = "directory for the generated files")
+    parser.add_argument("--processes", type = int, default = None, help = "number of worker processes, defaults to the number of cores")
+    parser.add_argument("--manifest", default = "manifest.json", help = "file name of the manifest, relative to the output directory")
+    parser.add_argument("--profile", action = "store_true", help = "print the time spent in every stage, summed over all jobs")
+    args = parser.parse_args(argv)
+
+    result = runBatch(readSpecs(args.specs), args.output_dir, args.processes, args.manifest, args.profile)
+
+    print "{0} jobs ok, {1} failed in {2:.2f} s".format(result["succeeded"], result["failed"], result["wallTime"])
+    for e in result["jobs"]:
+        if e["status"] != "ok":
+            print "  {0}: {1}".format(e["name"], e["error"])
+
+    if args.profile:
+        print
+        print profiler.formatReport(result["profile"])
+
+    return 1 if result["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import profiler
+from coilCalculator import SaddleCoil
+
+#Reproducible benchmarks of the coil generator.
+#
+#For the three coils of coilCalculator.py (standardCoil, compactCoil and innerCoilWireCutter) the single coil latency
+#(construction and G-Code, best and median of several repeats) and the batch throughput (coils per second on a process
+#pool) are measured. Before anything is timed the G-Code of every coil is compared with its reference: the committed
+#standardCoil.txt and compactCoil.txt, and a SHA-1 of the G-Code of innerCoilWireCutter. An optimization that changes a
+#toolpath makes the benchmark fail with exit code 1.
+#
+#Example:
+#  python benchmark.py --repeats 50 --batch 200 --processes 4 --profile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+#name -> (arguments, keyword arguments, feed, reference file or SHA-1 of the G-Code)
+CONFIGS = [("standardCoil", (12, 6, 120, 2.5, 1), {"cornerRadius" : 1}, 7.5, "standardCoil.txt"),
+           ("compactCoil", (8, 2.05, 100, 1.5, 1), {"cornerRadius" : 1, "compact" : True}, 7.5, "compactCoil.txt"),
+           ("innerCoilWireCutter", (11, 7.5, 120, 3, 0), {"cornerRadius" : 1, "legLength" : 35, "compact" : False}, 3.5,
+            "24b1be16b79a0465526e72406ac954eba957018c")]
+
+
+def build(config):
+    """Construct the coil of a config and return its G-Code."""
+    name, args, kwargs, feed, reference = config
+    return SaddleCoil(*args, **kwargs).gCode(feed)
+
+
+def verify(config):
+    """Return None if the G-Code of a config matches its reference, otherwise a description of the difference."""
+    name, args, kwargs, feed, reference = config
+    code = build(config)
+    if reference.endswith(".txt"):
+        f = open(os.path.join(HERE, reference))
+        expected = f.read()
+        f.close()
+        if code != expected:
+            lines = code.splitlines()
+            expectedLines = expected.splitlines()
+            for n, (a, b) in enumerate(zip(lines, expectedLines)):
+                if a != b:
+                    return "{0} differs from {1} in line {2}: {3!r} != {4!r}".format(name, reference, n + 1, a, b)
+            return "{0} has {1} lines, {2} has {3}".format(name, len(lines), reference, len(expectedLines))
+    elif hashlib.sha1(code).hexdigest() != reference:
+        return "{0}: SHA-1 {1} != {2}".format(name, hashlib.sha1(code).hexdigest(), reference)
+    return None
+
+
+def latency(config, repeats = 20):
+    """Time construction and G-Code of one coil. Returns a dictionary with best and median in seconds."""
+    times = []
+    for k in range(repeats):
+        start = time.time()
+        build(config)
+        times.append(time.time() - start)
+    times.sort()
+    return {"best" : times[0], "median" : times[len(times)//2], "repeats" : repeats}
+
+
+def _buildLength(config):
+    return len(build(config))
+
+
+def throughput(config, count = 100, processes = None):
+    """Build count copies of a coil on a process pool (in this process for processes = 1). Returns coils per second."""
+    configs = [config]*count
+    start = time.time()
+    if processes == 1:
+        map(_buildLength, configs)
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            pool.map(_buildLength, configs, max(1, count//(4*(processes or multiprocessing.cpu_count()))))
+        finally:
+            pool.close()
+            pool.join()
+    elapsed = time.time() - start
+    return {"coilsPerSecond" : count/elapsed, "count" : count, "time" : elapsed}
+
+
+def run(repeats = 20, batch = 100, processes = None, profile = False):
+    """Verify and benchmark all configs. Returns a dictionary with ok, errors, results and, if profile is set, the
+    profiler report of the latency runs."""
+    errors = [e for e in (verify(c) for c in CONFIGS) if e]
+    result = {"ok" : not errors, "errors" : errors, "results" : {}}
+    if errors:
+        return result
+
+    if profile:
+        profiler.reset()
+        profiler.enable()
+    for config in CONFIGS:
+        result["results"][config[0]] = {"latency" : latency(config, repeats)}
+    if profile:
+        profiler.disable()
+        result["profile"] = profiler.report()
+
+    if batch:
+        for config in CONFIGS:
+            result["results"][config[0]]["throughput"] = throughput(config, batch, processes)
+    return result
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Check and benchmark the coil generator.")
+    parser.add_argument("--repeats", type = int, default = 20, help = "repeats of the single coil latency measurement")
+    parser.add_argument("--batch", type = int, default = 100, help = "coils per throughput measurement, 0 to skip it")
+    parser.add_argument("--processes", type = int, default = None, help = "worker processes, defaults to one per CPU")
+    parser.add_argument("--json", action = "store_true", help = "print the results as JSON")
+    parser.add_argument("--profile", action = "store_true", help = "print the time spent in every stage during the latency runs")
+    args = parser.parse_args(argv)
+
+    result = run(args.repeats, args.batch, args.processes, args.profile)
+
+    if args.json:
+        print json.dumps(result, indent = 2, sort_keys = True)
+    elif not result["ok"]:
+        print "Output does not match the references:"
+        for e in result["errors"]:
+            print "  " + e
+    else:
+        print "{0:<22} {1:>12} {2:>12} {3:>12}".format("coil", "best ms", "median ms", "coils/s")
+        for config in CONFIGS:
+            r = result["results"][config[0]]
+            print "{0:<22} {1:>12.3f} {2:>12.3f} {3:>12}".format(config[0], 1e3*r["latency"]["best"], 1e3*r["latency"]["median"],
+                                                                 "{0:.1f}".format(r["throughput"]["coilsPerSecond"]) if "throughput" in r else "-")
+        if args.profile:
+            print
+            print profiler.formatReport(result["profile"])
+
+    return 0 if result["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,383 @@
+import numpy as np
+
+from coilCalculator import SaddleCoil
+from toolpath import Toolpath, STRAIGHT, COUNTERCLOCKWISE, SEGMENT
+
+#Check generated cut paths for traces that are too narrow, gaps that are too small and cuts that run into each other.
+#
+#All straight and arc segments are sampled at a fixed step. A uniform grid with cells of the size of the search
+#radius gives the candidate pairs of samples, so the cost grows linearly with the length of the cuts.
+#Pairs of samples that are neighbours along the same cut are not compared. For all other pairs the distance d of
+#the cutter centers is measured:
+#
+#- the closed cuts of a SaddleCoil enclose the copper of the coil. If both samples see each other on the inner
+#  side of their cut, the copper between the two cuts is a trace of width d - cutterDiameter.
+#- otherwise, the two traces on the outer sides of the cuts are separated by a gap of d + cutterDiameter.
+#- pairs with d close to zero are places where the cuts cross or touch each other.
+#
+#The lines of a SimpleSaddleCoil are open cuts that meet at their ends. They are joined into chains. Without an
+#inside, only the copper left between two cuts, d - cutterDiameter, is reported as clearance. Clearances between
+#zero (the kerfs merge) and minTraceWidth are reported as slivers.
+#
+#Example:
+#  report = checkCoil(SaddleCoil(8, 2.05, 100, 1.5, 1, cornerRadius = 1))
+#  print report["traceWidth"], report["gap"]
+#  if not report["ok"]:
+#      for v in report["violations"]:
+#          print v["type"], v["value"], v["points"]
+
+
+def samplePath(toolpath, step):
+    """Sample a Toolpath at (at most) the given step.
+
+    Returns the (n, 2) sample positions, the (n, 2) unit tangents, the index of the segment of every sample,
+    the distance of every sample along the path and the total length of the path."""
+    s = toolpath.segments
+    start = toolpath.startPoints()
+    end = np.column_stack([s["x"], s["y"]])
+
+    arc = s["kind"] != STRAIGHT
+    center = start + np.column_stack([s["i"], s["j"]])
+    radius = np.sqrt(s["i"]**2 + s["j"]**2)
+    angle0 = np.arctan2(start[:, 1] - center[:, 1], start[:, 0] - center[:, 0])
+    angle1 = np.arctan2(end[:, 1] - center[:, 1], end[:, 0] - center[:, 0])
+    direction = np.where(s["kind"] == COUNTERCLOCKWISE, 1., -1.)
+    sweep = (direction*(angle1 - angle0)) % (2*np.pi)
+
+    chord = np.sqrt(np.sum((end - start)**2, axis = 1))
+    length = np.where(arc, radius*sweep, chord)
+
+    count = np.maximum(1, np.ceil(length/step).astype(int))
+    segment = np.repeat(np.arange(len(s)), count)
+    #position of every sample within its segment, from 0 to just before 1
+    first = np.cumsum(count) - count
+    u = (np.arange(count.sum()) - np.repeat(first, count))/np.repeat(count, count).astype(float)
+
+    straight = ~arc[segment]
+    points = np.empty((len(segment), 2))
+    points[straight] = start[segment[straight]] + u[straight, np.newaxis]*(end - start)[segment[straight]]
+    a = segment[~straight]
+    phi = angle0[a] + direction[a]*u[~straight]*sweep[a]
+    points[~straight, 0] = center[a, 0] + radius[a]*np.cos(phi)
+    points[~straight, 1] = center[a, 1] + radius[a]*np.sin(phi)
+
+    tangents = np.empty_like(points)
+    tangents[straight] = ((end - start)/np.maximum(chord, 1e-12)[:, np.newaxis])[segment[straight]]
+    tangents[~straight, 0] = -direction[a]*np.sin(phi)
+    tangents[~straight, 1] = direction[a]*np.cos(phi)
+
+    along = (np.cumsum(length) - length)[segment] + u*length[segment]
+    total = length.sum()
+
+    overlap = closure(toolpath)
+    if overlap is not None:
+        #the cuts of a SaddleCoil start at a corner point and end on their first straight segment,
+        #the retraced piece is left out so that the samples form one loop
+        keep = along >= overlap - 1e-9
+        points, tangents, segment, along = points[keep], tangents[keep], segment[keep], along[keep] - overlap
+        total -= overlap
+    else:
+        #open paths also need their end point
+        points = np.vstack([points, end[-1:]])
+        tangents = np.vstack([tangents, tangents[-1:]])
+        segment = np.append(segment, len(s) - 1)
+        along = np.append(along, total)
+
+    return points, tangents, segment, along, total
+
+
+def closure(toolpath, tolerance = 1e-9):
+    """Return None for an open Toolpath. A closed one ends on its start point or on its first straight segment,
+    the distance of its end point from the start along that segment is returned."""
+    s = toolpath.segments
+    if len(s) == 0:
+        return None
+    x0, y0 = toolpath.p0
+    dx = s["x"][-1] - x0
+    dy = s["y"][-1] - y0
+    if abs(dx) < tolerance and abs(dy) < tolerance:
+        return 0.
+    if len(s) < 2 or s["kind"][0] != STRAIGHT:
+        return None
+    ux = s["x"][0] - x0
+    uy = s["y"][0] - y0
+    length = np.sqrt(ux**2 + uy**2)
+    if length == 0 or abs(dx*uy - dy*ux)/length > tolerance:
+        return None
+    t = (dx*ux + dy*uy)/length
+    return t if 0 <= t <= length else None
+
+
+def isClosed(toolpath):
+    return closure(toolpath) is not None
+
+
+def _orientation(points):
+    """Return 1 for a counterclockwise closed polygon, -1 for a clockwise one."""
+    x = points[:, 0]
+    y = points[:, 1]
+    return 1. if np.sum(x*np.roll(y, -1) - np.roll(x, -1)*y) > 0 else -1.
+
+
+def _neighbourPairs(points, radius):
+    """Return the index arrays i, j and the distances of all pairs of points closer than radius, using a uniform grid."""
+    cell = np.floor(points/radius).astype(np.int64)
+    cell -= cell.min(axis = 0)
+    width = cell[:, 1].max() + 3
+    key = cell[:, 0]*width + cell[:, 1]
+    order = np.argsort(key, kind = "mergesort")
+    sortedKeys = key[order]
+
+    pairsI = []
+    pairsJ = []
+    #every pair of neighbouring cells is visited once: the cell itself and four of its eight neighbours
+    for ox, oy in ((0, 0), (0, 1), (1, -1), (1, 0), (1, 1)):
+        neighbour = key + ox*width + oy
+        lo = np.searchsorted(sortedKeys, neighbour, "left")
+        hi = np.searchsorted(sortedKeys, neighbour, "right")
+        counts = hi - lo
+        total = counts.sum()
+        if total == 0:
+            continue
+        i = np.repeat(np.arange(len(points)), counts)
+        offset = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        j = order[np.repeat(lo, counts) + offset]
+        keep = i < j if ox == oy == 0 else slice(None)
+        pairsI.append(i[keep])
+        pairsJ.append(j[keep])
+
+    i = np.concatenate(pairsI) if pairsI else np.zeros(0, dtype = int)
+    j = np.concatenate(pairsJ) if pairsJ else np.zeros(0, dtype = int)
+    d = np.sqrt(np.sum((points[i] - points[j])**2, axis = 1))
+    close = d < radius
+    return i[close], j[close], d[close]
+
+
+def checkToolpaths(toolpaths, cutterDiameter, labels, minTraceWidth = 0, minGap = 0, step = 0.2, searchRadius = None,
+                   intersectionTolerance = None, adjacency = 2., facingTolerance = 0.5, junctionTolerance = 1e-6,
+                   mergeTolerance = 0.01):
+    """Check a list of Toolpaths.
+
+    - cutterDiameter: diameter of the tool
+    - labels: function (path index, segment index, sample point) -> label, used to name the places of violations
+    - minTraceWidth: traces narrower than this are violations
+    - minGap: gaps smaller than this are violations
+    - step: sample distance in mm
+    - searchRadius: largest cutter center distance that is compared, defaults to 3 cutter diameters plus 3 mm
+    - intersectionTolerance: cutter centers closer than this are reported as crossing cuts, defaults to step
+    - adjacency: samples of one cut are neighbours if their distance along the cut is less than adjacency times their distance
+    - facingTolerance: two samples are only compared if the cosine of the angle between the cut and the line
+      connecting them is below this value at both samples
+    - junctionTolerance: open cuts whose end lies on another cut within this distance are joined there
+    - mergeTolerance: open cuts only, two cuts that come closer than cutterDiameter + mergeTolerance somewhere
+      cut away all the copper between them
+
+    Returns a report dictionary, see checkCoil."""
+    if searchRadius is None:
+        searchRadius = 3*cutterDiameter + 3
+    if intersectionTolerance is None:
+        intersectionTolerance = step
+
+    samples = [samplePath(t, step) for t in toolpaths]
+    closed = [isClosed(t) for t in toolpaths]
+
+    points = np.vstack([sample[0] for sample in samples])
+    path = np.concatenate([np.full(len(sample[0]), n, dtype = int) for n, sample in enumerate(samples)])
+    along = np.concatenate([sample[3] for sample in samples])
+    totals = np.array([sample[4] for sample in samples])
+
+    #normals pointing to the inside of closed cuts
+    tangents = np.vstack([sample[1] for sample in samples])
+    normals = tangents[:, ::-1]*np.array([-1., 1.])
+    for n, sample in enumerate(samples):
+        normals[path == n] *= _orientation(sample[0]) if closed[n] else 0.
+    isClosedPath = np.array(closed)
+
+    i, j, d = _neighbourPairs(points, searchRadius)
+
+    #samples that follow each other along the same cut are not compared
+    same = path[i] == path[j]
+    separation = np.abs(along[i] - along[j])
+    separation = np.where(same & isClosedPath[path[i]], np.minimum(separation, totals[path[i]] - separation), separation)
+    adjacent = same & (separation <= adjacency*d)
+    #the narrowest place between two smooth cuts is measured across both of them. Pairs that do not face
+    #each other, e.g. close to the tip of an acute corner or diagonally across a corner, are skipped
+    direction = (points[j] - points[i])/np.maximum(d, 1e-12)[:, np.newaxis]
+    facing = np.maximum(np.abs(np.sum(tangents[i]*direction, axis = 1)), np.abs(np.sum(tangents[j]*direction, axis = 1))) <= facingTolerance
+    adjacent |= ~facing & (d >= intersectionTolerance)
+
+    #open cuts that end on another cut are connected there, e.g. the lines of a SimpleSaddleCoil
+    for n, t in enumerate(toolpaths):
+        if closed[n]:
+            continue
+        for endAlong, endPoint in ((0., np.array(t.p0)), (totals[n], np.array([t.segments["x"][-1], t.segments["y"][-1]]))):
+            distance = np.sqrt(np.sum((points - endPoint)**2, axis = 1))
+            #an end can also meet its own cut further along, as in the first chain of a SimpleSaddleCoil
+            touching = (distance < step) & ((path != n) | (np.abs(along - endAlong) > 2*step))
+            for other in np.unique(path[touching]):
+                #along the first cut to its end, then straight to the sample of the other cut
+                for a, b in ((i, j), (j, i)):
+                    onPair = (path[a] == n) & (path[b] == other)
+                    viaJunction = np.abs(along[a] - endAlong) + np.sqrt(np.sum((points[b] - endPoint)**2, axis = 1))
+                    adjacent |= onPair & (viaJunction <= adjacency*d + junctionTolerance)
+
+    i = i[~adjacent]
+    j = j[~adjacent]
+    d = d[~adjacent]
+
+    midpoints = (points[i] + points[j])/2.
+    #the copper between two cuts belongs to the coil if both cuts see the other one on their inner side
+    v = points[j] - points[i]
+    inside = (np.sum(v*normals[i], axis = 1) > 0) & (np.sum(v*normals[j], axis = 1) < 0)
+
+    report = {"violations" : [], "intersections" : []}
+
+    def label(index):
+        n = path[index]
+        first = np.searchsorted(path, n)
+        return labels(n, samples[n][2][index - first], points[index])
+
+    def pairLabel(k):
+        return label(min(i[k], j[k])), label(max(i[k], j[k]))
+
+    def describe(kind, values, mask, threshold, measure, ignoreBelow = None):
+        candidates = np.nonzero(mask)[0]
+        #the smallest value per pair of labels below the threshold
+        worst = {}
+        for k in candidates[values[candidates] < threshold]:
+            key = pairLabel(k)
+            if key not in worst or values[k] < values[worst[key]]:
+                worst[key] = k
+        if ignoreBelow is not None:
+            worst = dict((key, k) for key, k in worst.items() if values[k] > ignoreBelow)
+            if len(worst) == 0:
+                candidates = candidates[values[candidates] >= threshold]
+        ordered = sorted(worst.items(), key = lambda item: values[item[1]])
+
+        if ordered:
+            key, k = ordered[0]
+        elif len(candidates):
+            k = candidates[np.argmin(values[candidates])]
+            key = pairLabel(k)
+        else:
+            report[kind] = None
+            report[kind + "At"] = None
+            return
+        report[kind] = float(values[k])
+        report[kind + "At"] = {"points" : key, "location" : tuple(float(v) for v in midpoints[k])}
+
+        for key, k in ordered:
+            report["violations"].append({"type" : measure, "value" : float(values[k]), "points" : key,
+                                         "location" : tuple(float(v) for v in midpoints[k])})
+
+    crossing = d < intersectionTolerance
+    hasClosed = any(closed)
+    if hasClosed:
+        describe("traceWidth", d - cutterDiameter, inside & ~crossing, minTraceWidth, "trace")
+        describe("gap", d + cutterDiameter, ~inside & ~crossing, minGap, "gap")
+    else:
+        #without an inside, every strip of copper narrower than minTraceWidth is suspicious. Where the kerfs of
+        #two cuts merge, nothing is left between them.
+        clearance = d - cutterDiameter
+        describe("clearance", clearance, ~crossing, minTraceWidth, "sliver", ignoreBelow = mergeTolerance)
+
+    seen = set()
+    for k in np.nonzero(crossing)[0]:
+        key = pairLabel(k)
+        if key not in seen:
+            seen.add(key)
+            report["intersections"].append({"points" : key, "location" : tuple(float(v) for v in midpoints[k])})
+            report["violations"].append({"type" : "intersection", "value" : float(d[k]), "points" : key,
+                                         "location" : tuple(float(v) for v in midpoints[k])})
+
+    report["ok"] = len(report["violations"]) == 0
+    return report
+
+
+def _saddleCoilLabels(corners):
+    """Return a label function for the cuts of a SaddleCoil, naming every sample after the closest corner point."""
+    prefixes = ["", "l"]
+
+    def labels(n, segment, point):
+        c = corners[n]
+        k = segment//2
+        #segment 2k runs from corner k to corner k+1, segment 2k + 1 is the arc at corner k+1
+        a = c[k % len(c)]
+        b = c[(k + 1) % len(c)]
+        if segment % 2 == 1 or np.sum((point - b)**2) < np.sum((point - a)**2):
+            return prefixes[n] + str((k + 1) % len(c))
+        return prefixes[n] + str(k % len(c))
+    return labels
+
+
+def checkCoil(coil, minTraceWidth = None, minGap = 0, step = 0.2, **options):
+    """Check a SaddleCoil or SimpleSaddleCoil.
+
+    - minTraceWidth: defaults to 90 % of the trace width of the coil
+    - minGap: smallest allowed distance between two traces, defaults to 0
+    - step and further options: see checkToolpaths. The search radius defaults to 1.25 times the
+      width of a trace plus the cutter diameter.
+
+    Returns a dictionary with
+    - ok: True if there are no violations
+    - traceWidth, traceWidthAt: narrowest trace and the points and location where it is found
+    - gap, gapAt: smallest gap between traces (SaddleCoil only)
+    - clearance, clearanceAt: narrowest strip of copper left between two cuts (SimpleSaddleCoil only)
+    - intersections: places where cuts cross or touch
+    - violations: list of dictionaries with type ("trace", "gap", "sliver" or "intersection"), value, points and location
+
+    Points are named like in the drawing in SaddleCoil.__init__: 0 to 23 for the first cut, l0 to l3 for the leg.
+    For a SimpleSaddleCoil they are the indices of its lines."""
+    if minTraceWidth is None:
+        minTraceWidth = 0.9*coil.width
+
+    if isinstance(coil, SaddleCoil):
+        toolpaths = [Toolpath.fromPath(p) for p in coil.cuts]
+        corners = [np.array([[p.x, p.y] for p in points]) for points in (coil.points, coil.points2)]
+        labels = _saddleCoilLabels(corners)
+    else:
+        toolpaths, labels = _simpleCoilToolpaths(coil)
+
+    options.setdefault("searchRadius", _searchRadius(coil.width, coil.cD, minTraceWidth, minGap))
+    return checkToolpaths(toolpaths, coil.cD, labels, minTraceWidth, minGap, step, **options)
+
+
+def checkBatch(batch, minTraceWidth = None, minGap = 0, step = 0.2, **options):
+    """Check every design of a SaddleCoilBatch without building SaddleCoil objects. Returns a list of reports."""
+    reports = []
+    for k in range(len(batch)):
+        toolpaths = Toolpath.fromBatch(batch, k)
+        labels = _saddleCoilLabels([batch.points[k], batch.points2[k]])
+        width = 0.9*batch.width[k] if minTraceWidth is None else minTraceWidth
+        radius = options.get("searchRadius") or _searchRadius(batch.width[k], batch.cD[k], width, minGap)
+        reports.append(checkToolpaths(toolpaths, batch.cD[k], labels, width, minGap, step,
+                                      **dict(options, searchRadius = radius)))
+    return reports
+
+
+def _searchRadius(width, cutterDiameter, minTraceWidth, minGap):
+    """Cutter center distances up to a bit more than one trace width are needed to find the narrowest trace."""
+    return 1.25*max(width + cutterDiameter, minTraceWidth + cutterDiameter, minGap - cutterDiameter)
+
+
+def _simpleCoilToolpaths(coil):
+    from pathOptimizer import chainSegments
+
+    index = {}
+    for n, (p1, p2) in enumerate(coil.lines):
+        index[(round(p1[0], 6), round(p1[1], 6), round(p2[0], 6), round(p2[1], 6))] = n
+        index[(round(p2[0], 6), round(p2[1], 6), round(p1[0], 6), round(p1[1], 6))] = n
+
+    toolpaths = []
+    lineNumbers = []
+    for chain in chainSegments(coil.lines):
+        segments = np.zeros(len(chain) - 1, dtype = SEGMENT)
+        segments["kind"] = STRAIGHT
+        segments["x"] = [p[0] for p in chain[1:]]
+        segments["y"] = [p[1] for p in chain[1:]]
+        toolpaths.append(Toolpath(chain[0], segments))
+        lineNumbers.append([index[(round(a[0], 6), round(a[1], 6), round(b[0], 6), round(b[1], 6))] for a, b in zip(chain[:-1], chain[1:])])
+
+    def labels(n, segment, point):
+        return "line {0}".format(lineNumbers[n][segment])
+    return toolpaths, labels
@@ -0,0 +1,295 @@
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from subprocess import call
+
+try:
+    import fcntl
+except ImportError:
+    #no locking of the index on Windows
+    fcntl = None
+
+import profiler
+
+#On-disk cache for generated coil artifacts.
+#
+#The key of an entry is the sha1 hash of a canonical description of the coil: class name, all constructor
+#parameters and TikZ options (defaults filled in, numbers as float), the feed and GENERATOR_VERSION. A hit returns
+#the stored .txt/.tex/.pdf files without building the coil or calling pdflatex. The cache is limited in size,
+#the least recently used entries are evicted first.
+#
+#Lookups only update the access times and statistics in memory; the index is written on store, clear and close and
+#every saveInterval lookups. Writing merges with the index on disk, so processes sharing the directory keep each
+#other's entries and statistics.
+#
+#Example:
+#  with CoilCache("coilcache") as cache:
+#      files = cache.generate(SaddleCoil, {"h" : 11, "r" : 7.5, "alpha" : 120, "width" : 3, "cutterDiameter" : 0, "legLength" : 35}, feed = 3.5)
+#      files["txt"], files["tex"]
+
+#increase whenever a change to the generators changes their output
+GENERATOR_VERSION = 1
+
+
+def _canonicalArguments(function, arguments, description, ignore = ()):
+    """Return the keyword arguments of function (a method, self is skipped) with all defaults filled in and numbers
+    converted to float. Arguments in ignore are left out."""
+    argspec = inspect.getargspec(getattr(function, "__wrapped__", function))
+    names = argspec.args[1:]
+    defaults = dict(zip(names[len(names) - len(argspec.defaults or []):], argspec.defaults or []))
+
+    unknown = set(arguments) - set(names)
+    if unknown:
+        raise TypeError("{0} got unexpected parameters {1}".format(description, ", ".join(sorted(unknown))))
+
+    canonical = {}
+    for name in names:
+        if name in ignore:
+            continue
+        if name in arguments:
+            value = arguments[name]
+        elif name in defaults:
+            value = defaults[name]
+        else:
+            raise TypeError("{0} requires parameter {1}".format(description, name))
+
+        if isinstance(value, (int, long, float)) and not isinstance(value, bool):
+            value = float(value)
+        canonical[name] = value
+    return canonical
+
+
+def canonicalParameters(coilClass, parameters):
+    """Return the constructor parameters of coilClass with all defaults filled in.
+
+    Numbers are converted to float so that e.g. h = 12 and h = 12.0 give the same key."""
+    return _canonicalArguments(coilClass.__init__, parameters, coilClass.__name__)
+
+
+def canonicalTikzOptions(coilClass, tikzOptions):
+    """Return the keyword arguments of coilClass.generateTikzCode with all defaults filled in, numbers as float.
+
+    filename is set by the cache and verbose does not change the file, both are left out."""
+    return _canonicalArguments(coilClass.generateTikzCode, tikzOptions, coilClass.__name__ + ".generateTikzCode",
+                               ignore = ("filename", "verbose"))
+
+
+def generateKey(coilClass, parameters, feed = 7.5, tikzOptions = {}, pdf = False):
+    """Return the key under which CoilCache.generate stores the files of a coil."""
+    options = {"feed" : float(feed), "tikz" : canonicalTikzOptions(coilClass, tikzOptions), "pdf" : bool(pdf)}
+    return cacheKey(coilClass, parameters, options)
+
+
+def cacheKey(coilClass, parameters, options):
+    """Return the cache key for a coil and its output options. The options have to be canonical already,
+    see generateKey."""
+    description = {"class" : coilClass.__name__,
+                   "parameters" : canonicalParameters(coilClass, parameters),
+                   "options" : options,
+                   "version" : GENERATOR_VERSION}
+    return hashlib.sha1(json.dumps(description, sort_keys = True)).hexdigest()
+
+
+class CoilCache(object):
+    """A size limited, least recently used cache of generated coil files."""
+
+    def __init__(self, directory = "coilcache", maxSize = 100*1024*1024, saveInterval = 100):
+        """- directory: directory of the cache, created if it does not exist
+        - maxSize: maximum total size of the stored files in bytes
+        - saveInterval: lookups after which the access times and statistics are written to the index. The index is
+          also written by store, clear and close."""
+        self.directory = directory
+        self.maxSize = maxSize
+        self.saveInterval = saveInterval
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self.indexFile = os.path.join(directory, "index.json")
+        index = self._readIndex()
+        self.entries = index["entries"]
+        self.stats = {"hits" : 0, "misses" : 0, "evictions" : 0}
+        self.stats.update(index["stats"])
+
+        #statistics as last read from the index, and changes not written yet
+        self._savedStats = dict(self.stats)
+        self._removed = set()
+        self._unsaved = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def size(self):
+        """Return the total size of all stored files in bytes."""
+        return sum(e["size"] for e in self.entries.values())
+
+    def hitRate(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"]/float(lookups) if lookups else 0.
+
+    def _readIndex(self):
+        if not os.path.exists(self.indexFile):
+            return {"entries" : {}, "stats" : {}}
+        f = open(self.indexFile)
+        index = json.load(f)
+        f.close()
+        return index
+
+    def _saveIndex(self):
+        """Merge the changes of this process into the index on disk and write it.
+
+        Other processes may use the same directory: entries they stored are kept, the newer access time wins and the
+        statistics of all processes are added up."""
+        lock = open(os.path.join(self.directory, "index.lock"), "w")
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            index = self._readIndex()
+
+            entries = dict((k, e) for k, e in index["entries"].items() if k not in self._removed)
+            for key, entry in self.entries.items():
+                if key not in entries or entries[key]["lastAccess"] < entry["lastAccess"]:
+                    entries[key] = entry
+            stats = dict(index["stats"])
+            for name, value in self.stats.items():
+                stats[name] = stats.get(name, 0) + value - self._savedStats.get(name, 0)
+
+            #write to a temporary file first, so that an interrupted write does not corrupt the index
+            fd, temp = tempfile.mkstemp(dir = self.directory)
+            f = os.fdopen(fd, "w")
+            json.dump({"entries" : entries, "stats" : stats}, f)
+            f.close()
+            os.rename(temp, self.indexFile)
+        finally:
+            lock.close()
+
+        self.entries = entries
+        self.stats = stats
+        self._savedStats = dict(stats)
+        self._removed = set()
+        self._unsaved = 0
+
+    def _changed(self):
+        self._unsaved += 1
+        if self._unsaved >= self.saveInterval:
+            self._saveIndex()
+
+    def flush(self):
+        """Write pending access times and statistics to the index."""
+        if self._unsaved or self._removed:
+            self._saveIndex()
+
+    def close(self):
+        self.flush()
+
+    def lookup(self, key):
+        """Return a dictionary extension -> file name for key, or None if key is not cached."""
+        entry = self.entries.get(key)
+        if entry is None and os.path.isdir(os.path.join(self.directory, key)):
+            #stored by another process since the index was read
+            self._saveIndex()
+            entry = self.entries.get(key)
+
+        if entry is not None:
+            files = dict((ext, os.path.join(self.directory, key, name)) for ext, name in entry["files"].items())
+            if all(os.path.exists(f) for f in files.values()):
+                entry["lastAccess"] = time.time()
+                self.stats["hits"] += 1
+                self._changed()
+                return files
+            #files were removed behind our back
+            self._remove(key)
+
+        self.stats["misses"] += 1
+        self._changed()
+        return None
+
+    def store(self, key, files):
+        """Copy files (a dictionary extension -> file name) into the cache under key.
+
+        Returns the dictionary of the cached files."""
+        entryDir = os.path.join(self.directory, key)
+        if os.path.isdir(entryDir):
+            shutil.rmtree(entryDir)
+        os.makedirs(entryDir)
+
+        names = {}
+        size = 0
+        for ext, filename in files.items():
+            names[ext] = "coil." + ext
+            shutil.copyfile(filename, os.path.join(entryDir, names[ext]))
+            size += os.path.getsize(filename)
+
+        self.entries[key] = {"files" : names, "size" : size, "lastAccess" : time.time()}
+        self._evict(keep = key)
+        self._saveIndex()
+        return dict((ext, os.path.join(entryDir, name)) for ext, name in names.items())
+
+    def _remove(self, key):
+        shutil.rmtree(os.path.join(self.directory, key), ignore_errors = True)
+        del self.entries[key]
+        self._removed.add(key)
+
+    def _evict(self, keep):
+        size = self.size()
+        for key in sorted(self.entries, key = lambda k: self.entries[k]["lastAccess"]):
+            if size <= self.maxSize:
+                break
+            if key == keep:
+                continue
+            size -= self.entries[key]["size"]
+            self._remove(key)
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        """Remove all entries. The statistics are kept."""
+        for key in list(self.entries):
+            self._remove(key)
+        self._saveIndex()
+
+    def generate(self, coilClass, parameters, feed = 7.5, tikzOptions = {}, pdf = False):
+        """Return the G-Code, TikZ and optionally PDF file of a coil, generating them only if they are not cached.
+
+        - coilClass: SaddleCoil or SimpleSaddleCoil
+        - parameters: dictionary of constructor arguments
+        - feed: feed for the G-Code
+        - tikzOptions: further keyword arguments of generateTikzCode, e.g. scale or includePoints
+        - pdf: if True, the TeX file is compiled with pdflatex
+
+        Returns a dictionary with the file names in the cache, keys txt, tex and pdf."""
+        key = generateKey(coilClass, parameters, feed, tikzOptions, pdf)
+
+        files = self.lookup(key)
+        if files is not None:
+            return files
+
+        workDir = tempfile.mkdtemp(dir = self.directory)
+        stdout = sys.stdout
+        try:
+            #the generators print their output, which is not wanted here
+            sys.stdout = open(os.devnull, "w")
+
+            coil = coilClass(**parameters)
+            files = {"txt" : os.path.join(workDir, "coil.txt"), "tex" : os.path.join(workDir, "coil.tex")}
+            coil.generateGCode(feed = feed, filename = files["txt"])
+            coil.generateTikzCode(filename = files["tex"], **tikzOptions)
+
+            if pdf:
+                with profiler.stage("pdflatex"):
+                    call(["pdflatex", "-interaction=nonstopmode", "-output-directory", workDir, files["tex"]], stdout = sys.stdout)
+                files["pdf"] = os.path.join(workDir, "coil.pdf")
+
+            return self.store(key, files)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+            shutil.rmtree(workDir, ignore_errors = True)
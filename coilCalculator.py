@@ -1,7 +1,11 @@
-import numpy as np
+import math
+import os
 
 from subprocess import call
 
+import coilGeometry
+import profiler
+
 #coil G - code generator for saddle coils.
 
 #TODO:
@@ -16,6 +20,29 @@ from subprocess import call
 #then use G2 giving the final coordinates of the arc, say X0 Y3.2 and the center of the arc as an offset to the starting point.
 #G2 X0 Y3.2 3.2 0 will draw such a cut.
 
+def writeFile(filename, write):
+    """Call write with an open file and return its result.
+
+    The file is written as filename.tmp and renamed to filename only when write returns, so an error while the
+    program is generated leaves neither an empty nor a truncated file behind."""
+    temp = filename + ".tmp"
+    try:
+        with open(temp, "w") as f:
+            result = write(f)
+        os.rename(temp, filename)
+    except:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+    return result
+
+
+#kinds of the segments of a path, see Path.segments. toolpath.SEGMENT stores the same tuples in a numpy array.
+STRAIGHT = 0
+CLOCKWISE = 1
+COUNTERCLOCKWISE = 2
+
+
 class Coordinate(object):
     """A Coordinate is just a set of values, x and y.
     This class could be replaced with a numpy array, but the shiftX and shiftY methods make the code mor
@@ -31,11 +58,10 @@ class Coordinate(object):
         return Coordinate(self.x + other.x, self.y + other.y)
 
     def __sub__(self, other):
-        print "other.x: ", other.x
         return Coordinate(self.x - other.x, self.y - other.y)
 
     def magnitude(self):
-        return np.sqrt(self.x**2 + self.y**2)
+        return math.sqrt(self.x**2 + self.y**2)
     
     def normalize(self):
         mag = self.magnitude()
@@ -81,7 +107,7 @@ class ClockwiseArc(object):
 
         #we have the arc center and we know it is clockwise. Tikz needs startAngle, stop Angle and radius
         #the start angle is opposite the center point. If arcCenter.x > 0, the start angle is 180 degrees. The stop angle is 90 deg less.
-        start = (np.angle(self.arcCenter.x + 1j*self.arcCenter.y)/np.pi*180 + 180) % 360
+        start = (math.atan2(self.arcCenter.y, self.arcCenter.x)/math.pi*180 + 180) % 360
         stop = start - 90
         
         return " arc ({0}:{1}:{2})".format(start, stop, r)
@@ -96,7 +122,7 @@ class CounterClockwiseArc(ClockwiseArc):
 
         #we have the arc center and we know it is clockwise. Tikz needs startAngle, stop Angle and radius
         #the start angle is opposite the center point. If arcCenter.x > 0, the start angle is 180 degrees. The stop angle is 90 deg less.
-        start = (np.angle(self.arcCenter.x + 1j*self.arcCenter.y)/np.pi*180 + 180) % 360
+        start = (math.atan2(self.arcCenter.y, self.arcCenter.x)/math.pi*180 + 180) % 360
         stop = start + 90
         return " arc ({0}:{1}:{2})".format(start, stop, r)
     
@@ -111,21 +137,43 @@ class Path(object):
         
         self.path = []
 
+    def gCodeLines(self, feed = 7.5):
+        """Yield the gCode of the path line by line, each line terminated by a newline.
+
+        - feed: optional, specify feed for cutting operations (defaults to 7.5)
+        """
+        yield "G0 Z5\n"
+        yield "G0 X{0:.3f} Y{1:.3f}\n".format(self.p0.x, self.p0.y)
+        yield "G0 Z0.5\n"
+        yield "G01 Z-0.3 F{:.3f}\n".format(feed)
+
+        for p in self.path:
+            yield p.gCode() + "\n"
+        profiler.count("gCode.segmentsEmitted", len(self.path))
+
+        yield "G0 Z5\n"
+
     def gCode(self, feed = 7.5):
         """Return the gCode of the path.
 
         - feed: optional, specify feed for cutting operations (defaults to 7.5)
         """
-        retVal = "G0 Z5\n"
-        retVal += "G0 X{0:.3f} Y{1:.3f}\n".format(self.p0.x, self.p0.y)
-        retVal += "G0 Z0.5\n"
-        retVal += "G01 Z-0.3 F{:.3f}\n".format(feed)
+        return "".join(self.gCodeLines(feed))
 
-        for p in self.path:
-            retVal += p.gCode() + "\n"
+    def segments(self):
+        """Return the segments as a list of tuples (kind, x, y, i, j).
 
-        retVal += "G0 Z5\n"
-        return retVal
+        kind is one of STRAIGHT, CLOCKWISE, COUNTERCLOCKWISE, x, y the destination and i, j the offset of the arc
+        center relative to the start of the segment (zero for straight segments)."""
+        segments = []
+        for p in self.path:
+            if isinstance(p, CounterClockwiseArc):
+                segments.append((COUNTERCLOCKWISE, p.destination.x, p.destination.y, p.arcCenter.x, p.arcCenter.y))
+            elif isinstance(p, ClockwiseArc):
+                segments.append((CLOCKWISE, p.destination.x, p.destination.y, p.arcCenter.x, p.arcCenter.y))
+            else:
+                segments.append((STRAIGHT, p.destination.x, p.destination.y, 0, 0))
+        return segments
 
     def tikzCode(self):
         retVal = "\draw ({0:.3f},{1:.3f}) ".format(self.p0.x, self.p0.y);
@@ -135,6 +183,14 @@ class Path(object):
         retVal += ";\n"
         return retVal
 
+def coilSegments(coil):
+    """Return the cuts of a SaddleCoil or the lines of a SimpleSaddleCoil as a list of (p0, segments), with p0 = (x, y)
+    and segments a list of (kind, x, y, i, j), see Path.segments."""
+    if isinstance(coil, SaddleCoil):
+        return [((path.p0.x, path.p0.y), path.segments()) for path in coil.cuts]
+    return [((p1[0], p1[1]), [(STRAIGHT, p2[0], p2[1], 0, 0)]) for p1, p2 in coil.lines]
+
+
 class SaddleCoil(object):
     """A class to represent a simple saddle coil, as machined from a 2D sheet.
 
@@ -142,7 +198,8 @@ class SaddleCoil(object):
         Optionally generate tikz code to visualize the result using LaTeX."""
     
     def __init__(self, h, r, alpha, width, cutterDiameter, gap = 1, legLength = 10, cornerRadius = 0.5, compact = False):
-        """This routine creates the coordinates for the cuts.
+        """This routine sets up the parameters, the coordinates for the cuts are computed when they are first needed.
+        All parameters (and feed) can be changed later on, e.g. coil.cornerRadius = 1.
         
         - h: height of the saddle coil as distance between center of traces
         - r: radius (!) of the coil, not diameter
@@ -176,39 +233,142 @@ class SaddleCoil(object):
 
         assert cornerRadius >= cutterDiameter, "Corner Radius required to be greater / equal cutter Diameter."
 
-        self.cornerRadius = cornerRadius
-        
-        self.circumference = 2*np.pi*r
-
-        self.cD = cutterDiameter
-        self.width = width
-
+        self._parameters = {"h" : h, "r" : r, "alpha" : alpha, "width" : width, "cutterDiameter" : cutterDiameter, "gap" : gap,
+                            "legLength" : legLength, "cornerRadius" : cornerRadius, "compact" : compact, "feed" : 7.5}
+
+        #derived stages are computed on first use, see STAGES
+        self._stages = {}
+        #names of the stages in the order in which they were computed
+        self.recomputeLog = []
+
+    #Every derived stage lists the parameters and stages it is computed from. Changing a parameter drops all stages
+    #that depend on it, directly or through other stages.
+    STAGES = {"points" : ["h", "r", "alpha", "width", "cutterDiameter", "gap", "legLength", "compact"],
+              "shiftedPoints" : ["points"],
+              "cuts" : ["shiftedPoints", "cornerRadius", "cutterDiameter"],
+              "gCode" : ["cuts", "shiftedPoints", "feed"],
+              "tikz" : ["cuts"]}
+
+    def _parameter(name, doc):
+        def get(self):
+            return self._parameters[name]
+
+        def set(self, value):
+            self.setParameter(name, value)
+        return property(get, set, doc = doc)
+
+    h = _parameter("h", "height of the saddle coil as distance between center of traces")
+    r = _parameter("r", "radius of the coil")
+    alpha = _parameter("alpha", "opening angle of the saddle coil")
+    width = _parameter("width", "width of the copper traces")
+    cD = _parameter("cutterDiameter", "cutting diameter of the tool")
+    cutterDiameter = cD
+    gap = _parameter("gap", "additional gap between different segments of the coil")
+    legLength = _parameter("legLength", "length of the coil's legs")
+    cornerRadius = _parameter("cornerRadius", "radius of the rounded corners")
+    compact = _parameter("compact", "drop points 3, 4, 19 and 20 for coils with a small radius")
+    feed = _parameter("feed", "feed used by the G-Code methods if none is given, defaults to 7.5")
+
+    del _parameter
+
+    def setParameter(self, name, value):
+        """Change a parameter. Only the stages that depend on it are computed again when they are needed next."""
+        if name in ("cornerRadius", "cutterDiameter"):
+            parameters = dict(self._parameters)
+            parameters[name] = value
+            assert parameters["cornerRadius"] >= parameters["cutterDiameter"], "Corner Radius required to be greater / equal cutter Diameter."
+
+        if self._parameters[name] == value:
+            return
+        self._parameters[name] = value
+        self._invalidate(name)
+
+    def _invalidate(self, name):
+        for stage, inputs in self.STAGES.items():
+            if name in inputs:
+                self._stages.pop(stage, None)
+                self._invalidate(stage)
+
+    def isValid(self, stage):
+        """True if the stage is computed and up to date."""
+        return stage in self._stages
+
+    def _stage(self, name):
+        if name not in self._stages:
+            with profiler.stage("SaddleCoil." + name):
+                self._stages[name] = getattr(self, "_compute_" + name)()
+            self.recomputeLog.append(name)
+        return self._stages[name]
+
+    @property
+    def circumference(self):
+        return 2*math.pi*self.r
+
+    @property
+    def radii(self):
+        """compensate arcs for cutter diameter"""
         cD2 = self.cD/2.
-        w2 = self.width/2.
-
-        #compensate arcs for cutter diameter
-        self.radii = {"s" : cornerRadius -cD2, "l" : cornerRadius + cD2}
-
-        #Setup a few useful coordinates along the path:        
-        yInnerBottom = w2 + cD2
-        yInnerTop = h - w2 - cD2
-
-        yOuterBottom = 0 - w2 - cD2
-        yOuterTop = h + w2 + cD2
+        return {"s" : self.cornerRadius - cD2, "l" : self.cornerRadius + cD2}
+
+    @property
+    def points(self):
+        """Corner points of the first cut, shifted so that all cuts have x,y>0"""
+        return self._stage("shiftedPoints")["points"]
+
+    @property
+    def points2(self):
+        """Corner points of the leg cut"""
+        return self._stage("shiftedPoints")["points2"]
+
+    @property
+    def shift(self):
+        """Offset subtracted from the points to move the cuts to x,y>0"""
+        return self._stage("shiftedPoints")["shift"]
+
+    @property
+    def maxX(self):
+        return self._stage("shiftedPoints")["maxX"]
+
+    @property
+    def maxY(self):
+        return self._stage("shiftedPoints")["maxY"]
+
+    @property
+    def cuts(self):
+        return self._stage("cuts")
+
+    def _compute_points(self):
+        """Corner points and bends of both cuts before the shift to x,y>0."""
+        h = self.h
+        alpha = self.alpha
+        gap = self.gap
+        legLength = self.legLength
+        compact = self.compact
+
+        #Setup a few useful coordinates along the path, shared with SimpleSaddleCoil (see coilGeometry)
+        t = coilGeometry.table(h, self.r, alpha, self.width, self.cD)
+        cD2 = t["cD2"]
+        w2 = t["w2"]
+
+        yInnerBottom = t["yInnerBottom"]
+        yInnerTop = t["yInnerTop"]
+
+        yOuterBottom = t["yOuterBottom"]
+        yOuterTop = t["yOuterTop"]
 
         #xInnerLeft: first or left loop of the coil, inside left cutter coordinates
-        xInnerLeft_Left = self.angleToX(0) + w2 + cD2 
-        xInnerLeft_Right = self.angleToX(alpha) - w2 - cD2
+        xInnerLeft_Left = t["xInnerLeft_Left"]
+        xInnerLeft_Right = t["xInnerLeft_Right"]
 
-        xOuterLeft_Left = self.angleToX(0) - w2 - cD2
-        xOuterLeft_Right = self.angleToX(alpha) + w2 + cD2
+        xOuterLeft_Left = t["xOuterLeft_Left"]
+        xOuterLeft_Right = t["xOuterLeft_Right"]
 
         #xInnerRight: second or right loop of the coil
-        xInnerRight_Left = self.angleToX(180) + w2 + cD2 
-        xInnerRight_Right = self.angleToX(180 + alpha) - w2 - cD2
+        xInnerRight_Left = t["xInnerRight_Left"]
+        xInnerRight_Right = t["xInnerRight_Right"]
 
-        xOuterRight_Left = self.angleToX(180) - w2 - cD2 
-        xOuterRight_Right = self.angleToX(180 + alpha) + w2 + cD2
+        xOuterRight_Left = t["xOuterRight_Left"]
+        xOuterRight_Right = t["xOuterRight_Right"]
 
  
         #arc radii are either small or large, depending on whether the coil material is left on the outside of the arc"
@@ -217,9 +377,9 @@ class SaddleCoil(object):
         bends = "sslslllssssssllllssslsls"
         #set up the points
         #the point definition has all the correct points if the corners are not smoothed.
-        points = [Coordinate(self.angleToX(180) - 3*w2 - 3*cD2 - gap, yOuterBottom - legLength)]
+        points = [Coordinate(t["x180"] - 3*w2 - 3*cD2 - gap, yOuterBottom - legLength)]
         points.append(points[-1].shiftY(legLength - gap - 2*w2 - 2*cD2))
-        points.append(Coordinate(self.angleToX(alpha) - 3*w2 - 3*cD2 - gap, points[-1].y))
+        points.append(Coordinate(t["xAlpha"] - 3*w2 - 3*cD2 - gap, points[-1].y))
         points.append(Coordinate(points[-1].x, yOuterBottom))
         points.append(Coordinate(xOuterLeft_Left, yOuterBottom))#now we have reached point 4, the outer lower left corner of the left turn.
         points.append(Coordinate(xOuterLeft_Left, yOuterTop))
@@ -257,26 +417,43 @@ class SaddleCoil(object):
         points2.append(points2[0].shiftX(legLength + 2*w2 + gap + cD2))
         points2.append(points2[1].shiftY(-2*w2 - 2*cD2))
         points2.append(points2[0].shiftY(-2*w2 - 2*cD2))
-        
+
+        profiler.count("SaddleCoil.points", len(points) + len(points2))
+        return points, points2, bends, bends_leg
+
+    def _compute_shiftedPoints(self):
+        points, points2, bends, bends_leg = self._stage("points")
+        cD2 = self.cD/2.
+
         minX = min(p.x for p in points +  points2)
         minY = min(p.y for p in points + points2)
 
         #shift points so that all cuts have x,y>0.
-        points = [point - Coordinate(minX - cD2, minY - cD2) for point in points]
-        points2 = [point - Coordinate(minX - cD2, minY - cD2) for point in points2]
-        
-        firstCut = self.generatePathFromPoints(points, bends)
-        secondCut = self.generatePathFromPoints(points2, bends_leg)
-                
-        self.cuts = [firstCut, secondCut]
-
-        self.maxX = max([p.x for p in points + points2])
-        self.maxY = max([p.y for p in points + points2])
-
-        #store the points with the module object so that the point numbers can be drawn.
-        self.points = points
-        self.points2 = points2
-        
+        shift = Coordinate(minX - cD2, minY - cD2)
+        points = [point - shift for point in points]
+        points2 = [point - shift for point in points2]
+
+        return {"points" : points,
+                "points2" : points2,
+                "bends" : bends,
+                "bends_leg" : bends_leg,
+                "shift" : shift,
+                "maxX" : max([p.x for p in points + points2]),
+                "maxY" : max([p.y for p in points + points2])}
+
+    def _compute_cuts(self):
+        stage = self._stage("shiftedPoints")
+        firstCut = self.generatePathFromPoints(stage["points"], stage["bends"])
+        secondCut = self.generatePathFromPoints(stage["points2"], stage["bends_leg"])
+        return [firstCut, secondCut]
+
+    def _compute_gCode(self):
+        return "".join(self.gCodeLines(self.feed))
+
+    def _compute_tikz(self):
+        return "".join(path.tikzCode() for path in self.cuts)
+
+    @profiler.timed("SaddleCoil.generatePathFromPoints")
     def generatePathFromPoints(self, points, bends):
         cut = Path(points[0])
         for i in range(len(points)):
@@ -305,44 +482,101 @@ class SaddleCoil(object):
             else:
                 cut.path.append(ClockwiseArc(arcStop, arcOffset.x, arcOffset.y))
 
+        profiler.count("Path.segments", len(cut.path))
         return cut
         
     def angleToX(self, angle):
          """ Calculate X-position from angle. This function also introduces the startAngle.
          angleToX should be called once for every calculation of an X value."""
          return self.circumference*angle/360.
+
+    def xToAngle(self, x):
+        """Inverse of angleToX: the angle in degrees on the cylinder of an X-position before the shift to x, y > 0."""
+        return 360.*x/self.circumference
    
-    def generateGCode(self, feed = 7.5, filename = ""):
+    def gCodeLines(self, feed = None, arcTolerance = None, maxSegments = None):
+        """Yield the GCode for the specified coil line by line, each line terminated by a newline.
+
+        - feed: optional argument, defaults to self.feed
+        - arcTolerance: if given, arcs are cut as straight chords within this distance in mm of the arc,
+          for controllers without G2/G3 (see toolpath.linearize)
+        - maxSegments: optional limit for the number of segments when arcs are linearized"""
+        if feed is None:
+            feed = self.feed
+
+        cuts = self.cuts
+        if arcTolerance is not None:
+            from toolpath import Toolpath, linearize
+            cuts, report = linearize([Toolpath.fromPath(path) for path in cuts], arcTolerance, maxSegments)
+
+        yield ";G-Code generated by coilCalculator.py\n"
+        yield ";maxX : {0:.3f}\n".format(self.maxX)
+        yield ";maxY : {0:.3f}\n".format(self.maxY)
+        if arcTolerance is not None:
+            yield ";arcs as chords, max deviation : {0:.4f}\n".format(report["maxDeviation"])
+        yield "G90\n"
+        yield "G00 Z5.00\n"
+        yield "M10 O6.1\n"
+
+        for path in cuts:
+            for line in path.gCodeLines(feed):
+                yield line
+
+        yield "M10 O6.0\n"
+
+    def writeGCode(self, sink, feed = None, arcTolerance = None, maxSegments = None):
+        """Write the GCode for the specified coil to a file-like object while the paths are walked.
+
+        - sink: any object with a write method, e.g. an open file.
+        - feed: optional argument, defaults to self.feed
+        - arcTolerance, maxSegments: optional, linearize arcs, see gCodeLines"""
+        written = 0
+        for line in self.gCodeLines(feed, arcTolerance, maxSegments):
+            sink.write(line)
+            written += len(line)
+        profiler.count("gCode.bytesWritten", written)
+
+    def gCode(self, feed = None, arcTolerance = None, maxSegments = None):
+        """Return the GCode for the specified coil as a string.
+
+        - feed: optional argument, defaults to self.feed. The code for self.feed is kept until an input changes.
+        - arcTolerance, maxSegments: optional, linearize arcs, see gCodeLines"""
+        if arcTolerance is None and (feed is None or feed == self.feed):
+            return self._stage("gCode")
+        return "".join(self.gCodeLines(feed, arcTolerance, maxSegments))
+
+    @profiler.timed("SaddleCoil.generateGCode")
+    def generateGCode(self, feed = None, filename = "", arcTolerance = None, maxSegments = None):
         """Generate GCode for the specified coil.
 
-        - feed: optional argument, defaults to 7.5
-        - cutteDiameter: specify cutter Diameter for cutter compensation. 
-        - filename: if specified, the g code is saved, if not it is printed to STDOUT."""
-        code = """;G-Code generated by coilCalculator.py
-;maxX : {0:.3f}
-;maxY : {1:.3f}
-G90
-G00 Z5.00
-M10 O6.1\n""".format(self.maxX, self.maxY)
-
-        for path in self.cuts:
-           code += path.gCode()
-
-        
-        code += "M10 O6.0\n"
-
+        - feed: optional argument, defaults to self.feed
+        - filename: if specified, the g code is streamed to the file (see writeFile) and nothing is returned; use
+          gCode for the string. If not, it is printed to STDOUT and returned as a string.
+        - arcTolerance, maxSegments: optional, cut arcs as straight chords, see gCodeLines"""
         if len(filename) > 0:
-            f = open(filename, "w")
-            f.write(code)
-            f.close()
+            writeFile(filename, lambda f: self.writeGCode(f, feed, arcTolerance, maxSegments))
         else:
+            code = self.gCode(feed, arcTolerance, maxSegments)
             print code
-        return code
+            return code
+
+    def generateSVG(self, filename = "temp.svg", includePoints = False, scale = 1):
+        """Export Coil to an SVG file. Unlike generateTikzCode, this does not need LaTeX.
 
-    def generateTikzCode(self, filename = "temp.tex", compileFile = False, includePoints = False, scale = 1, includePointsText = False, includeGCode = False):
+        Returns the SVG code, see svgRenderer.renderSVG."""
+        from svgRenderer import renderSVG
+        return renderSVG(self, filename, includePoints = includePoints, scale = scale)
+
+    def tikzCode(self):
+        """Return the TikZ commands that draw the cuts, one line per cut. The code is kept until an input changes."""
+        return self._stage("tikz")
+
+    @profiler.timed("SaddleCoil.generateTikzCode")
+    def generateTikzCode(self, filename = "temp.tex", compileFile = False, includePoints = False, scale = 1, includePointsText = False, includeGCode = False, verbose = True):
         """Export Coil to a TeX file. 
 
-        The file needs to be compiled manually using e.g. pdflatex."""
+        The file needs to be compiled manually using e.g. pdflatex.
+        With verbose = False the TikZ code is not printed to STDOUT."""
 
         header = """\documentclass{article}
 \usepackage{tikz}
@@ -360,10 +594,7 @@ M10 O6.1\n""".format(self.maxX, self.maxY)
         file = open(filename, "w")
         file.write(header)
 
-        code = ""
-        for path in self.cuts:
-            #file.write(path.tikzCode())
-            code += path.tikzCode()
+        code = self.tikzCode()
             
         if includePoints:
             if scale > 0.9:
@@ -378,7 +609,8 @@ M10 O6.1\n""".format(self.maxX, self.maxY)
 
         code += "\draw [|-|, thick](-3, 0) -- (-3, {0}) node[pos=0.5, anchor = south, rotate = 90]{{{0} mm}};\n".format(self.maxY);
         code += "\draw [|-|, thick](0, -3) -- ({0}, -3 ) node[pos=0.5, anchor = north]{{{0:.2f} mm}};\n".format(self.maxX);
-        print code
+        if verbose:
+            print code
                 
         file.write(code)
         file.write(footer)
@@ -398,17 +630,21 @@ M10 O6.1\n""".format(self.maxX, self.maxY)
 
             
         if includeGCode:
-            file.write("\\begin{verbatim}\n" + "Cutter Compensation Commands Required\n" + self.generateGCode(filename = "temp.txt") + "\n\end{verbatim}")
+            file.write("\\begin{verbatim}\n" + "Cutter Compensation Commands Required\n")
+            self.writeGCode(file)
+            file.write("\n\end{verbatim}")
         
         file.write("\end{document}")
+        profiler.count("tikz.bytesWritten", file.tell())
         file.close()
 
         if compileFile == True:
             print "Compiling TeX-File using pdflatex"
-            call(["pdflatex", filename])
+            with profiler.stage("pdflatex"):
+                call(["pdflatex", filename])
 
             call(["open", filename[:-4] + ".pdf"])
-        else:
+        elif verbose:
             print code;
     
 if __name__ == "__main__":
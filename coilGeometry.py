@@ -0,0 +1,128 @@
+import math
+import threading
+
+from collections import OrderedDict
+
+#The characteristic coordinates of a saddle coil, shared by all generators.
+#
+#SimpleSaddleCoil (cuts as separate straight lines), SaddleCoil (closed contours with rounded corners) and
+#SaddleCoilBatch (many contours at once) are all built from the same few x and y values: the inner and outer edges of
+#the traces of both loops, offset by half the cutter diameter. coordinateTable computes them in one place. It works on
+#scalars and on numpy arrays (one entry per design) alike and does not need numpy itself, so coilCalculator and
+#simpleSaddleCoil can use it without importing numpy.
+#
+#The single coil classes get their table from table(), which keeps the tables of recently used parameter sets. Building
+#a SimpleSaddleCoil and a SaddleCoil with the same parameters, e.g. with variants, computes the coordinates once.
+#
+#The arithmetic is the one SaddleCoil has always used, so the coordinates and all outputs stay identical to the bit.
+#
+#Example:
+#  t = table(12, 6, 120, 2.5, 1)
+#  print t["xInnerLeft_Right"], t["yOuterTop"]
+#  coils = variants(12, 6, 120, 2.5, 1, cornerRadius = 1)
+#  coils["segments"].generateGCode(filename = "standardSimple.txt")
+#  coils["contour"].generateGCode(filename = "standardCoil.txt")
+
+
+def coordinateTable(h, r, alpha, width, cutterDiameter):
+    """Return a dictionary of the characteristic coordinates of a saddle coil, before the shift to x, y > 0.
+
+    All arguments may be scalars or numpy arrays (one entry per design).
+    The names follow SaddleCoil, e.g. yInnerBottom or xOuterRight_Left. x180 and xAlpha are the positions of the
+    angles 180 and alpha, cD2 and w2 half the cutter diameter and half the trace width."""
+    circumference = 2*math.pi*r
+
+    def angleToX(angle):
+        return circumference*angle/360.
+
+    cD2 = cutterDiameter/2.
+    w2 = width/2.
+
+    table = {"circumference" : circumference, "cD2" : cD2, "w2" : w2}
+
+    table["yInnerBottom"] = w2 + cD2
+    table["yInnerTop"] = h - w2 - cD2
+
+    table["yOuterBottom"] = 0 - w2 - cD2
+    table["yOuterTop"] = h + w2 + cD2
+
+    #xInnerLeft: first or left loop of the coil, inside left cutter coordinates
+    table["xInnerLeft_Left"] = angleToX(0) + w2 + cD2
+    table["xInnerLeft_Right"] = angleToX(alpha) - w2 - cD2
+
+    table["xOuterLeft_Left"] = angleToX(0) - w2 - cD2
+    table["xOuterLeft_Right"] = angleToX(alpha) + w2 + cD2
+
+    #xInnerRight: second or right loop of the coil
+    table["xInnerRight_Left"] = angleToX(180) + w2 + cD2
+    table["xInnerRight_Right"] = angleToX(180 + alpha) - w2 - cD2
+
+    table["xOuterRight_Left"] = angleToX(180) - w2 - cD2
+    table["xOuterRight_Right"] = angleToX(180 + alpha) + w2 + cD2
+
+    table["x180"] = angleToX(180)
+    table["xAlpha"] = angleToX(alpha)
+    return table
+
+
+class TableCache(object):
+    """Thread safe least recently used store of coordinate tables of single designs."""
+
+    def __init__(self, maxSize = 256):
+        self.maxSize = maxSize
+        self.entries = OrderedDict()
+        self.stats = {"hits" : 0, "misses" : 0, "evictions" : 0}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def table(self, h, r, alpha, width, cutterDiameter):
+        #numbers of any type give the same table, as float
+        key = (float(h), float(r), float(alpha), float(width), float(cutterDiameter))
+        with self.lock:
+            t = self.entries.pop(key, None)
+            if t is not None:
+                self.entries[key] = t
+                self.stats["hits"] += 1
+                return t
+            self.stats["misses"] += 1
+
+        t = coordinateTable(*key)
+        with self.lock:
+            self.entries[key] = t
+            while len(self.entries) > self.maxSize:
+                self.entries.popitem(last = False)
+                self.stats["evictions"] += 1
+        return t
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+#shared by SaddleCoil and SimpleSaddleCoil
+DEFAULT_CACHE = TableCache()
+
+
+def table(h, r, alpha, width, cutterDiameter):
+    """Return the coordinate table of one design, computed only if it is not in DEFAULT_CACHE.
+
+    The table is shared, it must not be changed."""
+    return DEFAULT_CACHE.table(h, r, alpha, width, cutterDiameter)
+
+
+def variants(h, r, alpha, width, cutterDiameter, gap = 1, legLength = 10, cornerRadius = 0.5, compact = False):
+    """Return both generators for one set of parameters, built from one coordinate table:
+    "segments", a SimpleSaddleCoil, and "contour", a SaddleCoil (see their constructors for the parameters).
+
+    cornerRadius and compact only apply to the contour."""
+    from coilCalculator import SaddleCoil
+    from simpleSaddleCoil import SimpleSaddleCoil
+
+    table(h, r, alpha, width, cutterDiameter)
+    contour = SaddleCoil(h, r, alpha, width, cutterDiameter, gap = gap, legLength = legLength, cornerRadius = cornerRadius, compact = compact)
+    #compute the points now, while the table is certainly cached
+    contour.points
+    segments = SimpleSaddleCoil(h, r, alpha, width, cutterDiameter, gap = gap, legLength = legLength)
+    return {"segments" : segments, "contour" : contour}
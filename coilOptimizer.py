@@ -0,0 +1,283 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+
+from coilCalculator import SaddleCoil
+from clearanceChecker import checkCoil
+from fieldSolver import homogeneity
+
+#Search h, alpha, width and cornerRadius of a SaddleCoil for the most homogeneous B1 field in a sample volume.
+#
+#Candidates are evaluated in batches on a process pool. Designs that cannot be machined are rejected: the corner
+#radius has to be at least the cutter diameter, the coil has to fit onto the sheet and the clearance check must not
+#find narrow traces, small gaps or crossing cuts. The score of a design is the fraction of the sample volume in which
+#B1 stays within +- tolerance percent of the field at the center.
+#
+#The first batch is drawn at random from the bounds, later batches perturb the best designs found so far with a step
+#that shrinks from batch to batch. Parameters are rounded to a resolution, so that candidates that were seen before are
+#taken from memory instead of being evaluated again. After every batch the state is written to a JSON checkpoint;
+#starting again with the same checkpoint continues the search where it stopped.
+#
+#Example:
+#  python coilOptimizer.py 6 1 --sample-radius 4 --sample-height 10 --sheet 60 40 --iterations 30 --checkpoint opt.json
+
+PARAMETERS = ["h", "alpha", "width", "cornerRadius"]
+CHECKPOINT_VERSION = 1
+
+
+def evaluate(job):
+    """Build and score one design. job is a tuple (parameters, settings), see CoilOptimizer.
+
+    Returns a result dictionary with the parameters, feasible, reason (if not feasible) and the figures of merit.
+    A design whose geometry cannot be computed is not feasible, it does not stop the search."""
+    parameters, settings = job
+    result = {"parameters" : parameters, "feasible" : False}
+
+    try:
+        _score(parameters, settings, result)
+    except AssertionError as e:
+        result["reason"] = str(e)
+    except Exception as e:
+        result["reason"] = "{0}: {1}".format(type(e).__name__, e)
+    return result
+
+
+def _score(parameters, settings, result):
+    """Fill in result for evaluate, setting reason if the design is rejected."""
+    coil = SaddleCoil(parameters["h"], settings["r"], parameters["alpha"], parameters["width"], settings["cutterDiameter"],
+                      gap = settings["gap"], legLength = settings["legLength"], cornerRadius = parameters["cornerRadius"],
+                      compact = settings["compact"])
+
+    cD2 = settings["cutterDiameter"]/2.
+    result["maxX"] = coil.maxX
+    result["maxY"] = coil.maxY
+    if settings["sheetWidth"] is not None and coil.maxX + cD2 > settings["sheetWidth"]:
+        result["reason"] = "wider than the sheet"
+        return
+    if settings["sheetHeight"] is not None and coil.maxY + cD2 > settings["sheetHeight"]:
+        result["reason"] = "higher than the sheet"
+        return
+
+    report = checkCoil(coil, settings["minTraceWidth"], settings["minGap"])
+    if not report["ok"]:
+        result["reason"] = "{0} violations, first: {1}".format(len(report["violations"]), report["violations"][0]["type"])
+        return
+
+    field = homogeneity(coil, settings["gridPoints"], (settings["tolerance"],),
+                        settings["sampleRadius"]/settings["r"], settings["sampleHeight"]/parameters["h"])
+    result["feasible"] = True
+    result["score"] = field["volumeFraction"][settings["tolerance"]]
+    result["meanDeviation"] = field["meanDeviation"]
+    result["centerField"] = field["centerFieldMagnitude"]
+
+
+def _better(a, b):
+    """True if result a is better than result b."""
+    return (a["score"], -a["meanDeviation"]) > (b["score"], -b["meanDeviation"])
+
+
+class CoilOptimizer(object):
+    """Search SaddleCoil parameters for field homogeneity under machining constraints."""
+
+    def __init__(self, r, cutterDiameter, sampleRadius, sampleHeight, bounds = None, gap = 1, legLength = 10, compact = False,
+                 sheetWidth = None, sheetHeight = None, minGap = 0, minTraceWidth = None, tolerance = 5, gridPoints = 15,
+                 resolution = None, checkpoint = "", processes = None, batchSize = 16, seed = 0):
+        """- r, cutterDiameter, gap, legLength, compact: fixed parameters of the SaddleCoil
+        - sampleRadius, sampleHeight: size in mm of the cylindrical sample volume around the center of the coil
+        - bounds: dictionary parameter -> (lowest, highest value) for h, alpha, width and cornerRadius
+        - sheetWidth, sheetHeight: size of the copper sheet, None for no limit
+        - minGap, minTraceWidth: limits for the clearance check, see clearanceChecker.checkCoil
+        - tolerance: B1 deviation in percent that defines the homogeneous volume
+        - gridPoints: number of field sample points along every axis
+        - resolution: dictionary parameter -> step to which candidates are rounded
+        - checkpoint: JSON file for the state of the search, empty for no checkpoints
+        - processes: number of worker processes, None for one per CPU
+        - batchSize: number of candidates per batch
+        - seed: seed of the random number generator"""
+        self.settings = {"r" : r, "cutterDiameter" : cutterDiameter, "gap" : gap, "legLength" : legLength, "compact" : compact,
+                         "sampleRadius" : sampleRadius, "sampleHeight" : sampleHeight, "sheetWidth" : sheetWidth,
+                         "sheetHeight" : sheetHeight, "minGap" : minGap, "minTraceWidth" : minTraceWidth,
+                         "tolerance" : tolerance, "gridPoints" : gridPoints}
+
+        self.bounds = {"h" : (2.*sampleHeight, 4.*r + sampleHeight),
+                       "alpha" : (90., 150.),
+                       "width" : (0.1*r, 0.5*r),
+                       "cornerRadius" : (cutterDiameter, cutterDiameter + 1.)}
+        if bounds:
+            self.bounds.update(bounds)
+
+        self.resolution = {"h" : 0.1, "alpha" : 0.5, "width" : 0.05, "cornerRadius" : 0.05}
+        if resolution:
+            self.resolution.update(resolution)
+
+        self.checkpoint = checkpoint
+        self.processes = processes
+        self.batchSize = batchSize
+
+        self.random = random.Random(seed)
+        self.iteration = 0
+        self.scale = 0.2
+        self.results = {}
+        self.stats = {"evaluations" : 0, "memoized" : 0}
+
+        if checkpoint and os.path.exists(checkpoint):
+            self.loadCheckpoint()
+
+    def key(self, parameters):
+        return tuple(repr(parameters[p]) for p in PARAMETERS)
+
+    def round(self, parameters):
+        """Clip the parameters to the bounds and round them to the resolution."""
+        rounded = {}
+        for p in PARAMETERS:
+            lo, hi = self.bounds[p]
+            step = self.resolution[p]
+            value = min(max(parameters[p], lo), hi)
+            rounded[p] = round(round(value/step)*step, 6)
+        return rounded
+
+    def best(self, n = 1):
+        """Return the n best feasible results."""
+        feasible = [r for r in self.results.values() if r["feasible"]]
+        feasible.sort(key = lambda r: (-r["score"], r["meanDeviation"]))
+        return feasible[:n]
+
+    def candidates(self):
+        """Return the parameters of the next batch."""
+        parents = self.best(max(2, self.batchSize//4))
+        batch = []
+        for k in range(self.batchSize):
+            if parents:
+                parent = parents[k % len(parents)]["parameters"]
+                candidate = dict((p, self.random.gauss(parent[p], self.scale*(self.bounds[p][1] - self.bounds[p][0]))) for p in PARAMETERS)
+            else:
+                candidate = dict((p, self.random.uniform(*self.bounds[p])) for p in PARAMETERS)
+            batch.append(self.round(candidate))
+        return batch
+
+    def evaluate(self, candidates, pool = None):
+        """Evaluate a list of parameter dictionaries, using stored results where possible. Returns the results."""
+        new = []
+        for c in candidates:
+            if self.key(c) in self.results or any(self.key(c) == self.key(n) for n in new):
+                self.stats["memoized"] += 1
+            else:
+                new.append(c)
+
+        jobs = [(c, self.settings) for c in new]
+        if pool is None:
+            computed = [evaluate(j) for j in jobs]
+        else:
+            computed = pool.map(evaluate, jobs)
+
+        for r in computed:
+            self.results[self.key(r["parameters"])] = r
+        self.stats["evaluations"] += len(computed)
+        return [self.results[self.key(c)] for c in candidates]
+
+    def run(self, iterations = 10, callback = None):
+        """Run batches until iterations batches (including those of a resumed checkpoint) are done.
+
+        - callback: optional function called with the optimizer after every batch
+
+        Returns the best result or None if no feasible design was found."""
+        pool = None
+        if self.processes != 1:
+            pool = multiprocessing.Pool(self.processes)
+        try:
+            while self.iteration < iterations:
+                self.evaluate(self.candidates(), pool)
+                self.iteration += 1
+                self.scale = max(0.01, 0.85*self.scale)
+                if self.checkpoint:
+                    self.saveCheckpoint()
+                if callback is not None:
+                    callback(self)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        best = self.best()
+        return best[0] if best else None
+
+    def saveCheckpoint(self):
+        """Write the state of the search. The file is replaced in one step, an interrupted write leaves the old one."""
+        state = {"version" : CHECKPOINT_VERSION,
+                 "settings" : self.settings,
+                 "bounds" : self.bounds,
+                 "resolution" : self.resolution,
+                 "iteration" : self.iteration,
+                 "scale" : self.scale,
+                 "random" : self.random.getstate(),
+                 "results" : self.results.values()}
+        f = open(self.checkpoint + ".tmp", "w")
+        json.dump(state, f)
+        f.close()
+        os.rename(self.checkpoint + ".tmp", self.checkpoint)
+
+    def loadCheckpoint(self):
+        """Continue from the checkpoint file. Raises ValueError if it belongs to a different search."""
+        f = open(self.checkpoint)
+        state = json.load(f)
+        f.close()
+
+        if state.get("version") != CHECKPOINT_VERSION:
+            raise ValueError("Checkpoint {0} was written by a different version of the optimizer.".format(self.checkpoint))
+        if state["settings"] != json.loads(json.dumps(self.settings)):
+            raise ValueError("Checkpoint {0} belongs to a search with different settings.".format(self.checkpoint))
+
+        self.bounds = dict((p, tuple(b)) for p, b in state["bounds"].items())
+        self.resolution = state["resolution"]
+        self.iteration = state["iteration"]
+        self.scale = state["scale"]
+        version, internal, gauss = state["random"]
+        self.random.setstate((version, tuple(internal), gauss))
+        self.results = dict((self.key(r["parameters"]), r) for r in state["results"])
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Optimize the field homogeneity of a SaddleCoil.")
+    parser.add_argument("r", type = float, help = "radius of the coil in mm")
+    parser.add_argument("cutterDiameter", type = float, help = "diameter of the cutter in mm")
+    parser.add_argument("--sample-radius", type = float, required = True, help = "radius of the sample volume in mm")
+    parser.add_argument("--sample-height", type = float, required = True, help = "height of the sample volume in mm")
+    parser.add_argument("--gap", type = float, default = 1)
+    parser.add_argument("--leg-length", type = float, default = 10)
+    parser.add_argument("--compact", action = "store_true")
+    parser.add_argument("--sheet", type = float, nargs = 2, metavar = ("WIDTH", "HEIGHT"), help = "size of the copper sheet in mm")
+    parser.add_argument("--min-gap", type = float, default = 0, help = "smallest gap between traces in mm")
+    parser.add_argument("--tolerance", type = float, default = 5, help = "B1 tolerance in percent")
+    parser.add_argument("--grid-points", type = int, default = 15, help = "field sample points along every axis")
+    parser.add_argument("--iterations", type = int, default = 20, help = "number of batches")
+    parser.add_argument("--batch-size", type = int, default = 16)
+    parser.add_argument("--processes", type = int, default = None)
+    parser.add_argument("--checkpoint", default = "", help = "JSON file to save and resume the search")
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args(argv)
+
+    sheetWidth, sheetHeight = args.sheet if args.sheet else (None, None)
+    optimizer = CoilOptimizer(args.r, args.cutterDiameter, args.sample_radius, args.sample_height, gap = args.gap,
+                              legLength = args.leg_length, compact = args.compact, sheetWidth = sheetWidth,
+                              sheetHeight = sheetHeight, minGap = args.min_gap, tolerance = args.tolerance,
+                              gridPoints = args.grid_points, checkpoint = args.checkpoint, processes = args.processes,
+                              batchSize = args.batch_size, seed = args.seed)
+
+    def progress(o):
+        best = o.best()
+        if best:
+            print "batch {0}: best {1:.1f} % within +-{2} %, {3}".format(o.iteration, 100*best[0]["score"], args.tolerance, best[0]["parameters"])
+        else:
+            print "batch {0}: no feasible design yet".format(o.iteration)
+
+    best = optimizer.run(args.iterations, progress)
+    if best is None:
+        print "No feasible design found."
+    else:
+        print json.dumps(best, indent = 2, sort_keys = True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+import argparse
+import hashlib
+import inspect
+import json
+import math
+import sqlite3
+import sys
+import time
+
+from coilCache import generateKey, canonicalParameters
+from coilCalculator import SaddleCoil
+
+#A queryable catalog of generated coil designs in an SQLite database.
+#
+#Every entry holds the constructor parameters of a SaddleCoil or SimpleSaddleCoil, the feed, the size of the coil
+#(maxX, maxY), the length of its cuts, the number of segments and arcs and the sha1 hash of its G-Code. Parameters and
+#sizes are plain columns. The indexes of the key parameters also hold maxX and maxY, so a range query with a size
+#limit only reads the rows that match both.
+#The key of an entry is the key under which coilCache stores the files of the same design, which links the catalog to
+#the cached .txt/.tex artifacts (artifacts, generate).
+#
+#Designs are added one by one (add), many in one transaction (addMany) or straight from a SaddleCoilBatch without
+#building SaddleCoil objects (addBatch). Adding a design that is already in the catalog replaces its entry.
+#
+#Example:
+#  catalog = DesignCatalog("designs.sqlite", CoilCache("coilcache"))
+#  catalog.add(SaddleCoil, {"h" : 12, "r" : 6, "alpha" : 120, "width" : 2.5, "cutterDiameter" : 1, "cornerRadius" : 1})
+#  for entry in catalog.query(r = (5, 8), fitsIn = (40, 30)):
+#      print entry["r"], entry["maxX"], entry["maxY"], catalog.artifacts(entry)
+#
+#  python designCatalog.py add coils.csv --catalog designs.sqlite
+#  python designCatalog.py query --catalog designs.sqlite --range r 5 8 --fits 40 30
+
+PARAMETER_COLUMNS = ["h", "r", "alpha", "width", "cutterDiameter", "gap", "legLength", "cornerRadius", "compact", "startAngle"]
+COLUMNS = (["id", "key", "class", "name"] + PARAMETER_COLUMNS +
+           ["feed", "maxX", "maxY", "cutLength", "segments", "arcs", "gcodeSha1", "created"])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS designs (
+    id INTEGER PRIMARY KEY,
+    key TEXT UNIQUE NOT NULL,
+    class TEXT NOT NULL,
+    name TEXT,
+    h REAL, r REAL, alpha REAL, width REAL, cutterDiameter REAL, gap REAL, legLength REAL,
+    cornerRadius REAL, compact INTEGER, startAngle REAL,
+    feed REAL,
+    maxX REAL, maxY REAL,
+    cutLength REAL, segments INTEGER, arcs INTEGER,
+    gcodeSha1 TEXT,
+    created REAL
+);
+CREATE INDEX IF NOT EXISTS designs_r ON designs (r, maxX, maxY);
+CREATE INDEX IF NOT EXISTS designs_h ON designs (h, maxX, maxY);
+CREATE INDEX IF NOT EXISTS designs_alpha ON designs (alpha, maxX, maxY);
+CREATE INDEX IF NOT EXISTS designs_width ON designs (width, maxX, maxY);
+CREATE INDEX IF NOT EXISTS designs_cutterDiameter ON designs (cutterDiameter, maxX, maxY);
+CREATE INDEX IF NOT EXISTS designs_size ON designs (maxX, maxY);
+CREATE INDEX IF NOT EXISTS designs_gcodeSha1 ON designs (gcodeSha1);
+"""
+
+
+def artifactKey(coilClass, parameters, feed = 7.5):
+    """Return the key of the design in a CoilCache, for the options CoilCache.generate uses by default."""
+    return generateKey(coilClass, parameters, feed)
+
+
+def _toolpathMetrics(toolpaths):
+    from toolpath import STRAIGHT
+    return {"cutLength" : sum(t.length() for t in toolpaths),
+            "segments" : sum(len(t) for t in toolpaths),
+            "arcs" : sum(int((t.segments["kind"] != STRAIGHT).sum()) for t in toolpaths)}
+
+
+def designEntry(coilClass, parameters, feed = 7.5, name = "", coil = None):
+    """Build a coil (unless it is given) and return its catalog entry as a dictionary."""
+    parameters = canonicalParameters(coilClass, parameters)
+    if coil is None:
+        coil = coilClass(**parameters)
+
+    if isinstance(coil, SaddleCoil):
+        from toolpath import Toolpath
+        metrics = _toolpathMetrics([Toolpath.fromPath(p) for p in coil.cuts])
+    else:
+        metrics = {"cutLength" : sum(math.sqrt((p2[0] - p1[0])**2 + (p2[1] - p1[1])**2) for p1, p2 in coil.lines),
+                   "segments" : len(coil.lines),
+                   "arcs" : 0}
+
+    entry = dict((k, parameters.get(k)) for k in PARAMETER_COLUMNS)
+    entry.update(metrics)
+    entry.update({"key" : artifactKey(coilClass, parameters, feed),
+                  "class" : coilClass.__name__,
+                  "name" : name,
+                  "feed" : float(feed),
+                  "maxX" : float(coil.maxX),
+                  "maxY" : float(coil.maxY),
+                  "gcodeSha1" : hashlib.sha1(coil.gCode(feed)).hexdigest()})
+    return entry
+
+
+def _batchGCodeLines(batch, k, toolpaths, feed):
+    #the program of SaddleCoil.gCodeLines
+    yield ";G-Code generated by coilCalculator.py\n"
+    yield ";maxX : {0:.3f}\n".format(batch.maxX[k])
+    yield ";maxY : {0:.3f}\n".format(batch.maxY[k])
+    yield "G90\n"
+    yield "G00 Z5.00\n"
+    yield "M10 O6.1\n"
+    for path in toolpaths:
+        for line in path.gCodeLines(feed):
+            yield line
+    yield "M10 O6.0\n"
+
+
+def batchEntries(batch, feed = 7.5, names = None):
+    """Return the catalog entries of all designs of a SaddleCoilBatch, identical to those of the single SaddleCoils."""
+    from toolpath import Toolpath
+
+    entries = []
+    for k in range(len(batch)):
+        parameters = {"h" : batch.h[k], "r" : batch.r[k], "alpha" : batch.alpha[k], "width" : batch.width[k],
+                      "cutterDiameter" : batch.cD[k], "gap" : batch.gap[k], "legLength" : batch.legLength[k],
+                      "cornerRadius" : batch.cornerRadius[k], "compact" : bool(batch.compact)}
+        parameters = canonicalParameters(SaddleCoil, dict((p, float(v) if p != "compact" else v) for p, v in parameters.items()))
+        toolpaths = Toolpath.fromBatch(batch, k)
+
+        entry = dict((p, parameters.get(p)) for p in PARAMETER_COLUMNS)
+        entry.update(_toolpathMetrics(toolpaths))
+        entry.update({"key" : artifactKey(SaddleCoil, parameters, feed),
+                      "class" : "SaddleCoil",
+                      "name" : names[k] if names is not None else "",
+                      "feed" : float(feed),
+                      "maxX" : float(batch.maxX[k]),
+                      "maxY" : float(batch.maxY[k]),
+                      "gcodeSha1" : hashlib.sha1("".join(_batchGCodeLines(batch, k, toolpaths, feed))).hexdigest()})
+        entries.append(entry)
+    return entries
+
+
+class DesignCatalog(object):
+    """An SQLite catalog of coil designs."""
+
+    def __init__(self, filename = "designs.sqlite", cache = None):
+        """- filename: database file, created if it does not exist, ":memory:" for a catalog in memory
+        - cache: optional coilCache.CoilCache that holds the files of the designs"""
+        self.filename = filename
+        self.cache = cache
+        self.connection = sqlite3.connect(filename, check_same_thread = False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM designs").fetchone()[0]
+
+    def close(self):
+        """Close the database and write the index of the cache, if there is one."""
+        self.connection.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    def insert(self, entries):
+        """Store entries (see designEntry) in one transaction. Returns the number of entries."""
+        names = COLUMNS[1:]
+        now = time.time()
+        rows = [[e.get(c, now if c == "created" else None) for c in names] for e in entries]
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO designs ({0}) VALUES ({1})".format(
+                ", ".join(names), ", ".join("?"*len(names))), rows)
+        return len(rows)
+
+    def add(self, coilClass, parameters, feed = 7.5, name = "", generate = False):
+        """Add a design and return its entry. With generate = True its files are also put into the cache."""
+        entry = designEntry(coilClass, parameters, feed, name)
+        if generate:
+            self.generate(entry)
+        self.insert([entry])
+        return entry
+
+    def addMany(self, designs, feed = 7.5):
+        """Add a list of (coilClass, parameters) or (coilClass, parameters, name) in one transaction.
+
+        Returns the number of designs added."""
+        entries = []
+        for design in designs:
+            coilClass, parameters = design[:2]
+            entries.append(designEntry(coilClass, parameters, feed, design[2] if len(design) > 2 else ""))
+        return self.insert(entries)
+
+    def addBatch(self, batch, feed = 7.5, names = None):
+        """Add all designs of a SaddleCoilBatch. Returns the number of designs added."""
+        return self.insert(batchEntries(batch, feed, names))
+
+    def _where(self, fitsIn, allowRotation, coilClass, ranges):
+        conditions = []
+        values = []
+        for column, bounds in sorted(ranges.items()):
+            self._checkColumn(column)
+            if isinstance(bounds, (tuple, list)):
+                low, high = bounds
+                if low is not None:
+                    conditions.append("{0} >= ?".format(column))
+                    values.append(low)
+                if high is not None:
+                    conditions.append("{0} <= ?".format(column))
+                    values.append(high)
+            else:
+                conditions.append("{0} = ?".format(column))
+                values.append(bounds)
+
+        if coilClass is not None:
+            conditions.append("class = ?")
+            values.append(coilClass if isinstance(coilClass, basestring) else coilClass.__name__)
+
+        if fitsIn is not None:
+            width, height = fitsIn
+            if allowRotation:
+                conditions.append("((maxX <= ? AND maxY <= ?) OR (maxX <= ? AND maxY <= ?))")
+                values += [width, height, height, width]
+            else:
+                conditions.append("maxX <= ? AND maxY <= ?")
+                values += [width, height]
+
+        if not conditions:
+            return "", values
+        return " WHERE " + " AND ".join(conditions), values
+
+    def query(self, fitsIn = None, allowRotation = False, coilClass = None, orderBy = None, limit = None, columns = None, **ranges):
+        """Return the matching entries as a list of dictionaries.
+
+        - fitsIn: optional (width, height) in mm the coil has to fit into
+        - allowRotation: with fitsIn, also accept coils that fit when turned by 90 degrees
+        - coilClass: optional, a class or its name
+        - orderBy: optional column, prefix with - for descending order
+        - limit: optional maximum number of entries
+        - columns: optional list of the columns to return, all by default
+        - ranges: column = value or column = (low, high), either bound may be None
+
+        Example: query(r = (5, 8), compact = False, fitsIn = (40, 30))"""
+        if columns is None:
+            selected = "*"
+        else:
+            for column in columns:
+                self._checkColumn(column)
+            selected = ", ".join(columns)
+
+        where, values = self._where(fitsIn, allowRotation, coilClass, ranges)
+        sql = "SELECT {0} FROM designs{1}".format(selected, where)
+        if orderBy is not None:
+            column = orderBy.lstrip("-")
+            self._checkColumn(column)
+            sql += " ORDER BY {0}{1}".format(column, " DESC" if orderBy.startswith("-") else "")
+        if limit is not None:
+            sql += " LIMIT {0:d}".format(limit)
+        return [dict(row) for row in self.connection.execute(sql, values)]
+
+    def count(self, fitsIn = None, allowRotation = False, coilClass = None, **ranges):
+        """Return the number of matching entries, see query."""
+        where, values = self._where(fitsIn, allowRotation, coilClass, ranges)
+        return self.connection.execute("SELECT COUNT(*) FROM designs" + where, values).fetchone()[0]
+
+    def sameGCode(self, gcodeSha1):
+        """Return all entries whose G-Code has the given hash, e.g. designs that differ only in unused parameters."""
+        return self.query(gcodeSha1 = gcodeSha1)
+
+    def _checkColumn(self, column):
+        if column not in COLUMNS:
+            raise ValueError("Unknown column {0}, use one of {1}.".format(column, ", ".join(COLUMNS)))
+
+    def _parameters(self, entry):
+        from designService import coilClass
+        cls = coilClass(entry["class"])
+        names = inspect.getargspec(cls.__init__).args[1:]
+        parameters = dict((k, entry[k]) for k in names if entry.get(k) is not None)
+        if "compact" in parameters:
+            #stored as an integer
+            parameters["compact"] = bool(parameters["compact"])
+        return cls, parameters
+
+    def artifacts(self, entry):
+        """Return the cached files of an entry (a dictionary extension -> file name), None if they are not cached."""
+        if self.cache is None:
+            return None
+        return self.cache.lookup(entry["key"])
+
+    def generate(self, entry):
+        """Return the cached files of an entry, generating them if needed. Needs a cache."""
+        if self.cache is None:
+            raise ValueError("The catalog has no CoilCache for the files of its designs.")
+        cls, parameters = self._parameters(entry)
+        return self.cache.generate(cls, parameters, feed = entry["feed"])
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Record coil designs in a catalog and query it.")
+    parser.add_argument("--catalog", default = "designs.sqlite", help = "SQLite file of the catalog")
+    parser.add_argument("--cache", default = None, help = "directory of the CoilCache with the files of the designs")
+    commands = parser.add_subparsers(dest = "command")
+
+    add = commands.add_parser("add", help = "add the SaddleCoils of a CSV or JSON spec file, see batchRunner.py")
+    add.add_argument("specs")
+    add.add_argument("--generate", action = "store_true", help = "also put the files of the designs into the cache")
+
+    query = commands.add_parser("query", help = "list designs")
+    query.add_argument("--range", nargs = 3, action = "append", default = [], metavar = ("COLUMN", "LOW", "HIGH"),
+                       help = "column between LOW and HIGH, repeat for several columns")
+    query.add_argument("--fits", type = float, nargs = 2, metavar = ("WIDTH", "HEIGHT"), help = "size the coil has to fit into in mm")
+    query.add_argument("--rotate", action = "store_true", help = "with --fits, also accept coils turned by 90 degrees")
+    query.add_argument("--order-by", default = None, help = "column, prefix with - for descending order")
+    query.add_argument("--limit", type = int, default = None)
+    query.add_argument("--json", action = "store_true", help = "print the entries as JSON")
+    args = parser.parse_args(argv)
+
+    cache = None
+    if args.cache:
+        from coilCache import CoilCache
+        cache = CoilCache(args.cache)
+    catalog = DesignCatalog(args.catalog, cache)
+
+    try:
+        if args.command == "add":
+            from batchRunner import readSpecs, COIL_ARGUMENTS
+            n = 0
+            skipped = 0
+            for spec in readSpecs(args.specs):
+                if "error" in spec:
+                    sys.stderr.write("{0} skipped: {1}\n".format(spec["name"], spec["error"]))
+                    skipped += 1
+                    continue
+                parameters = dict((k, spec[k]) for k in COIL_ARGUMENTS if k in spec)
+                try:
+                    catalog.add(SaddleCoil, parameters, spec.get("feed", 7.5), spec["name"], args.generate and cache is not None)
+                except Exception as e:
+                    #one degenerate design must not abort the import of the others
+                    sys.stderr.write("{0} skipped: {1}: {2}\n".format(spec["name"], type(e).__name__, e))
+                    skipped += 1
+                    continue
+                n += 1
+            print "{0} designs added, {1} skipped, {2} in the catalog".format(n, skipped, len(catalog))
+            return 1 if skipped else 0
+
+        ranges = dict((column, (float(low), float(high))) for column, low, high in args.range)
+        try:
+            entries = catalog.query(fitsIn = args.fits, allowRotation = args.rotate, orderBy = args.order_by, limit = args.limit, **ranges)
+        except ValueError as e:
+            parser.error(str(e))
+        if args.json:
+            for entry in entries:
+                entry["artifacts"] = catalog.artifacts(entry)
+            print json.dumps(entries, indent = 2, sort_keys = True)
+            return
+        for e in entries:
+            print "{0:<16} {1:<16} h {2:g} r {3:g} alpha {4:g} width {5:g} cutter {6:g}: {7:.2f} x {8:.2f} mm, {9:.1f} mm cut".format(
+                e["name"] or e["key"][:12], e["class"], e["h"], e["r"], e["alpha"], e["width"], e["cutterDiameter"],
+                e["maxX"], e["maxY"], e["cutLength"])
+        print "{0} designs".format(len(entries))
+    finally:
+        catalog.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
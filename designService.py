@@ -0,0 +1,465 @@
+import argparse
+import bisect
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import urlparse
+import BaseHTTPServer
+import Queue
+
+from collections import OrderedDict
+
+from coilCache import cacheKey, canonicalParameters
+from coilCalculator import SaddleCoil, CLOCKWISE, COUNTERCLOCKWISE, coilSegments
+
+#A long running local HTTP service that generates coils for interactive tools.
+#
+#Starting Python, importing NumPy and building a coil for every preview is slow. The service keeps the generators
+#imported, builds designs on a pool of worker processes (which stay warm between requests) and keeps the results of
+#recent requests in memory:
+#
+#- DesignCache is a bounded least recently used store of finished designs. A request that is already being computed
+#  is not started a second time, the later requests wait for the first one and share its result.
+#- Connections are handled by a fixed number of threads, so slow clients do not hold up the others.
+#- Every request is timed, /metrics returns the cache statistics and latency histograms as JSON.
+#
+#Endpoints:
+#
+#  GET  /design?class=SaddleCoil&h=12&r=6&alpha=120&width=2.5&cutterDiameter=1&cornerRadius=1&outputs=gcode,svg
+#  POST /design   {"class" : "SaddleCoil", "parameters" : {"h" : 12, ...}, "outputs" : ["svg", "metrics"]}
+#  GET  /metrics
+#
+#Besides the constructor parameters of SaddleCoil or SimpleSaddleCoil a design request takes feed (7.5), scale (1),
+#includePoints (false) and outputs, any of gcode, tikz, svg and metrics (default all). The answer is a JSON object with
+#maxX, maxY and the requested outputs; metrics holds the cut length, the number of cuts, segments and arcs and the
+#cycle time estimated by gCodeSimulator. Invalid designs are answered with status 400 and an error message.
+#
+#Example:
+#  python designService.py --port 8017 --processes 4
+#  curl "http://127.0.0.1:8017/design?h=12&r=6&alpha=120&width=2.5&cutterDiameter=1&cornerRadius=1&outputs=svg"
+
+OUTPUTS = ["gcode", "tikz", "svg", "metrics"]
+COIL_CLASSES = ["SaddleCoil", "SimpleSaddleCoil"]
+BOOL_PARAMETERS = ["compact", "includePoints"]
+
+#upper bounds of the latency histogram buckets in s, the last bucket is open
+LATENCY_BUCKETS = [0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1., 2., 5.]
+
+
+def coilClass(name):
+    """Return the coil class of the given name."""
+    if name == "SaddleCoil":
+        return SaddleCoil
+    if name == "SimpleSaddleCoil":
+        from simpleSaddleCoil import SimpleSaddleCoil
+        return SimpleSaddleCoil
+    raise ValueError("Unknown coil class {0!r}, use one of {1}.".format(name, ", ".join(COIL_CLASSES)))
+
+
+def parseRequest(request):
+    """Check a design request (a dictionary as in the POST body) and fill in the defaults.
+
+    Returns (className, parameters, options) with options feed, scale, includePoints and outputs."""
+    className = request.get("class", "SaddleCoil")
+    parameters = canonicalParameters(coilClass(className), request.get("parameters", {}))
+
+    outputs = request.get("outputs", OUTPUTS)
+    if isinstance(outputs, basestring):
+        outputs = [o for o in outputs.split(",") if o]
+    unknown = set(outputs) - set(OUTPUTS)
+    if unknown:
+        raise ValueError("Unknown outputs {0}, use any of {1}.".format(", ".join(sorted(unknown)), ", ".join(OUTPUTS)))
+
+    options = {"feed" : float(request.get("feed", 7.5)),
+               "scale" : float(request.get("scale", 1)),
+               "includePoints" : bool(request.get("includePoints", False)),
+               "outputs" : sorted(set(outputs))}
+    return className, parameters, options
+
+
+def requestFromQuery(query):
+    """Turn the query string of a GET request into a design request."""
+    from batchRunner import parseBool
+
+    values = dict((k, v[-1]) for k, v in urlparse.parse_qs(query).items())
+    request = {"parameters" : {}}
+    for k, v in values.items():
+        if k in ("class", "outputs"):
+            request[k] = v
+        elif k in BOOL_PARAMETERS:
+            target = request if k == "includePoints" else request["parameters"]
+            target[k] = parseBool(v)
+        elif k in ("feed", "scale"):
+            request[k] = float(v)
+        else:
+            request["parameters"][k] = float(v)
+    return request
+
+
+def buildDesign(job):
+    """Build a coil and its outputs. job is (className, parameters, options) as returned by parseRequest.
+
+    Returns a dictionary that can be sent as JSON."""
+    className, parameters, options = job
+    coil = coilClass(className)(**parameters)
+    outputs = options["outputs"]
+
+    design = {"class" : className, "parameters" : parameters, "maxX" : coil.maxX, "maxY" : coil.maxY}
+    gCode = None
+    if "gcode" in outputs or "metrics" in outputs:
+        gCode = coil.gCode(options["feed"])
+    if "gcode" in outputs:
+        design["gcode"] = gCode
+    if "tikz" in outputs:
+        design["tikz"] = coil.tikzCode()
+    if "svg" in outputs:
+        from svgRenderer import renderSVG
+        design["svg"] = renderSVG(coil, includePoints = options["includePoints"], scale = options["scale"])
+    if "metrics" in outputs:
+        design["metrics"] = designMetrics(coil, gCode)
+    return design
+
+
+def designMetrics(coil, gCode):
+    """Cut length, number of cuts, segments and arcs, and the cycle time estimated for the G-Code."""
+    import gCodeSimulator
+
+    if isinstance(coil, SaddleCoil):
+        from toolpath import Toolpath
+        paths = [Toolpath.fromPath(p) for p in coil.cuts]
+        cutLength = sum(p.length() for p in paths)
+    else:
+        cutLength = sum(((p2[0] - p1[0])**2 + (p2[1] - p1[1])**2)**0.5 for p1, p2 in coil.lines)
+
+    cuts = coilSegments(coil)
+    segments = [s for p0, path in cuts for s in path]
+    estimate = gCodeSimulator.estimate(gCode)[0]
+    return {"cutLength" : cutLength,
+            "cuts" : len(cuts),
+            "segments" : len(segments),
+            "arcs" : sum(1 for s in segments if s[0] in (CLOCKWISE, COUNTERCLOCKWISE)),
+            "cycleTime" : estimate["cycleTime"]}
+
+
+def _initWorker():
+    #the generators print their results, keep the console of the service clean. Importing them here makes the
+    #first request of every worker as fast as the following ones.
+    sys.stdout = open(os.devnull, "w")
+    coilClass("SaddleCoil")
+    coilClass("SimpleSaddleCoil")
+    import gCodeSimulator, svgRenderer, toolpath
+
+
+class _Pending(object):
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class DesignCache(object):
+    """Thread safe least recently used store of designs that computes every missing design only once."""
+
+    def __init__(self, maxSize = 256):
+        self.maxSize = maxSize
+        self.entries = OrderedDict()
+        self.inFlight = {}
+        self.stats = {"hits" : 0, "misses" : 0, "shared" : 0, "evictions" : 0}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def hitRate(self):
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["shared"]
+        return (self.stats["hits"] + self.stats["shared"])/float(lookups) if lookups else 0.
+
+    def get(self, key, compute):
+        """Return (value, source) for key. source is "hit" for a stored value, "shared" if the value was computed for
+        a concurrent request with the same key and "miss" if compute() was called for it.
+
+        Exceptions of compute are passed on to all waiting requests and are not stored."""
+        with self.lock:
+            value = self.entries.pop(key, None)
+            if value is not None:
+                self.entries[key] = value
+                self.stats["hits"] += 1
+                return value, "hit"
+            pending = self.inFlight.get(key)
+            owner = pending is None
+            if owner:
+                pending = self.inFlight[key] = _Pending()
+                self.stats["misses"] += 1
+            else:
+                self.stats["shared"] += 1
+
+        if not owner:
+            pending.event.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value, "shared"
+
+        try:
+            pending.value = compute()
+        except Exception as e:
+            pending.error = e
+            raise
+        else:
+            with self.lock:
+                self.entries[key] = pending.value
+                while len(self.entries) > self.maxSize:
+                    self.entries.popitem(last = False)
+                    self.stats["evictions"] += 1
+        finally:
+            with self.lock:
+                del self.inFlight[key]
+            pending.event.set()
+        return pending.value, "miss"
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class LatencyHistogram(object):
+    """Counts of durations in the buckets of LATENCY_BUCKETS."""
+
+    def __init__(self, buckets = LATENCY_BUCKETS):
+        self.buckets = list(buckets)
+        self.counts = [0]*(len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.
+        self.maximum = 0.
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self.lock:
+            self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self.count += 1
+            self.total += seconds
+            self.maximum = max(self.maximum, seconds)
+
+    def quantile(self, q):
+        """Upper bound of the bucket that holds the q quantile, None if it is in the open bucket or nothing was counted."""
+        with self.lock:
+            if not self.count:
+                return None
+            seen = 0
+            for bound, n in zip(self.buckets, self.counts):
+                seen += n
+                if seen >= q*self.count:
+                    return bound
+            return None
+
+    def report(self):
+        with self.lock:
+            buckets = [{"le" : b, "count" : n} for b, n in zip(self.buckets, self.counts)]
+            buckets.append({"le" : None, "count" : self.counts[-1]})
+            report = {"buckets" : buckets, "count" : self.count, "sum" : self.total, "max" : self.maximum,
+                      "mean" : self.total/self.count if self.count else None}
+        report["p50"] = self.quantile(0.5)
+        report["p99"] = self.quantile(0.99)
+        return report
+
+
+class DesignService(object):
+    """Designs with caching and metrics, independent of HTTP."""
+
+    def __init__(self, cacheSize = 256, processes = None):
+        """- cacheSize: number of designs kept in memory
+        - processes: size of the pool of worker processes that build the designs, None for one per CPU,
+          0 to build them in the calling thread"""
+        self.cache = DesignCache(cacheSize)
+        self.pool = multiprocessing.Pool(processes, _initWorker) if processes != 0 else None
+        self.latency = {}
+        self.requests = {}
+        self.errors = 0
+        self.started = time.time()
+        self.lock = threading.Lock()
+
+    def _histogram(self, name):
+        with self.lock:
+            if name not in self.latency:
+                self.latency[name] = LatencyHistogram()
+            return self.latency[name]
+
+    def record(self, name, seconds):
+        with self.lock:
+            self.requests[name] = self.requests.get(name, 0) + 1
+        self._histogram(name).observe(seconds)
+
+    def design(self, request):
+        """Return the design of a request (see parseRequest) and whether it was a cache "hit", "miss" or "shared"."""
+        start = time.time()
+        try:
+            job = parseRequest(request)
+            key = cacheKey(coilClass(job[0]), job[1], job[2])
+            if self.pool is None:
+                design, source = self.cache.get(key, lambda: buildDesign(job))
+            else:
+                design, source = self.cache.get(key, lambda: self.pool.apply(buildDesign, (job,)))
+        except Exception:
+            with self.lock:
+                self.errors += 1
+            self.record("design.error", time.time() - start)
+            raise
+        self.record("design." + source, time.time() - start)
+        return design, source
+
+    def metrics(self):
+        with self.lock:
+            names = sorted(self.latency)
+            requests = dict(self.requests)
+            errors = self.errors
+        cache = dict(self.cache.stats)
+        cache.update({"size" : len(self.cache), "maxSize" : self.cache.maxSize, "inFlight" : len(self.cache.inFlight),
+                      "hitRate" : self.cache.hitRate()})
+        return {"uptime" : time.time() - self.started,
+                "requests" : requests,
+                "errors" : errors,
+                "cache" : cache,
+                "latency" : dict((name, self.latency[name].report()) for name in names)}
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+
+
+class DesignRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, status, body):
+        data = json.dumps(body)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _design(self, request):
+        try:
+            design, source = self.server.service.design(request)
+        except (TypeError, ValueError, AssertionError, ArithmeticError) as e:
+            #invalid parameters, or a design whose geometry cannot be computed, e.g. a ZeroDivisionError
+            self._send(400, {"error" : "{0}: {1}".format(type(e).__name__, e)})
+            return
+        except Exception as e:
+            self._send(500, {"error" : "{0}: {1}".format(type(e).__name__, e)})
+            return
+        response = dict(design)
+        response["cache"] = source
+        self._send(200, response)
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        if url.path == "/design":
+            try:
+                request = requestFromQuery(url.query)
+            except ValueError as e:
+                self._send(400, {"error" : "ValueError: {0}".format(e)})
+                return
+            self._design(request)
+        elif url.path == "/metrics":
+            start = time.time()
+            self._send(200, self.server.service.metrics())
+            self.server.service.record("metrics", time.time() - start)
+        else:
+            self._send(404, {"error" : "Unknown path {0}, use /design or /metrics.".format(url.path)})
+
+    def do_POST(self):
+        if urlparse.urlparse(self.path).path != "/design":
+            self._send(404, {"error" : "Unknown path {0}, use /design.".format(self.path)})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            if not isinstance(request, dict):
+                raise ValueError("the body has to be a JSON object")
+        except ValueError as e:
+            self._send(400, {"error" : "ValueError: {0}".format(e)})
+            return
+        self._design(request)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+class DesignServer(BaseHTTPServer.HTTPServer):
+    """HTTP server that hands its connections to a fixed number of threads."""
+
+    daemon_threads = True
+
+    def __init__(self, address, service, threads = 8, verbose = False):
+        """- address: (host, port), port 0 picks a free port
+        - service: the DesignService
+        - threads: number of connections handled at the same time"""
+        BaseHTTPServer.HTTPServer.__init__(self, address, DesignRequestHandler)
+        self.service = service
+        self.verbose = verbose
+        self._requests = Queue.Queue()
+        self._threads = []
+        for n in range(threads):
+            t = threading.Thread(target = self._work)
+            t.daemon = True
+            t.start()
+            self._threads.append(t)
+
+    @property
+    def url(self):
+        return "http://{0}:{1}".format(*self.server_address[:2])
+
+    def process_request(self, request, clientAddress):
+        self._requests.put((request, clientAddress))
+
+    def _work(self):
+        while True:
+            item = self._requests.get()
+            if item is None:
+                break
+            request, clientAddress = item
+            try:
+                self.finish_request(request, clientAddress)
+            except Exception:
+                self.handle_error(request, clientAddress)
+            finally:
+                self.shutdown_request(request)
+
+    def server_close(self):
+        BaseHTTPServer.HTTPServer.server_close(self)
+        for t in self._threads:
+            self._requests.put(None)
+
+
+def serve(host = "127.0.0.1", port = 8017, cacheSize = 256, processes = None, threads = 8, verbose = False):
+    """Run the service until it is interrupted."""
+    service = DesignService(cacheSize, processes)
+    server = DesignServer((host, port), service, threads, verbose)
+    print "design service on {0}".format(server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Serve G-Code, TikZ, SVG and metrics of coils over HTTP.")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 8017)
+    parser.add_argument("--cache-size", type = int, default = 256, help = "number of designs kept in memory")
+    parser.add_argument("--processes", type = int, default = None, help = "worker processes that build the designs, 0 for none")
+    parser.add_argument("--threads", type = int, default = 8, help = "connections handled at the same time")
+    parser.add_argument("--verbose", action = "store_true", help = "log every request")
+    args = parser.parse_args(argv)
+    serve(args.host, args.port, args.cache_size, args.processes, args.threads, args.verbose)
+
+
+if __name__ == "__main__":
+    main()
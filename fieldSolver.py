@@ -0,0 +1,163 @@
+import numpy as np
+
+#Magnetic field (B1) of a SaddleCoil after it has been wrapped onto its cylinder.
+#
+#The conductor is modelled by the middle of the copper trace, taken from the corner points of the cuts: corner k of
+#the first cut faces corner n - 1 - k across the trace. The current enters through the first leg, runs up into the
+#left loop (angles 0 to alpha), along the strip at y = 0 to the right loop (180 to 180 + alpha) and around it to the
+#end of the trace at angle 180. A jumper across the bottom trace connects this end to the second leg (the copper
+#inside the cut points2), and the feed between the ends of both legs closes the circuit. The closed path is wrapped
+#onto the cylinder of radius r with SaddleCoil.xToAngle, circumferential pieces become polygons with a small angular
+#step.
+#
+#The field of every straight piece follows from the Biot-Savart law for a finite straight wire. Sample points are
+#processed in chunks, so that memory stays bounded, and the chunks can be spread over a process pool.
+#
+#Coordinates: z is the axis of the cylinder, the center of the coil (at half the height h) is the origin.
+#Lengths are in mm, fields in T for the given current in A.
+#
+#Example:
+#  coil = SaddleCoil(12, 6, 120, 2.5, 1, cornerRadius = 1)
+#  result = homogeneity(coil, n = 21, tolerances = (1, 5, 10))
+#  print result["centerFieldMagnitude"], result["volumeFraction"]
+
+MU0 = 4e-7*np.pi
+
+
+def conductor(coil, includeLegs = True):
+    """Return the closed path of the current through a SaddleCoil as (n, 2) points, the last point is the first.
+
+    The points are in sheet coordinates before the shift to x, y > 0, i.e. x = angleToX(angle) and y = 0 at the
+    bottom trace. With includeLegs = False the path is closed directly between the roots of the legs."""
+    shift = coil.shift
+    points = [(p.x + shift.x, p.y + shift.y) for p in coil.points]
+    legCut = [(p.x + shift.x, p.y + shift.y) for p in coil.points2]
+
+    #middle of the copper between facing corners of the first cut, from the first leg to the end of the trace
+    n = len(points)
+    line = [((points[k][0] + points[n - 1 - k][0])/2., (points[k][1] + points[n - 1 - k][1])/2.) for k in range(n//2)]
+
+    if includeLegs:
+        #jumper from the end of the trace down to the second leg, then along the middle of the second leg
+        yLeg = (legCut[0][1] + legCut[3][1])/2.
+        line += [(line[-1][0], yLeg), (legCut[1][0], yLeg)]
+    else:
+        line = line[1:]
+    line.append(line[0])
+    return np.array(line, dtype = float)
+
+
+def wrap(coil, line, maxAngle = 2.):
+    """Wrap a polyline in sheet coordinates onto the cylinder of the coil.
+
+    - line: (n, 2) points as returned by conductor
+    - maxAngle: largest angle in degrees spanned by one straight piece of a circumferential segment
+
+    Returns (m, 3) points on the cylinder."""
+    angles = [coil.xToAngle(line[0, 0])]
+    heights = [line[0, 1]]
+    for (x1, y1), (x2, y2) in zip(line[:-1], line[1:]):
+        a1 = coil.xToAngle(x1)
+        a2 = coil.xToAngle(x2)
+        steps = max(1, int(np.ceil(abs(a2 - a1)/maxAngle)))
+        t = np.arange(1, steps + 1)/float(steps)
+        angles.extend(a1 + t*(a2 - a1))
+        heights.extend(y1 + t*(y2 - y1))
+
+    theta = np.radians(angles)
+    z = np.array(heights) - coil.h/2.
+    return np.column_stack([coil.r*np.cos(theta), coil.r*np.sin(theta), z])
+
+
+def biotSavart(points, starts, ends, current = 1.):
+    """Field in T at (n, 3) points (in mm) of straight wires from starts to ends ((m, 3), in mm) carrying current (in A).
+
+    Uses the closed form for a finite straight wire, evaluated for all points and wires at once."""
+    r1 = (starts[np.newaxis, :, :] - points[:, np.newaxis, :])*1e-3
+    r2 = (ends[np.newaxis, :, :] - points[:, np.newaxis, :])*1e-3
+    l1 = np.sqrt(np.sum(r1**2, axis = 2))
+    l2 = np.sqrt(np.sum(r2**2, axis = 2))
+    cross = np.cross(r1, r2)
+    denominator = l1*l2*(l1*l2 + np.sum(r1*r2, axis = 2))
+    #points on a wire or its extension have no well defined field contribution
+    factor = np.where(np.abs(denominator) > 1e-30, (l1 + l2)/np.where(np.abs(denominator) > 1e-30, denominator, 1.), 0.)
+    return MU0*current/(4*np.pi)*np.sum(cross*factor[:, :, np.newaxis], axis = 1)
+
+
+def _fieldChunk(arguments):
+    points, starts, ends, current = arguments
+    return biotSavart(points, starts, ends, current)
+
+
+def field(coil, points, current = 1., processes = 1, chunkSize = 500, maxAngle = 2.):
+    """Field in T of a SaddleCoil at (n, 3) points in mm.
+
+    - processes: number of worker processes, None for one per CPU. With 1 everything runs in this process.
+    - chunkSize: number of points evaluated at once, memory grows with chunkSize times the number of wire pieces
+    - maxAngle: angular step of the wrapped circumferential segments in degrees"""
+    wire = wrap(coil, conductor(coil), maxAngle)
+    starts = wire[:-1]
+    ends = wire[1:]
+    points = np.asarray(points, dtype = float).reshape(-1, 3)
+
+    chunks = [(points[k:k + chunkSize], starts, ends, current) for k in range(0, len(points), chunkSize)]
+    if processes == 1 or len(chunks) < 2:
+        results = [_fieldChunk(c) for c in chunks]
+    else:
+        from multiprocessing import Pool
+        pool = Pool(processes)
+        try:
+            results = pool.map(_fieldChunk, chunks)
+        finally:
+            pool.close()
+            pool.join()
+
+    if len(results) == 0:
+        return np.zeros((0, 3))
+    return np.vstack(results)
+
+
+def sampleGrid(coil, n = 21, radiusFraction = 0.75, heightFraction = 0.75):
+    """Return the points of a cubic grid with n points along every axis inside the cylinder of radius
+    radiusFraction*r and height heightFraction*h around the center of the coil."""
+    radius = radiusFraction*coil.r
+    height = heightFraction*coil.h
+    x = np.linspace(-radius, radius, n)
+    z = np.linspace(-height/2., height/2., n)
+    gx, gy, gz = np.meshgrid(x, x, z, indexing = "ij")
+    inside = gx**2 + gy**2 <= radius**2*(1 + 1e-12)
+    return np.column_stack([gx[inside], gy[inside], gz[inside]])
+
+
+def homogeneity(coil, n = 21, tolerances = (1, 5, 10), radiusFraction = 0.75, heightFraction = 0.75, current = 1.,
+                processes = 1, chunkSize = 500, maxAngle = 2.):
+    """Compute the field of a coil on a sample grid and its homogeneity.
+
+    The B1 field is the component of the field along the direction of the field at the center.
+
+    - n, radiusFraction, heightFraction: sample volume, see sampleGrid
+    - tolerances: deviations in percent for which the volume fraction is computed
+    - current, processes, chunkSize, maxAngle: see field
+
+    Returns a dictionary with
+    - centerField: field vector in T at the center
+    - centerFieldMagnitude: its length in T
+    - volumeFraction: dictionary tolerance -> fraction of the sample points with a B1 field within
+      +- tolerance percent of the field at the center
+    - meanDeviation, maxDeviation: mean and largest relative deviation of B1 from the center field
+    - points, b1: the sample points and the B1 field at every point"""
+    points = sampleGrid(coil, n, radiusFraction, heightFraction)
+    b = field(coil, np.vstack([np.zeros((1, 3)), points]), current, processes, chunkSize, maxAngle)
+
+    center = b[0]
+    magnitude = np.sqrt(np.sum(center**2))
+    b1 = b[1:].dot(center/magnitude)
+    deviation = np.abs(b1/magnitude - 1)
+
+    return {"centerField" : center,
+            "centerFieldMagnitude" : magnitude,
+            "volumeFraction" : dict((t, float(np.mean(deviation <= t/100.))) for t in tolerances),
+            "meanDeviation" : float(deviation.mean()),
+            "maxDeviation" : float(deviation.max()),
+            "points" : points,
+            "b1" : b1}
@@ -0,0 +1,274 @@
+import argparse
+import re
+import sys
+
+import numpy as np
+
+from gCodeSimulator import parse, COMMENT, LINEAR
+
+#Make generated G-Code programs smaller without changing the path they describe.
+#
+#- consecutive G1 moves in the XY plane that lie on one line (within a tolerance) are merged into one move
+#- words that do not change the modal state are dropped: unchanged X, Y, Z and F, and repeated G0/G1/G2/G3
+#- trailing zeros of numbers are removed, e.g. X14.850 -> X14.85, Z5.00 -> Z5
+#- optionally, comments are removed
+#
+#reduceProgram checks the result with verifyReduction, which replays both programs: the reduced program has to
+#visit the same points in the same order, except for points of merged moves, which have to lie within the
+#tolerance of the merged move.
+#
+#Example:
+#  python gCodeReducer.py standardCoil.txt -o standardCoil.min.txt
+
+WORD = re.compile(r"([A-Z])\s*([-+]?(?:\d+\.?\d*|\.\d+))")
+
+
+def trimNumber(text):
+    """Remove trailing zeros and a trailing decimal point from a number, e.g. 14.850 -> 14.85, -0.000 -> 0."""
+    if "." in text:
+        text = text.rstrip("0").rstrip(".")
+    if text in ("-0", "+0", "-", "+", ""):
+        text = "0"
+    return text.lstrip("+")
+
+
+def _distanceToSegment(p, a, b):
+    """Return the distance of p from the segment a-b and the position of its projection along the segment (0 to 1)."""
+    d = b - a
+    lengthSquared = np.dot(d, d)
+    if lengthSquared == 0:
+        return np.sqrt(np.dot(p - a, p - a)), 0.
+    t = np.dot(p - a, d)/lengthSquared
+    closest = a + min(max(t, 0.), 1.)*d
+    return np.sqrt(np.dot(p - closest, p - closest)), t
+
+
+def _collinear(start, vertices, end, tolerance):
+    """True if all vertices lie within tolerance of the segment start-end and are visited in order."""
+    last = 0.
+    for v in vertices:
+        distance, t = _distanceToSegment(v, start, end)
+        if distance > tolerance or t < last - 1e-12 or t > 1 + 1e-12:
+            return False
+        last = t
+    return True
+
+
+class _Emitter(object):
+    """Write motion lines, leaving out everything the controller already knows."""
+
+    def __init__(self):
+        self.mode = None
+        self.values = {}
+
+    def move(self, mode, words):
+        """words: list of (letter, number text) of the move, I and J are always written for arcs.
+
+        Returns the line or None if the move does not change anything."""
+        out = []
+        for letter, text in words:
+            value = float(text)
+            if letter in "IJ" or self.values.get(letter) != value:
+                out.append(letter + trimNumber(text))
+            if letter not in "IJ":
+                self.values[letter] = value
+
+        #a move to the current position does nothing, the mode can wait for the next move
+        if len(out) == 0:
+            return None
+
+        if mode != self.mode:
+            out.insert(0, "G{0}".format(mode))
+            self.mode = mode
+        return " ".join(out) + "\n"
+
+
+def reduceLines(lines, tolerance = 0.001, stripComments = False):
+    """Reduce a program given as an iterable of lines. Yields the reduced lines.
+
+    Works on streams, only the current run of collinear moves is held in memory.
+    Comments on moves that are merged into others are dropped.
+
+    - tolerance: maximum distance in mm of a dropped point from the merged move
+    - stripComments: remove comments and comment-only lines"""
+    emitter = _Emitter()
+    mode = None
+    #current position and feed as numbers and as written in the program
+    position = {}
+    text = {}
+
+    #pending run of collinear G1 moves: start point, the points passed so far and the end point
+    run = {"start" : None, "vertices" : [], "end" : None, "words" : None}
+
+    def flush():
+        words = run["words"]
+        run["start"] = None
+        run["vertices"] = []
+        run["end"] = None
+        run["words"] = None
+        if words is not None:
+            line = emitter.move(1, words)
+            if line is not None:
+                return [line]
+        return []
+
+    for raw in lines:
+        code = raw.rstrip("\r\n")
+        comment = ""
+        match = COMMENT.search(code)
+        if match:
+            comment = code[match.start():].strip()
+            code = COMMENT.sub("", code)
+        code = code.strip()
+
+        words = WORD.findall(code.upper())
+        g = [int(float(v)) for l, v in words if l == "G" and float(v) <= 3]
+        motion = len(g) > 0 or any(l in "XYZF" for l, v in words)
+
+        if not motion:
+            #comment lines, M commands, G90 and the like are passed on unchanged
+            if code or (comment and not stripComments):
+                for line in flush():
+                    yield line
+                if stripComments or not comment:
+                    yield code + "\n"
+                else:
+                    yield (code + " " + comment).strip() + "\n"
+            continue
+
+        if g:
+            mode = g[-1]
+        axes = [(l, v) for l, v in words if l in "XYZFIJ"]
+        given = dict((l, float(v)) for l, v in axes)
+
+        start = (position.get("X"), position.get("Y"))
+        zChange = "Z" in given and given["Z"] != position.get("Z")
+        feedChange = "F" in given and given["F"] != position.get("F")
+
+        for l, v in axes:
+            if l in "XYZF":
+                position[l] = float(v)
+                text[l] = v
+
+        end = (position.get("X"), position.get("Y"))
+        xyMove = mode == 1 and not zChange and not feedChange and None not in start and None not in end
+
+        if xyMove:
+            point = np.array(end)
+            if run["words"] is not None and _collinear(run["start"], run["vertices"] + [run["end"]], point, tolerance):
+                run["vertices"].append(run["end"])
+            else:
+                for line in flush():
+                    yield line
+                run["start"] = np.array(start)
+            run["end"] = point
+            run["words"] = [("X", text["X"]), ("Y", text["Y"])]
+            continue
+
+        for line in flush():
+            yield line
+        line = emitter.move(mode, axes)
+        if line is not None:
+            if comment and not stripComments:
+                line = line[:-1] + " " + comment + "\n"
+            yield line
+
+    for line in flush():
+        yield line
+
+
+def verifyReduction(original, reduced, tolerance = 0.001):
+    """Check that the reduced program describes the same path as the original.
+
+    Both programs are replayed. Every move of the reduced program has to match a move of the original in kind,
+    end point, arc center and feed. Moves of the original may only be skipped if they are straight feed moves
+    whose end points lie within tolerance of the next move of the reduced program. The M commands have to be
+    the same as well.
+
+    Returns True or False."""
+    a = parse([original])
+    b = parse([reduced])
+
+    if a.mCommands[0] != b.mCommands[0]:
+        return False
+    if [l for l in _mLines(original)] != [l for l in _mLines(reduced)]:
+        return False
+
+    i = 0
+    for j in range(len(b)):
+        while True:
+            if i >= len(a):
+                return False
+            same = (a.kind[i] == b.kind[j] and np.allclose(a.end[i], b.end[j], atol = 1e-9, rtol = 0)
+                    and np.allclose(a.center[i], b.center[j], atol = 1e-9, rtol = 0)
+                    and (a.feed[i] == b.feed[j] or (np.isnan(a.feed[i]) and np.isnan(b.feed[j]))))
+            if same:
+                i += 1
+                break
+
+            #a point dropped by merging collinear moves
+            skipped = (a.kind[i] == LINEAR and b.kind[j] == LINEAR and a.end[i][2] == b.start[j][2] == b.end[j][2]
+                       and a.feed[i] == b.feed[j]
+                       and _distanceToSegment(a.end[i][:2], b.start[j][:2], b.end[j][:2])[0] <= tolerance)
+            if not skipped:
+                return False
+            i += 1
+
+    return i == len(a)
+
+
+def _mLines(code):
+    for line in code.upper().splitlines():
+        words = WORD.findall(COMMENT.sub("", line))
+        if any(l == "M" for l, v in words):
+            yield [(l, float(v)) for l, v in words]
+
+
+def reduceProgram(code, tolerance = 0.001, stripComments = False, verify = True):
+    """Reduce a program given as a string.
+
+    Returns the reduced program and a report with the sizes before and after.
+    Raises ValueError if verify is True and the reduced program does not trace the same path."""
+    reduced = "".join(reduceLines(code.splitlines(True), tolerance, stripComments))
+
+    report = {"bytesBefore" : len(code),
+              "bytesAfter" : len(reduced),
+              "linesBefore" : len(code.splitlines()),
+              "linesAfter" : len(reduced.splitlines())}
+    report["ratio"] = report["bytesAfter"]/float(report["bytesBefore"]) if report["bytesBefore"] else 1.
+
+    if verify:
+        report["verified"] = verifyReduction(code, reduced, tolerance)
+        if not report["verified"]:
+            raise ValueError("The reduced program does not trace the same path as the original.")
+
+    return reduced, report
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Reduce the size of a G-Code program.")
+    parser.add_argument("file", help = "G-Code file")
+    parser.add_argument("-o", "--output", default = "", help = "output file, defaults to STDOUT")
+    parser.add_argument("--tolerance", type = float, default = 0.001, help = "tolerance in mm for merging collinear moves")
+    parser.add_argument("--strip-comments", action = "store_true", help = "remove comments")
+    args = parser.parse_args(argv)
+
+    f = open(args.file)
+    code = f.read()
+    f.close()
+
+    reduced, report = reduceProgram(code, args.tolerance, args.strip_comments)
+
+    if args.output:
+        f = open(args.output, "w")
+        f.write(reduced)
+        f.close()
+    else:
+        sys.stdout.write(reduced)
+
+    sys.stderr.write("{0} -> {1} bytes ({2:.0f} %), {3} -> {4} lines\n".format(
+        report["bytesBefore"], report["bytesAfter"], 100*report["ratio"], report["linesBefore"], report["linesAfter"]))
+
+
+if __name__ == "__main__":
+    main()
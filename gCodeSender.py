@@ -0,0 +1,369 @@
+import argparse
+import collections
+import socket
+import sys
+import threading
+import time
+import Queue
+
+#Stream G-Code to a CNC controller over TCP or a serial port, without writing it to a file first.
+#
+#Any iterable of lines can be sent, e.g. SaddleCoil.gCodeLines(), Path.gCodeLines() or an open file. Two kinds of
+#flow control are supported:
+#
+#- "count" (character counting): the sender keeps track of the bytes of all lines that have not been acknowledged
+#  yet and sends the next line as soon as it fits into the receive buffer of the controller (bufferSize, 128 bytes for
+#  Grbl). The buffer stays full and the planner never runs dry, but it never overflows either.
+#- "ok" (send-response): every line waits for the "ok" of the previous one. Slower, but works with any controller.
+#
+#Every line is answered by "ok" or "error:...", other lines from the controller (e.g. the welcome message) are kept in
+#GCodeSender.messages. The sender runs in this thread (stream) or in a background thread (start), where it can be
+#paused, resumed and stopped and reports its progress to a callback.
+#
+#SimulatedController is a local TCP server with a receive buffer and a configurable processing time per line. It
+#counts overruns, so flow control and throughput can be tested without a machine.
+#
+#Example:
+#  python gCodeSender.py standardCoil.txt --port 192.168.1.20:23
+#  python gCodeSender.py standardCoil.txt --simulate --line-delay 0.005
+
+#real time commands of Grbl: feed hold and cycle start
+HOLD = "!"
+RESUME = "~"
+
+
+class SenderError(Exception):
+    pass
+
+
+class Connection(object):
+    """A line oriented connection to a controller on a socket or on a pyserial port."""
+
+    def __init__(self, stream, closer = None):
+        self.stream = stream
+        self.closer = closer
+        self.lock = threading.Lock()
+
+    def write(self, data):
+        with self.lock:
+            self.stream.write(data)
+            self.stream.flush()
+
+    def readline(self):
+        line = self.stream.readline()
+        if not line:
+            raise SenderError("The controller closed the connection.")
+        return line.strip()
+
+    def close(self):
+        self.stream.close()
+        if self.closer is not None:
+            self.closer()
+
+
+def connect(address, baudrate = 115200, timeout = 30):
+    """Open a Connection.
+
+    - address: host:port for TCP, otherwise the name of a serial port (needs pyserial)
+    - baudrate: baud rate of a serial port
+    - timeout: seconds to wait for an answer of the controller"""
+    if ":" in address and not address.startswith("/"):
+        host, port = address.rsplit(":", 1)
+        s = socket.create_connection((host, int(port)), timeout)
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return Connection(s.makefile("r+b"), s.close)
+
+    try:
+        import serial
+    except ImportError:
+        raise SenderError("pyserial is needed to send to the serial port {0}.".format(address))
+    port = serial.Serial(address, baudrate, timeout = timeout)
+    return Connection(port)
+
+
+class GCodeSender(object):
+    """Send G-Code lines with flow control."""
+
+    def __init__(self, connection, mode = "count", bufferSize = 128, progress = None, progressInterval = 0.5):
+        """- connection: a Connection, see connect
+        - mode: "count" for character counting, "ok" to wait for every acknowledgement
+        - bufferSize: size of the receive buffer of the controller in bytes (mode "count")
+        - progress: optional function called with the sender while it runs and when it is done
+        - progressInterval: seconds between calls of progress"""
+        if mode not in ("count", "ok"):
+            raise ValueError("mode has to be 'count' or 'ok', not {0!r}".format(mode))
+        self.connection = connection
+        self.mode = mode
+        self.bufferSize = bufferSize
+        self.progress = progress
+        self.progressInterval = progressInterval
+
+        self.pending = collections.deque()
+        self.messages = []
+        self.errors = []
+        self.stats = {"linesSent" : 0, "linesAcknowledged" : 0, "bytesSent" : 0, "start" : None, "end" : None}
+        self.total = None
+
+        self._running = threading.Event()
+        self._running.set()
+        self._stopped = False
+        self._thread = None
+        self._failure = None
+
+    def buffered(self):
+        """Bytes sent but not acknowledged yet."""
+        return sum(self.pending)
+
+    def elapsed(self):
+        if self.stats["start"] is None:
+            return 0.
+        return (self.stats["end"] or time.time()) - self.stats["start"]
+
+    def fraction(self):
+        """Fraction of the lines acknowledged, None if the number of lines is not known."""
+        if not self.total:
+            return None
+        return self.stats["linesAcknowledged"]/float(self.total)
+
+    def _acknowledge(self):
+        """Read answers until one line is acknowledged."""
+        while True:
+            answer = self.connection.readline()
+            if answer == "ok" or answer.startswith("error"):
+                break
+            if answer:
+                self.messages.append(answer)
+        self.pending.popleft()
+        self.stats["linesAcknowledged"] += 1
+        if answer != "ok":
+            self.errors.append((self.stats["linesAcknowledged"], answer))
+
+    def stream(self, lines):
+        """Send all lines and wait until the controller has acknowledged them. Returns the stats.
+
+        Empty lines are skipped, lines without a newline get one."""
+        if hasattr(lines, "__len__"):
+            self.total = len(lines)
+        self.stats["start"] = time.time()
+        lastReport = 0
+
+        for line in lines:
+            line = line.strip()
+            if not line:
+                if self.total:
+                    self.total -= 1
+                continue
+            data = line + "\n"
+            if len(data) > self.bufferSize:
+                raise SenderError("Line longer than the buffer of the controller: {0}".format(line))
+
+            self._running.wait()
+            if self._stopped:
+                break
+
+            if self.mode == "ok":
+                limit = 0
+            else:
+                limit = self.bufferSize - len(data)
+            while self.pending and self.buffered() > limit:
+                self._acknowledge()
+
+            self.connection.write(data)
+            self.pending.append(len(data))
+            self.stats["linesSent"] += 1
+            self.stats["bytesSent"] += len(data)
+
+            if self.progress is not None and time.time() - lastReport > self.progressInterval:
+                lastReport = time.time()
+                self.progress(self)
+
+        while self.pending:
+            self._acknowledge()
+        self.stats["end"] = time.time()
+        if self.progress is not None:
+            self.progress(self)
+        return self.stats
+
+    def start(self, lines):
+        """Send the lines in a background thread. See join, pause, resume and stop."""
+        def run():
+            try:
+                self.stream(lines)
+            except Exception as e:
+                self._failure = e
+        self._thread = threading.Thread(target = run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def join(self, timeout = None):
+        """Wait for the background thread. Raises the exception that stopped it, if any."""
+        self._thread.join(timeout)
+        if self._failure is not None:
+            raise self._failure
+        return self.stats
+
+    def pause(self, hold = False):
+        """Stop sending new lines. With hold = True the controller also gets a feed hold and stops moving."""
+        self._running.clear()
+        if hold:
+            self.connection.write(HOLD)
+
+    def resume(self, hold = False):
+        """Continue after pause. Use hold = True if the pause was a feed hold."""
+        if hold:
+            self.connection.write(RESUME)
+        self._running.set()
+
+    def stop(self):
+        """Send no further lines. The lines in the buffer of the controller are still acknowledged."""
+        self._stopped = True
+        self._running.set()
+
+
+class SimulatedController(object):
+    """A local TCP controller with a receive buffer that processes one line every lineDelay seconds.
+
+    Lines are acknowledged with "ok" once they are processed, which frees their bytes in the buffer.
+    The real time commands ! and ~ hold and resume the processing. Receiving more than bufferSize unprocessed
+    bytes counts as an overrun and is answered with "error:overflow" for the line that did not fit."""
+
+    def __init__(self, bufferSize = 128, lineDelay = 0.001, welcome = "Grbl 1.1h ['$' for help]"):
+        self.bufferSize = bufferSize
+        self.lineDelay = lineDelay
+        self.welcome = welcome
+        self.lines = []
+        self.stats = {"linesProcessed" : 0, "overruns" : 0, "maxBuffered" : 0, "starved" : 0}
+
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(("127.0.0.1", 0))
+        self._server.listen(1)
+        self.address = "127.0.0.1:{0}".format(self._server.getsockname()[1])
+
+        self._buffered = 0
+        self._lock = threading.Lock()
+        self._running = threading.Event()
+        self._running.set()
+        self._queue = Queue.Queue()
+        self._thread = threading.Thread(target = self._serve)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _serve(self):
+        client, address = self._server.accept()
+        client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.welcome:
+            client.sendall(self.welcome + "\r\n")
+        worker = threading.Thread(target = self._process, args = (client,))
+        worker.daemon = True
+        worker.start()
+
+        partial = ""
+        while True:
+            data = client.recv(4096)
+            if not data:
+                break
+            for c in data:
+                if c == HOLD:
+                    self._running.clear()
+                elif c == RESUME:
+                    self._running.set()
+                elif c == "\n":
+                    line = partial + c
+                    partial = ""
+                    with self._lock:
+                        overrun = self._buffered + len(line) > self.bufferSize
+                        if overrun:
+                            self.stats["overruns"] += 1
+                        else:
+                            self._buffered += len(line)
+                            self.stats["maxBuffered"] = max(self.stats["maxBuffered"], self._buffered)
+                    self._queue.put((line, overrun))
+                else:
+                    partial += c
+        self._queue.put(None)
+        worker.join()
+        client.close()
+
+    def _process(self, client):
+        while True:
+            if self._queue.empty() and self.stats["linesProcessed"]:
+                self.stats["starved"] += 1
+            item = self._queue.get()
+            if item is None:
+                break
+            line, overrun = item
+            if overrun:
+                client.sendall("error:overflow\r\n")
+                continue
+            self._running.wait()
+            time.sleep(self.lineDelay)
+            self.lines.append(line.strip())
+            with self._lock:
+                self._buffered -= len(line)
+                self.stats["linesProcessed"] += 1
+            client.sendall("ok\r\n")
+
+    def close(self, timeout = 1.):
+        """Stop listening and wait up to timeout seconds for the last connection to finish."""
+        self._server.close()
+        self._thread.join(timeout)
+
+
+def send(lines, address, mode = "count", bufferSize = 128, progress = None, baudrate = 115200):
+    """Connect, stream the lines and close the connection. Returns the sender."""
+    connection = connect(address, baudrate)
+    try:
+        sender = GCodeSender(connection, mode, bufferSize, progress)
+        sender.stream(lines)
+    finally:
+        connection.close()
+    return sender
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Stream G-Code to a CNC controller with flow control.")
+    parser.add_argument("file", help = "G-Code file, - for STDIN")
+    parser.add_argument("--port", help = "host:port or serial port of the controller")
+    parser.add_argument("--baudrate", type = int, default = 115200)
+    parser.add_argument("--mode", choices = ["count", "ok"], default = "count", help = "flow control, see the module comment")
+    parser.add_argument("--buffer", type = int, default = 128, help = "receive buffer of the controller in bytes")
+    parser.add_argument("--simulate", action = "store_true", help = "send to a local SimulatedController instead")
+    parser.add_argument("--line-delay", type = float, default = 0.001, help = "processing time per line of the simulated controller in s")
+    args = parser.parse_args(argv)
+
+    if args.file == "-":
+        lines = sys.stdin.readlines()
+    else:
+        f = open(args.file)
+        lines = f.readlines()
+        f.close()
+
+    controller = None
+    if args.simulate:
+        controller = SimulatedController(args.buffer, args.line_delay)
+        address = controller.address
+    elif args.port:
+        address = args.port
+    else:
+        parser.error("either --port or --simulate is required")
+
+    def report(sender):
+        sys.stderr.write("\r{0}/{1} lines, {2:.1f} s".format(sender.stats["linesAcknowledged"], sender.total, sender.elapsed()))
+
+    sender = send(lines, address, args.mode, args.buffer, report, args.baudrate)
+    sys.stderr.write("\n")
+    print "{0} lines, {1} bytes in {2:.2f} s ({3:.0f} lines/s), {4} errors".format(
+        sender.stats["linesSent"], sender.stats["bytesSent"], sender.elapsed(),
+        sender.stats["linesSent"]/max(sender.elapsed(), 1e-9), len(sender.errors))
+    if controller is not None:
+        print "simulated controller: {0} lines processed, {1} overruns, at most {2} bytes buffered".format(
+            controller.stats["linesProcessed"], controller.stats["overruns"], controller.stats["maxBuffered"])
+        controller.close()
+    for line, error in sender.errors:
+        print "  line {0}: {1}".format(line, error)
+    return 1 if sender.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
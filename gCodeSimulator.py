@@ -0,0 +1,269 @@
+import argparse
+import json
+import re
+import sys
+
+import numpy as np
+
+#Parse the G-Code written by the coil generators and estimate the machining time.
+#
+#Understood are G0/G00 (rapid), G1/G01 (feed), G2/G3 (arcs with I/J offsets relative to the start point),
+#the modal X, Y, Z and F words and M commands such as the spindle/vacuum switches "M10 O6.1" / "M10 O6.0".
+#Comments start with ";" or are enclosed in parentheses. Missing axis words keep their previous value,
+#so reduced programs (see gCodeReducer) are understood as well.
+#
+#All moves of all programs are evaluated as numpy arrays, which makes it possible to rank thousands of
+#candidate programs per second.
+#
+#Example:
+#  python gCodeSimulator.py standardCoil.txt compactCoil.txt --rapid-xy 2000 --acceleration 200
+
+RAPID = 0
+LINEAR = 1
+CLOCKWISE = 2
+COUNTERCLOCKWISE = 3
+
+WORD = re.compile(r"([A-Z])\s*([-+]?(?:\d+\.?\d*|\.\d+))")
+COMMENT = re.compile(r"\(.*?\)|;.*")
+
+
+class Machine(object):
+    """Machine parameters for the time estimate.
+
+    - rapidXY: rapid rate of the X and Y axes in mm/min
+    - rapidZ: rapid rate of the Z axis in mm/min
+    - acceleration: acceleration of all axes in mm/s^2. Every move starts and stops at rest (no look-ahead).
+    - feedPerMinute: if True, F is in mm/min, otherwise in mm/s
+    - mCommandTime: time in s for every M command, e.g. for switching the spindle or the vacuum table
+    - maxFeed: optional upper limit for F in mm/min"""
+
+    def __init__(self, rapidXY = 3000., rapidZ = 1000., acceleration = 500., feedPerMinute = True, mCommandTime = 1., maxFeed = None):
+        self.rapidXY = rapidXY
+        self.rapidZ = rapidZ
+        self.acceleration = acceleration
+        self.feedPerMinute = feedPerMinute
+        self.mCommandTime = mCommandTime
+        self.maxFeed = maxFeed
+
+
+class Program(object):
+    """The moves of one or several parsed programs as numpy arrays.
+
+    - program: index of the program every move belongs to
+    - kind: RAPID, LINEAR, CLOCKWISE or COUNTERCLOCKWISE
+    - start, end: (n, 3) start and end point of every move
+    - center: (n, 2) arc center offset I, J relative to the start point (zero for straight moves)
+    - feed: feed of every move as given by the modal F word
+    - mCommands: number of M commands per program"""
+
+    def __init__(self, program, kind, start, end, center, feed, mCommands):
+        self.program = program
+        self.kind = kind
+        self.start = start
+        self.end = end
+        self.center = center
+        self.feed = feed
+        self.mCommands = mCommands
+
+    def __len__(self):
+        return len(self.kind)
+
+    def lengths(self):
+        """Return the XY path length of every move (arc length for arcs) and the length including Z."""
+        delta = self.end - self.start
+        chord = np.sqrt(delta[:, 0]**2 + delta[:, 1]**2)
+
+        arc = self.kind >= CLOCKWISE
+        radius = np.sqrt(self.center[:, 0]**2 + self.center[:, 1]**2)
+        startAngle = np.arctan2(-self.center[:, 1], -self.center[:, 0])
+        stopAngle = np.arctan2(self.end[:, 1] - self.start[:, 1] - self.center[:, 1], self.end[:, 0] - self.start[:, 0] - self.center[:, 0])
+        sweep = np.where(self.kind == COUNTERCLOCKWISE, stopAngle - startAngle, startAngle - stopAngle) % (2*np.pi)
+        #an arc back to its start point is a full circle
+        sweep[arc & (chord < 1e-9) & (radius > 0)] = 2*np.pi
+
+        xy = np.where(arc, radius*sweep, chord)
+        return xy, np.sqrt(xy**2 + delta[:, 2]**2)
+
+
+def _parseLines(code):
+    """Return the words of every line of a program as a list of (letter, value string) pairs.
+
+    Lines written by the coil generators are split at white space, other lines go through a regular expression."""
+    words = []
+    for line in code.upper().splitlines():
+        if ";" in line or "(" in line:
+            line = COMMENT.sub("", line)
+        tokens = line.split()
+        if not tokens:
+            continue
+        try:
+            found = [(t[0], t[1:]) for t in tokens]
+            for letter, value in found:
+                float(value)
+        except ValueError:
+            found = WORD.findall(line)
+        if found:
+            words.append(found)
+    return words
+
+
+def parse(programs):
+    """Parse a list of G-Code programs (strings) into one Program holding the moves of all of them.
+
+    Every program is assumed to start in rapid mode at X0 Y0 Z0 with no feed set."""
+    programIndex = []
+    values = dict((k, []) for k in "GXYZIJF")
+    mCommands = np.zeros(len(programs), dtype = int)
+
+    for n, code in enumerate(programs):
+        first = True
+        for words in _parseLines(code):
+            line = {}
+            for letter, value in words:
+                if letter == "G":
+                    v = float(value)
+                    if v <= 3:
+                        line["G"] = v
+                elif letter == "M":
+                    mCommands[n] += 1
+                elif letter in values:
+                    line[letter] = float(value)
+
+            if not any(k in line for k in "GXYZF"):
+                continue
+
+            programIndex.append(n)
+            #NaN marks words that are not given and keep their modal value, the first line sets the initial state
+            for k in "GXYZF":
+                values[k].append(line.get(k, np.nan if not first else 0.))
+            values["I"].append(line.get("I", 0.))
+            values["J"].append(line.get("J", 0.))
+            first = False
+
+    programIndex = np.array(programIndex, dtype = int)
+    columns = dict((k, np.array(v, dtype = float)) for k, v in values.items())
+
+    def forwardFill(a):
+        #replace NaN by the last valid value before it
+        index = np.where(np.isnan(a), 0, np.arange(len(a)))
+        np.maximum.accumulate(index, out = index)
+        return a[index]
+
+    kind = forwardFill(columns["G"]).astype(int)
+    end = np.column_stack([forwardFill(columns["X"]), forwardFill(columns["Y"]), forwardFill(columns["Z"])])
+    feed = forwardFill(columns["F"])
+    center = np.column_stack([columns["I"], columns["J"]])
+
+    start = np.zeros_like(end)
+    start[1:] = end[:-1]
+    #the first line of every program starts at X0 Y0 and the Z given there
+    newProgram = np.ones(len(kind), dtype = bool)
+    newProgram[1:] = programIndex[1:] != programIndex[:-1]
+    start[newProgram, :2] = 0
+    start[newProgram, 2] = end[newProgram, 2]
+
+    #keep full circles, which end where they start
+    moved = np.any(start != end, axis = 1) | ((kind >= CLOCKWISE) & np.any(center != 0, axis = 1))
+    return Program(programIndex[moved], kind[moved], start[moved], end[moved], center[moved], feed[moved], mCommands)
+
+
+def _moveTimes(length, velocity, acceleration):
+    """Duration of moves that start and stop at rest with a trapezoidal (or triangular) velocity profile.
+
+    - length: move lengths in mm, velocity: in mm/s, acceleration: mm/s^2"""
+    triangular = length < velocity**2/acceleration
+    return np.where(triangular, 2*np.sqrt(length/acceleration), length/velocity + velocity/acceleration)
+
+
+def estimate(programs, machine = None):
+    """Estimate lengths and cycle time of a list of G-Code programs.
+
+    Returns one dictionary per program with the cutting, rapid and arc lengths in mm, the number of moves, plunges
+    and M commands, and cuttingTime, rapidTime and cycleTime in s."""
+    if machine is None:
+        machine = Machine()
+    if isinstance(programs, basestring):
+        programs = [programs]
+
+    p = parse(programs)
+    xy, length = p.lengths()
+    dz = np.abs(p.end[:, 2] - p.start[:, 2])
+
+    rapid = p.kind == RAPID
+    arc = p.kind >= CLOCKWISE
+    plunge = (~rapid) & (p.end[:, 2] < p.start[:, 2]) & (xy < 1e-9)
+
+    #rapids are limited by the slowest axis
+    rapidTime = np.maximum(xy/(machine.rapidXY/60.), dz/(machine.rapidZ/60.))
+    rapidVelocity = np.where(rapidTime > 0, length/np.where(rapidTime > 0, rapidTime, 1), machine.rapidXY/60.)
+
+    feed = np.nan_to_num(p.feed)
+    if machine.maxFeed is not None:
+        feed = np.minimum(feed, machine.maxFeed)
+    feedVelocity = feed/60. if machine.feedPerMinute else feed
+    #a feed move without feed would take forever, treat it as a rapid
+    feedVelocity = np.where(feedVelocity > 0, feedVelocity, rapidVelocity)
+
+    velocity = np.where(rapid, rapidVelocity, feedVelocity)
+    times = _moveTimes(length, np.maximum(velocity, 1e-12), machine.acceleration)
+
+    n = len(programs)
+
+    def perProgram(weights):
+        return np.bincount(p.program, weights = weights, minlength = n)
+
+    cuttingLength = perProgram(np.where(rapid, 0, length))
+    rapidLength = perProgram(np.where(rapid, length, 0))
+    arcLength = perProgram(np.where(arc, xy, 0))
+    cuttingTime = perProgram(np.where(rapid, 0, times))
+    rapidTime = perProgram(np.where(rapid, times, 0))
+    moves = np.bincount(p.program, minlength = n)
+    plunges = np.bincount(p.program[plunge], minlength = n)
+
+    results = []
+    for k in range(n):
+        mTime = p.mCommands[k]*machine.mCommandTime
+        results.append({"cuttingLength" : cuttingLength[k],
+                        "rapidLength" : rapidLength[k],
+                        "arcLength" : arcLength[k],
+                        "moves" : int(moves[k]),
+                        "plunges" : int(plunges[k]),
+                        "mCommands" : int(p.mCommands[k]),
+                        "cuttingTime" : cuttingTime[k],
+                        "rapidTime" : rapidTime[k],
+                        "cycleTime" : cuttingTime[k] + rapidTime[k] + mTime})
+    return results
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Estimate path lengths and cycle time of G-Code programs.")
+    parser.add_argument("files", nargs = "+", help = "G-Code files")
+    parser.add_argument("--rapid-xy", type = float, default = 3000., help = "rapid rate of X and Y in mm/min")
+    parser.add_argument("--rapid-z", type = float, default = 1000., help = "rapid rate of Z in mm/min")
+    parser.add_argument("--acceleration", type = float, default = 500., help = "acceleration in mm/s^2")
+    parser.add_argument("--feed-per-second", action = "store_true", help = "F words are in mm/s instead of mm/min")
+    parser.add_argument("--m-command-time", type = float, default = 1., help = "time in s for every M command")
+    parser.add_argument("--json", action = "store_true", help = "print the results as JSON")
+    args = parser.parse_args(argv)
+
+    machine = Machine(args.rapid_xy, args.rapid_z, args.acceleration, not args.feed_per_second, args.m_command_time)
+
+    programs = []
+    for filename in args.files:
+        f = open(filename)
+        programs.append(f.read())
+        f.close()
+
+    results = estimate(programs, machine)
+
+    if args.json:
+        print json.dumps(dict(zip(args.files, results)), indent = 2, sort_keys = True)
+    else:
+        for filename, r in zip(args.files, results):
+            m, s = divmod(r["cycleTime"], 60)
+            print "{0}: cut {1:.1f} mm (arcs {2:.1f} mm), rapid {3:.1f} mm, {4} plunges, cycle time {5:.0f} min {6:.0f} s".format(
+                filename, r["cuttingLength"], r["arcLength"], r["rapidLength"], r["plunges"], m, s)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from fieldSolver import conductor, wrap
+
+#Inductance and resistance of a SaddleCoil from its wrapped geometry.
+#
+#The conductor is the closed path of fieldSolver.conductor (first leg, both loops, jumper, second leg and the feed
+#between the legs), the same geometry the field is computed from, as a flat strip of the trace width and the sheet
+#thickness. Every straight edge of the path is wrapped onto the cylinder; edges along the circumference become
+#polygons of short straight pieces.
+#
+#The inductance is the sum of the partial inductances of all pairs of pieces (Neumann integral). The integral over
+#one piece is done in closed form, the one over the other piece by Gauss-Legendre quadrature. The distance between
+#the pieces is increased by the geometric mean distance of the strip cross section, which turns the self term of a
+#piece into Grover's formula for a straight strip, l*mu0/(2 pi)*(ln(2l/(w + t)) + 1/2), and keeps neighbouring pieces
+#finite.
+#
+#Pieces are grouped by the edge they belong to. The partial inductance of a pair of edges only depends on their
+#position relative to each other, which is used as the key of a KernelCache. Designs that share edges, e.g. after a
+#change of legLength or h, only compute the pairs that changed.
+#
+#Example:
+#  result = estimate(standardCoil, thickness = 0.035, frequency = 300e6)
+#  print result["inductance"]*1e9, "nH", result["resistanceRF"], "Ohm"
+
+MU0 = 4e-7*np.pi
+#resistivity of copper at 20 C in Ohm m
+COPPER = 1.68e-8
+
+
+class KernelCache(object):
+    """Least recently used store of the partial inductances of pairs of edges."""
+
+    def __init__(self, maxSize = 100000):
+        self.maxSize = maxSize
+        self.entries = OrderedDict()
+        self.stats = {"hits" : 0, "misses" : 0, "evictions" : 0}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def hitRate(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"]/float(lookups) if lookups else 0.
+
+    def lookup(self, key):
+        """Return the stored value or None."""
+        value = self.entries.pop(key, None)
+        if value is None:
+            self.stats["misses"] += 1
+            return None
+        self.entries[key] = value
+        self.stats["hits"] += 1
+        return value
+
+    def store(self, key, value):
+        self.entries[key] = value
+        while len(self.entries) > self.maxSize:
+            self.entries.popitem(last = False)
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        self.entries.clear()
+
+
+#shared by all estimates that do not bring their own cache
+DEFAULT_CACHE = KernelCache()
+
+
+def edges(coil, includeLegs = True):
+    """Return the edges of the closed conductor as a list of ((x1, y1), (x2, y2)) in sheet coordinates before the shift.
+
+    The last edge is the feed that closes the circuit, see fieldSolver.conductor."""
+    line = conductor(coil, includeLegs)
+    return [(tuple(a), tuple(b)) for a, b in zip(line[:-1], line[1:]) if tuple(a) != tuple(b)]
+
+
+def _edgeKey(coil, edge, reference):
+    """Describe an edge relative to a reference edge: angles relative to its start angle (modulo 360 degrees),
+    heights relative to its start height."""
+    (x1, y1), (x2, y2) = edge
+    angle0 = coil.xToAngle(reference[0][0])
+    a1 = coil.xToAngle(x1) - angle0
+    shift = a1 % 360. - a1
+    return (round(a1 + shift, 6), round(coil.xToAngle(x2) - angle0 + shift, 6),
+            round(y1 - reference[0][1], 6), round(y2 - reference[0][1], 6))
+
+
+def _pieces(coil, edge, maxAngle):
+    points = wrap(coil, np.array(edge), maxAngle)*1e-3
+    return points[:-1], points[1:]
+
+
+def partialInductance(startsA, endsA, startsB, endsB, gmd, quadrature = 8, same = False):
+    """Sum of the partial inductances in H of all pairs of straight pieces of A and B (lengths in m).
+
+    - gmd: geometric mean distance of the cross section in m
+    - quadrature: number of Gauss-Legendre points along every piece of B
+    - same: True if A and B are the same pieces, the diagonal then holds the self inductances"""
+    dA = endsA - startsA
+    lengthA = np.sqrt(np.sum(dA**2, axis = 1))
+    tA = dA/lengthA[:, np.newaxis]
+    dB = endsB - startsB
+    lengthB = np.sqrt(np.sum(dB**2, axis = 1))
+    tB = dB/lengthB[:, np.newaxis]
+
+    nodes, weights = np.polynomial.legendre.leggauss(quadrature)
+    u = (nodes + 1)/2.
+    #quadrature points on B: (nB, q, 3)
+    p = startsB[:, np.newaxis, :] + u[np.newaxis, :, np.newaxis]*dB[:, np.newaxis, :]
+
+    #closed form of the integral of 1/sqrt(R^2 + gmd^2) along every piece of A: (nA, nB, q)
+    rel = p[np.newaxis, :, :, :] - startsA[:, np.newaxis, np.newaxis, :]
+    s0 = np.sum(rel*tA[:, np.newaxis, np.newaxis, :], axis = 3)
+    rho = np.sqrt(np.maximum(np.sum(rel**2, axis = 3) - s0**2, 0) + gmd**2)
+    inner = np.arcsinh((lengthA[:, np.newaxis, np.newaxis] - s0)/rho) + np.arcsinh(s0/rho)
+
+    integral = np.sum(inner*weights, axis = 2)*lengthB[np.newaxis, :]/2.
+    m = MU0/(4*np.pi)*tA.dot(tB.T)*integral
+
+    if same:
+        #the double integral over one piece is known exactly
+        l = lengthA
+        selfTerm = MU0/(4*np.pi)*2*(l*np.arcsinh(l/gmd) - np.sqrt(l**2 + gmd**2) + gmd)
+        m[np.arange(len(l)), np.arange(len(l))] = selfTerm
+    return m.sum()
+
+
+def inductance(coil, thickness = 0.035, maxAngle = 5., quadrature = 8, includeLegs = True, cache = None):
+    """Return the inductance in H of a SaddleCoil.
+
+    - thickness: thickness of the copper sheet in mm
+    - maxAngle: largest angle in degrees spanned by one piece of a circumferential edge
+    - quadrature: number of Gauss-Legendre points per piece
+    - includeLegs: include both legs, otherwise the circuit is closed between their roots
+    - cache: KernelCache for the edge pairs, defaults to DEFAULT_CACHE"""
+    if cache is None:
+        cache = DEFAULT_CACHE
+
+    gmd = 0.2235*(coil.width + thickness)*1e-3
+    conductor = edges(coil, includeLegs)
+    pieces = [_pieces(coil, e, maxAngle) for e in conductor]
+
+    total = 0.
+    for i, a in enumerate(conductor):
+        for j in range(i, len(conductor)):
+            b = conductor[j]
+            key = (coil.r, coil.width, thickness, maxAngle, quadrature, _edgeKey(coil, a, a), _edgeKey(coil, b, a))
+            m = cache.lookup(key)
+            if m is None:
+                m = partialInductance(pieces[i][0], pieces[i][1], pieces[j][0], pieces[j][1], gmd, quadrature, i == j)
+                cache.store(key, m)
+            #the pair (j, i) contributes the same as (i, j)
+            total += m if i == j else 2*m
+    return total
+
+
+def conductorLength(coil, includeLegs = True):
+    """Return the length in mm of the conductor on the cylinder, without the feed."""
+    length = 0.
+    for e in edges(coil, includeLegs)[:-1]:
+        starts, ends = _pieces(coil, e, 1.)
+        length += np.sum(np.sqrt(np.sum((ends - starts)**2, axis = 1)))*1e3
+    return length
+
+
+def resistance(coil, thickness = 0.035, frequency = None, resistivity = COPPER, includeLegs = True):
+    """Return the resistance in Ohm of the trace, at DC or, if frequency (in Hz) is given, including the skin effect.
+
+    At high frequencies the current flows in a layer of one skin depth below the surface of the strip."""
+    length = conductorLength(coil, includeLegs)*1e-3
+    w = coil.width*1e-3
+    t = thickness*1e-3
+    area = w*t
+    if frequency:
+        delta = skinDepth(frequency, resistivity)
+        if 2*delta < t:
+            area = w*t - (w - 2*delta)*(t - 2*delta)
+    return resistivity*length/area
+
+
+def skinDepth(frequency, resistivity = COPPER):
+    """Skin depth in m."""
+    return np.sqrt(resistivity/(np.pi*frequency*MU0))
+
+
+def estimate(coil, thickness = 0.035, frequency = None, resistivity = COPPER, maxAngle = 5., quadrature = 8,
+             includeLegs = True, cache = None):
+    """Estimate inductance and resistance of a SaddleCoil. See inductance and resistance for the parameters.
+
+    Returns a dictionary with inductance (H), length (mm), resistanceDC (Ohm) and, if a frequency is given,
+    resistanceRF (Ohm), skinDepth (m) and the quality factor q of the coil alone."""
+    result = {"inductance" : inductance(coil, thickness, maxAngle, quadrature, includeLegs, cache),
+              "length" : conductorLength(coil, includeLegs),
+              "resistanceDC" : resistance(coil, thickness, None, resistivity, includeLegs)}
+    if frequency:
+        result["resistanceRF"] = resistance(coil, thickness, frequency, resistivity, includeLegs)
+        result["skinDepth"] = skinDepth(frequency, resistivity)
+        result["q"] = 2*np.pi*frequency*result["inductance"]/result["resistanceRF"]
+    return result
@@ -0,0 +1,315 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+
+from coilCalculator import writeFile
+from passPlanner import Tool, passDepths, planPasses
+from pathOffset import coilOutlines
+from sheetNesting import SheetNester, coilToolpaths
+
+#Cut a batch of coils that need different tools with as few tool changes as possible.
+#
+#The coils are nested onto sheets (see sheetNesting). Every coil contributes operations: a toolpath cut with one tool
+#at one depth, either the cuts of the coil with its own cutter or the roughing and finishing passes of passPlanner.
+#On every sheet the operations of all coils are grouped by tool, from the largest to the smallest (roughing comes
+#before finishing). Within a tool the coils are visited in nearest neighbour order, and the operations of one coil
+#with that tool are cut in the coil's own order, e.g. all depths of a path before the next path. Every sheet gives
+#one program with a tool change block (M06) wherever the tool changes, the tool that is loaded at the end of a sheet
+#is kept for the next one if it comes first there.
+#
+#The schedule is compared with cutting the same sheets coil by coil, every coil with all its own operations. Visiting
+#every coil once per tool can travel further than that, so a sheet on which the grouped order would need more tool
+#changes or more rapid travel than the coil by coil order is cut coil by coil.
+#
+#Example:
+#  jobs = [Job(standardCoil), Job(compactCoil), Job(innerCoilWireCutter, feed = 3.5)]
+#  schedule = JobScheduler(100, 80, kerf = 2).schedule(jobs)
+#  print schedule.stats
+#  for n in range(len(schedule.sheets)):
+#      schedule.generateGCode(n, filename = "sheet{0}.txt".format(n))
+
+
+def _toolKey(tool):
+    return round(tool.diameter, 6)
+
+
+class Job(object):
+    """A coil to be cut.
+
+    - coil: a SaddleCoil or SimpleSaddleCoil
+    - feed: feed of its cutter, defaults to the feed of the coil (7.5 for a SimpleSaddleCoil)
+    - depth: total depth of the cut in mm
+    - stepDown: depth per pass of its cutter, None for a single pass
+    - tools: optional list of passPlanner.Tools, the coil is then cut in roughing and finishing passes (SaddleCoil only)
+    - allowance: material left by roughing, see passPlanner.planPasses
+    - name: optional label"""
+
+    def __init__(self, coil, feed = None, depth = 0.3, stepDown = None, tools = None, allowance = 0.1, name = ""):
+        self.coil = coil
+        self.feed = feed if feed is not None else getattr(coil, "feed", 7.5)
+        self.depth = depth
+        self.stepDown = stepDown
+        self.tools = tools
+        self.allowance = allowance
+        self.name = name
+
+    def margin(self):
+        """How far in mm the passes reach beyond the area touched by the coil's own cutter."""
+        if not self.tools:
+            return 0.
+        return max(0., max(t.diameter for t in self.tools) + self.allowance - self.coil.cD)
+
+    def operations(self):
+        """Return the operations of the coil as (tool, depth, toolpath) in coil coordinates, in the order in which
+        the coil is cut on its own."""
+        if self.tools:
+            plan = planPasses(coilOutlines(self.coil), self.tools, self.depth, self.allowance)
+            return [(p.tool, d, p.toolpath) for p in plan.passes for d in p.depths]
+        tool = Tool(self.coil.cD, self.feed, self.stepDown)
+        return [(tool, d, path) for path in coilToolpaths(self.coil) for d in passDepths(self.depth, self.stepDown)]
+
+
+class Block(object):
+    """Toolpaths cut with one tool at one depth. items holds (toolpath, feed)."""
+
+    def __init__(self, tool, depth):
+        self.tool = tool
+        self.depth = depth
+        self.items = []
+
+
+def _nearestNeighbour(groups, position):
+    """Order lists of operations (tool, depth, toolpath, feed) so that every list starts close to where the previous
+    one ended. The operations inside a list keep their order and paths are not reversed, the direction of a cut
+    decides between climb and conventional milling."""
+    remaining = list(groups)
+    ordered = []
+    while remaining:
+        starts = np.array([g[0][2].p0 for g in remaining])
+        n = int(np.argmin(np.sum((starts - position)**2, axis = 1)))
+        group = remaining.pop(n)
+        ordered.append(group)
+        position = _end(group[-1][2])
+    return ordered, position
+
+
+def _groupedOrder(operations):
+    """Return the operations of a sheet (a list per coil) grouped by tool, largest tool first, the coils of every
+    tool in nearest neighbour order."""
+    keys = sorted(set(_toolKey(op[0]) for coilOperations in operations for op in coilOperations), reverse = True)
+    order = []
+    position = np.zeros(2)
+    for key in keys:
+        groups = [[op for op in coilOperations if _toolKey(op[0]) == key] for coilOperations in operations]
+        ordered, position = _nearestNeighbour([g for g in groups if g], position)
+        order.extend(op for g in ordered for op in g)
+    return order
+
+
+def _blocks(order):
+    """Collect consecutive operations with the same tool and depth into Blocks."""
+    blocks = []
+    for tool, depth, path, feed in order:
+        if not blocks or _toolKey(blocks[-1].tool) != _toolKey(tool) or round(blocks[-1].depth, 6) != round(depth, 6):
+            blocks.append(Block(tool, depth))
+        blocks[-1].items.append((path, feed))
+    return blocks
+
+
+def _end(path):
+    if len(path.segments) == 0:
+        return np.array(path.p0)
+    return np.array([path.segments["x"][-1], path.segments["y"][-1]])
+
+
+def _sequenceStats(sheets, loaded = None):
+    """Count tool changes and rapid travel for a list (one per sheet) of lists of (tool, toolpath).
+
+    - loaded: key of the tool in the spindle at the start, None for none
+
+    Returns the number of tool changes, the rapid travel in mm and the key of the tool loaded at the end."""
+    changes = 0
+    rapid = 0.
+    for sequence in sheets:
+        position = np.zeros(2)
+        for tool, path in sequence:
+            if loaded is None or _toolKey(tool) != loaded:
+                changes += 1
+                loaded = _toolKey(tool)
+            rapid += float(np.sqrt(np.sum((np.array(path.p0) - position)**2)))
+            position = _end(path)
+    return changes, rapid, loaded
+
+
+class Schedule(object):
+    """The programs of a batch: one list of Blocks per sheet.
+
+    - sheets: the sheetNesting.Sheets
+    - blocks: list (one per sheet) of lists of Blocks
+    - toolNumbers: tool key (diameter) -> tool number
+    - stats: toolChanges, rapidLength (mm) and the same for cutting coil by coil (naiveToolChanges,
+      naiveRapidLength), and toolChangesAvoided"""
+
+    def __init__(self, sheets, blocks, toolNumbers, stats):
+        self.sheets = sheets
+        self.blocks = blocks
+        self.toolNumbers = toolNumbers
+        self.stats = stats
+
+    def _loadedBefore(self, k):
+        #the tool in the spindle when the program of sheet k starts
+        for blocks in reversed(self.blocks[:k]):
+            if blocks:
+                return _toolKey(blocks[-1].tool)
+        return None
+
+    def gCodeLines(self, k):
+        """Yield the G-Code of sheet k line by line."""
+        sheet = self.sheets[k]
+        yield ";G-Code generated by jobScheduler.py\n"
+        yield ";sheet : {0:.3f} x {1:.3f}\n".format(sheet.width, sheet.height)
+        yield ";coils : {0}\n".format(len(sheet.placements))
+        yield "G90\n"
+        yield "G00 Z5.00\n"
+
+        loaded = self._loadedBefore(k)
+        spindle = False
+        for block in self.blocks[k]:
+            key = _toolKey(block.tool)
+            if key != loaded:
+                if spindle:
+                    yield "M10 O6.0\n"
+                    spindle = False
+                yield "M06 T{0}\n".format(self.toolNumbers[key])
+                loaded = key
+            if not spindle:
+                yield "M10 O6.1\n"
+                spindle = True
+            yield ";T{0} {1}, depth {2:g}\n".format(self.toolNumbers[key], block.tool.name, block.depth)
+            for path, feed in block.items:
+                for line in path.gCodeLines(feed, block.depth):
+                    yield line
+
+        if spindle:
+            yield "M10 O6.0\n"
+
+    def writeGCode(self, k, sink):
+        for line in self.gCodeLines(k):
+            sink.write(line)
+
+    def gCode(self, k):
+        return "".join(self.gCodeLines(k))
+
+    def generateGCode(self, k, filename = ""):
+        """Write the program of sheet k to a file, or print and return it if no filename is given."""
+        if len(filename) > 0:
+            writeFile(filename, lambda f: self.writeGCode(k, f))
+        else:
+            code = self.gCode(k)
+            print code
+            return code
+
+
+class JobScheduler(object):
+    """Nest a batch of Jobs onto sheets and group their operations by tool and depth."""
+
+    def __init__(self, sheetWidth, sheetHeight, kerf = 1., allowRotation = True, strategy = "maxrects"):
+        """See sheetNesting.SheetNester. The kerf is enlarged by the reach of roughing tools that are wider than the
+        cutter of a coil."""
+        self.sheetWidth = sheetWidth
+        self.sheetHeight = sheetHeight
+        self.kerf = kerf
+        self.allowRotation = allowRotation
+        self.strategy = strategy
+
+    def schedule(self, jobs):
+        """Return the Schedule of a list of Jobs."""
+        margin = max([j.margin() for j in jobs] + [0.])
+        nester = SheetNester(self.sheetWidth, self.sheetHeight, self.kerf + margin, self.allowRotation, self.strategy)
+        sheets = nester.pack([j.coil for j in jobs])
+
+        jobsOfCoil = {}
+        for j in jobs:
+            jobsOfCoil.setdefault(id(j.coil), []).append(j)
+
+        tools = {}
+        placed = []
+        for sheet in sheets:
+            operations = []
+            for placement in sheet.placements:
+                job = jobsOfCoil[id(placement.coil)].pop(0)
+                ops = job.operations()
+                paths = placement.place([path for tool, depth, path in ops])
+                operations.append([(tool, depth, path, tool.feed) for (tool, depth, p), path in zip(ops, paths)])
+                for tool, depth, p in ops:
+                    tools.setdefault(_toolKey(tool), tool)
+            placed.append(operations)
+
+        #tool numbers: those given with the tools, the others from the largest tool down
+        toolNumbers = dict((k, t.number) for k, t in tools.items() if t.number is not None)
+        free = (n for n in range(1, 1000) if n not in toolNumbers.values())
+        for k in sorted(tools, reverse = True):
+            if k not in toolNumbers:
+                toolNumbers[k] = next(free)
+
+        blocks = []
+        loaded = naiveLoaded = None
+        changes = rapid = naiveChanges = naiveRapid = 0
+        for operations in placed:
+            naive = [op for coilOperations in operations for op in coilOperations]
+            c, r, naiveLoaded = _sequenceStats([[(tool, path) for tool, depth, path, feed in naive]], naiveLoaded)
+            naiveChanges += c
+            naiveRapid += r
+
+            #keep the grouped order unless it is worse than coil by coil in tool changes or in travel
+            candidates = []
+            for order in (_groupedOrder(operations), naive):
+                c, r, l = _sequenceStats([[(tool, path) for tool, depth, path, feed in order]], loaded)
+                candidates.append((changes + c, rapid + r, l, order))
+            chosen = [x for x in candidates if x[0] <= naiveChanges and x[1] <= naiveRapid + 1e-9]
+            changes, rapid, loaded, order = chosen[0] if chosen else min(candidates, key = lambda x: x[:2])
+            blocks.append(_blocks(order))
+
+        stats = {"toolChanges" : changes,
+                 "rapidLength" : rapid,
+                 "naiveToolChanges" : naiveChanges,
+                 "naiveRapidLength" : naiveRapid,
+                 "toolChangesAvoided" : naiveChanges - changes}
+        return Schedule(sheets, blocks, toolNumbers, stats)
+
+
+def main(argv = None):
+    from batchRunner import readSpecs
+    from coilCalculator import SaddleCoil
+
+    parser = argparse.ArgumentParser(description = "Nest a batch of coils and cut it with as few tool changes as possible.")
+    parser.add_argument("specs", help = "CSV or JSON file with one coil per row, see batchRunner.py")
+    parser.add_argument("--sheet", type = float, nargs = 2, required = True, metavar = ("WIDTH", "HEIGHT"), help = "size of the sheets in mm")
+    parser.add_argument("--kerf", type = float, default = 1., help = "margin between the coils in mm")
+    parser.add_argument("--depth", type = float, default = 0.3, help = "depth of the cuts in mm")
+    parser.add_argument("--step-down", type = float, default = None, help = "depth per pass in mm")
+    parser.add_argument("--output-dir", default = ".", help = "directory for the programs sheet<n>.txt")
+    args = parser.parse_args(argv)
+
+    jobs = []
+    for spec in readSpecs(args.specs):
+        if "error" in spec:
+            sys.stderr.write("{0} skipped: {1}\n".format(spec["name"], spec["error"]))
+            continue
+        arguments = dict((k, spec[k]) for k in ("h", "r", "alpha", "width", "cutterDiameter", "gap", "legLength", "cornerRadius", "compact") if k in spec)
+        jobs.append(Job(SaddleCoil(**arguments), spec.get("feed"), args.depth, args.step_down, name = spec["name"]))
+
+    schedule = JobScheduler(args.sheet[0], args.sheet[1], args.kerf).schedule(jobs)
+    for n in range(len(schedule.sheets)):
+        schedule.generateGCode(n, filename = os.path.join(args.output_dir, "sheet{0}.txt".format(n)))
+
+    s = schedule.stats
+    print "{0} coils on {1} sheets".format(len(jobs), len(schedule.sheets))
+    print "tool changes: {0} (coil by coil: {1}, avoided: {2})".format(s["toolChanges"], s["naiveToolChanges"], s["toolChangesAvoided"])
+    print "rapid travel: {0:.1f} mm (coil by coil: {1:.1f} mm)".format(s["rapidLength"], s["naiveRapidLength"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+import argparse
+import json
+import math
+
+from coilCalculator import writeFile
+from gCodeSimulator import Machine, estimate
+from pathOffset import coilOutlines, gouges
+
+#Roughing and finishing passes over several depths for thick sheets.
+#
+#The passes are offsets of the copper outlines (see pathOffset): a roughing tool of diameter D runs at D/2 plus an
+#allowance from the copper and cuts the full depth in steps of its stepDown, then the finishing tool runs at its own
+#radius from the copper and removes the allowance. As only the thin allowance is left, it can cut deeper per pass
+#(finishStepDown). A roughing tool wider than the designed slot fits only along parts of an outline, so every outline
+#is checked piece by piece (one piece per corner): each piece is roughed with the largest tool that does not touch any
+#copper there. Where no roughing tool fits, the finishing tool slots the full depth on its own.
+#
+#compare estimates the cycle time with gCodeSimulator, for the planned passes and for cutting everything with the
+#finishing tool alone.
+#
+#Example:
+#  tools = [Tool(2., 600, 0.5, number = 1), Tool(1., 300, 0.2, finishStepDown = 1., number = 2)]
+#  result = compare(SaddleCoil(12, 6, 120, 2.5, 1, cornerRadius = 1), tools, depth = 1.)
+#  print result["timeSaved"]
+#  result["plan"].generateGCode(filename = "standardCoil.passes.txt")
+
+
+class Tool(object):
+    """A cutter.
+
+    - diameter: in mm
+    - feed: F word of the cutting moves
+    - stepDown: depth per pass in mm when slotting
+    - finishStepDown: depth per pass when only the allowance is left, defaults to the full depth
+    - number: tool number for the tool change (M06 T...), None for no tool change
+    - name: optional description"""
+
+    def __init__(self, diameter, feed, stepDown, finishStepDown = None, number = None, name = ""):
+        self.diameter = float(diameter)
+        self.feed = feed
+        self.stepDown = stepDown
+        self.finishStepDown = finishStepDown
+        self.number = number
+        self.name = name or "{0:g} mm".format(diameter)
+
+
+def passDepths(depth, stepDown):
+    """Return the depths of the passes that reach depth in steps of at most stepDown."""
+    if stepDown is None or stepDown >= depth:
+        return [depth]
+    n = int(math.ceil(depth/stepDown - 1e-9))
+    return [depth*(k + 1)/float(n) for k in range(n)]
+
+
+class Pass(object):
+    """One toolpath cut at one or more depths.
+
+    - tool: the Tool
+    - kind: "roughing" or "finishing"
+    - outline: index of the outline
+    - toolpath: the Toolpath of the cutter center
+    - depths: list of depths in mm"""
+
+    def __init__(self, tool, kind, outline, toolpath, depths):
+        self.tool = tool
+        self.kind = kind
+        self.outline = outline
+        self.toolpath = toolpath
+        self.depths = depths
+
+
+class PassPlan(object):
+    """The passes of one program, in the order they are cut: the tools from the largest to the smallest.
+
+    rejected lists the roughing tools that do not fit everywhere along an outline as (tool, outline, distance), with
+    the smallest distance from the copper of the pieces they leave out, see pathOffset.gouges."""
+
+    def __init__(self, passes, rejected):
+        self.passes = passes
+        self.rejected = rejected
+
+    def gCodeLines(self):
+        """Yield the G-Code of all passes line by line, with a tool change before every new tool."""
+        yield ";G-Code generated by passPlanner.py\n"
+        yield "G90\n"
+        yield "G00 Z5.00\n"
+
+        tool = None
+        for p in self.passes:
+            if p.tool is not tool:
+                if tool is not None:
+                    yield "M10 O6.0\n"
+                tool = p.tool
+                yield ";{0} {1}\n".format(tool.name, p.kind)
+                if tool.number is not None:
+                    yield "M06 T{0}\n".format(tool.number)
+                yield "M10 O6.1\n"
+            for depth in p.depths:
+                for line in p.toolpath.gCodeLines(tool.feed, depth):
+                    yield line
+
+        if tool is not None:
+            yield "M10 O6.0\n"
+
+    def writeGCode(self, sink):
+        for line in self.gCodeLines():
+            sink.write(line)
+
+    def gCode(self):
+        return "".join(self.gCodeLines())
+
+    def generateGCode(self, filename = ""):
+        """Write the G-Code to a file, or print and return it if no filename is given."""
+        if len(filename) > 0:
+            writeFile(filename, self.writeGCode)
+        else:
+            code = self.gCode()
+            print code
+            return code
+
+
+def _runs(selected, n):
+    """Split a set of corner indices of a closed outline with n corners into runs of consecutive corners.
+
+    Returns [None] if all corners are selected, i.e. the whole closed outline."""
+    if len(selected) == n:
+        return [None]
+    #start after a corner that is not selected, so that no run is split at the end of the outline
+    first = min(k for k in range(n) if k not in selected)
+    runs = []
+    run = []
+    for m in range(1, n + 1):
+        k = (first + m) % n
+        if k in selected:
+            run.append(k)
+        elif run:
+            runs.append(run)
+            run = []
+    if run:
+        runs.append(run)
+    return runs
+
+
+def planPasses(outlines, tools, depth, allowance = 0.1, step = 0.05):
+    """Plan roughing and finishing passes for a list of pathOffset.Outlines that enclose copper.
+
+    - tools: list of Tools, the smallest one finishes, all others rough
+    - depth: total depth of the cut in mm
+    - allowance: material in mm left by the roughing tools for the finishing tool
+    - step: sampling step of the check against the copper
+
+    Every outline is checked piece by piece (one piece per corner, see pathOffset.Outline.pieces). A roughing tool
+    cuts the runs of pieces where it keeps off the copper and have not been roughed by a larger tool. The finishing
+    tool first slots the pieces that no roughing tool could cut and then removes the allowance from the others.
+
+    Returns a PassPlan. Raises ValueError if the finishing tool does not fit or cannot reach the roughed cut."""
+    tools = sorted(tools, key = lambda t: -t.diameter)
+    finisher = tools[-1]
+    if allowance > finisher.diameter:
+        raise ValueError("The allowance of {0} mm is larger than the finishing tool, it would leave a wall.".format(allowance))
+
+    roughing = []
+    finishing = []
+    rejected = []
+    for k, outline in enumerate(outlines):
+        n = len(outline)
+        roughed = set()
+        for tool in tools[:-1]:
+            offset = outline.offset(tool.diameter/2. + allowance)
+            clear = set()
+            smallest = None
+            for corner in range(n):
+                if corner in roughed:
+                    continue
+                distance, positions = gouges(offset.toToolpath([corner]), outlines, tool.diameter/2., step)
+                if len(positions):
+                    smallest = distance if smallest is None else min(smallest, distance)
+                else:
+                    clear.add(corner)
+            if smallest is not None:
+                rejected.append((tool, k, smallest))
+            if clear:
+                for corners in _runs(clear, n):
+                    roughing.append(Pass(tool, "roughing", k, offset.toToolpath(corners), passDepths(depth, tool.stepDown)))
+                roughed |= clear
+
+        offset = outline.offset(finisher.diameter/2.)
+        distance, positions = gouges(offset.toToolpath(), outlines, finisher.diameter/2., step)
+        if len(positions):
+            raise ValueError("The finishing tool ({0}) does not fit outline {1}, it comes {2:.3f} mm close to the copper.".format(finisher.name, k, distance))
+        #slot first, so that the finishing passes never meet uncut material at the ends of the roughed runs
+        unroughed = set(range(n)) - roughed
+        if unroughed:
+            for corners in _runs(unroughed, n):
+                finishing.append(Pass(finisher, "finishing", k, offset.toToolpath(corners), passDepths(depth, finisher.stepDown)))
+        if roughed:
+            for corners in _runs(roughed, n):
+                finishing.append(Pass(finisher, "finishing", k, offset.toToolpath(corners), passDepths(depth, finisher.finishStepDown)))
+
+    #group the roughing passes by tool, largest tool first
+    order = dict((id(t), n) for n, t in enumerate(tools))
+    roughing.sort(key = lambda p: (order[id(p.tool)], p.outline))
+    return PassPlan(roughing + finishing, rejected)
+
+
+def compare(coil, tools, depth, allowance = 0.1, machine = None, step = 0.05):
+    """Plan the passes for a SaddleCoil and estimate the time saved compared with cutting it with the finishing tool alone.
+
+    Returns a dictionary with the plan, the estimates (see gCodeSimulator.estimate) of multiPass and singleTool and
+    timeSaved in s."""
+    outlines = coilOutlines(coil)
+    plan = planPasses(outlines, tools, depth, allowance, step)
+    single = planPasses(outlines, [min(tools, key = lambda t: t.diameter)], depth, allowance, step)
+    multiPass, singleTool = estimate([plan.gCode(), single.gCode()], machine)
+    return {"plan" : plan,
+            "multiPass" : multiPass,
+            "singleTool" : singleTool,
+            "timeSaved" : singleTool["cycleTime"] - multiPass["cycleTime"]}
+
+
+def main(argv = None):
+    from coilCalculator import SaddleCoil
+
+    parser = argparse.ArgumentParser(description = "Plan roughing and finishing passes for a SaddleCoil.")
+    parser.add_argument("h", type = float)
+    parser.add_argument("r", type = float)
+    parser.add_argument("alpha", type = float)
+    parser.add_argument("width", type = float)
+    parser.add_argument("cutterDiameter", type = float, help = "cutter the coil was designed for")
+    parser.add_argument("--gap", type = float, default = 1)
+    parser.add_argument("--leg-length", type = float, default = 10)
+    parser.add_argument("--corner-radius", type = float, default = 0.5)
+    parser.add_argument("--compact", action = "store_true")
+    parser.add_argument("--tool", nargs = 3, type = float, action = "append", required = True,
+                        metavar = ("DIAMETER", "FEED", "STEPDOWN"), help = "a tool, repeat for several tools")
+    parser.add_argument("--finish-step-down", type = float, default = None, help = "depth per finishing pass after roughing")
+    parser.add_argument("--depth", type = float, required = True, help = "total depth of the cut in mm")
+    parser.add_argument("--allowance", type = float, default = 0.1, help = "material left by roughing in mm")
+    parser.add_argument("--m-command-time", type = float, default = 1., help = "time in s for every M command, e.g. a tool change")
+    parser.add_argument("-o", "--output", default = "", help = "G-Code file of the passes")
+    parser.add_argument("--json", action = "store_true", help = "print the estimates as JSON")
+    args = parser.parse_args(argv)
+
+    coil = SaddleCoil(args.h, args.r, args.alpha, args.width, args.cutterDiameter, gap = args.gap,
+                      legLength = args.leg_length, cornerRadius = args.corner_radius, compact = args.compact)
+    tools = [Tool(d, f, s, args.finish_step_down, number = n + 1) for n, (d, f, s) in enumerate(args.tool)]
+    result = compare(coil, tools, args.depth, args.allowance, Machine(mCommandTime = args.m_command_time))
+
+    if args.output:
+        result["plan"].generateGCode(filename = args.output)
+
+    if args.json:
+        print json.dumps(dict((k, v) for k, v in result.items() if k != "plan"), indent = 2, sort_keys = True)
+        return
+    for p in result["plan"].passes:
+        print "{0:<10} {1:<8} outline {2}: {3} passes".format(p.kind, p.tool.name, p.outline, len(p.depths))
+    for tool, outline, distance in result["plan"].rejected:
+        print "{0} does not fit all of outline {1} (comes {2:.3f} mm close to the copper)".format(tool.name, outline, distance)
+    print "single tool {0:.0f} s, with roughing {1:.0f} s, saved {2:.0f} s".format(
+        result["singleTool"]["cycleTime"], result["multiPass"]["cycleTime"], result["timeSaved"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import numpy as np
+
+from toolpath import Toolpath, STRAIGHT, CLOCKWISE, COUNTERCLOCKWISE, SEGMENT
+from clearanceChecker import samplePath, _neighbourPairs
+
+#Offsets of closed outlines made of straight edges and rounded corners.
+#
+#An Outline is a polygon of corner points with a radius for every corner, the same description SaddleCoil uses for
+#its cuts (points and bends). Offsetting it by a distance d moves every edge by d along its normal. The corners stay
+#on the bisectors (miter points), the radius of a corner that turns away from the offset direction grows by d, that
+#of a corner turning towards it shrinks by d and becomes a sharp corner once it reaches zero. This is the exact offset
+#as long as no edge vanishes; where an offset is too large for the outline (e.g. a tool wider than a slot), edges
+#turn around and the result runs into the material. gouges finds these places.
+#
+#Positive distances move the outline outwards, away from the area it encloses.
+#
+#Example:
+#  copper = coilOutlines(SaddleCoil(12, 6, 120, 2.5, 1, cornerRadius = 1))
+#  path = copper[0].offset(1.5).toToolpath()
+#  distance, positions = gouges(path, copper, 1.5)
+
+
+class Outline(object):
+    """A closed polygon with rounded corners.
+
+    - points: (n, 2) sharp corner points
+    - radii: (n,) radius of every corner"""
+
+    def __init__(self, points, radii):
+        self.points = np.asarray(points, dtype = float).reshape(-1, 2)
+        self.radii = np.asarray(radii, dtype = float).reshape(-1)
+
+    def __len__(self):
+        return len(self.points)
+
+    def orientation(self):
+        """Return 1 for a counterclockwise outline, -1 for a clockwise one."""
+        x = self.points[:, 0]
+        y = self.points[:, 1]
+        return 1. if np.sum(x*np.roll(y, -1) - np.roll(x, -1)*y) > 0 else -1.
+
+    def _edges(self):
+        #unit direction of the edge arriving at every corner and of the edge leaving it
+        leaving = np.roll(self.points, -1, axis = 0) - self.points
+        leaving /= np.sqrt(np.sum(leaving**2, axis = 1))[:, np.newaxis]
+        arriving = np.roll(leaving, 1, axis = 0)
+        return arriving, leaving
+
+    def turns(self):
+        """Return the cross product of the arriving and leaving edge at every corner, > 0 for a left turn."""
+        arriving, leaving = self._edges()
+        return arriving[:, 0]*leaving[:, 1] - arriving[:, 1]*leaving[:, 0]
+
+    def offset(self, distance):
+        """Return the outline moved outwards by distance (inwards for a negative distance)."""
+        arriving, leaving = self._edges()
+        orientation = self.orientation()
+        #outward normals: right of the direction of travel for a counterclockwise outline
+        n1 = orientation*np.column_stack([arriving[:, 1], -arriving[:, 0]])
+        n2 = orientation*np.column_stack([leaving[:, 1], -leaving[:, 0]])
+        miter = (n1 + n2)/(1 + np.sum(n1*n2, axis = 1))[:, np.newaxis]
+
+        #corners that turn with the outline (convex) grow when it moves outwards
+        convex = self.turns()*orientation > 0
+        radii = np.maximum(np.where(convex, self.radii + distance, self.radii - distance), 0)
+        return Outline(self.points + distance*miter, radii)
+
+    def pieces(self):
+        """Return the outline cut into one piece per corner: piece k runs along the edge arriving at corner k and
+        around the arc of the corner. Returns a list of (start, segments) with start the (x, y) end of the piece
+        before and segments a list of (kind, x, y, i, j). Corners with radius zero stay sharp."""
+        arriving, leaving = self._edges()
+        turns = self.turns()
+        #tangent length of the arc of every corner
+        cosine = np.clip(np.sum(arriving*leaving, axis = 1), -1, 1)
+        tangent = self.radii*np.tan(np.arccos(cosine)/2.)
+
+        pieces = []
+        end = tuple(self.points[-1])
+        for k in range(len(self)):
+            p = self.points[k]
+            start = p - arriving[k]*tangent[k]
+            segments = [(STRAIGHT, start[0], start[1], 0., 0.)]
+            if self.radii[k] > 0 and tangent[k] > 0:
+                stop = p + leaving[k]*tangent[k]
+                #the center lies on the side the path turns to
+                side = 1. if turns[k] > 0 else -1.
+                #(adding zero turns -0.0 into 0.0, which keeps "-0.000" out of the G-Code)
+                center = side*self.radii[k]*np.array([-arriving[k, 1], arriving[k, 0]]) + 0.
+                segments.append((COUNTERCLOCKWISE if turns[k] > 0 else CLOCKWISE, stop[0], stop[1], center[0], center[1]))
+            pieces.append((end, segments))
+            end = (segments[-1][1], segments[-1][2])
+        #the end of the last piece is where the first one starts
+        pieces[0] = (end, pieces[0][1])
+        return pieces
+
+    def toToolpath(self, corners = None):
+        """Return the outline as a Toolpath in the form of the cuts of a SaddleCoil: it starts at the first corner
+        point, runs along every edge to the start of the next corner arc and around the arc, and ends with the arc
+        of the first corner. Corners with radius zero stay sharp.
+
+        - corners: optional list of consecutive corner indices, the path then only covers their pieces (see pieces)"""
+        pieces = self.pieces()
+        if corners is None:
+            start = tuple(self.points[0])
+            corners = list(range(1, len(self))) + [0]
+        else:
+            start = pieces[corners[0]][0]
+        segments = [s for k in corners for s in pieces[k][1]]
+        return Toolpath(start, np.array(segments, dtype = SEGMENT))
+
+
+def coilOutlines(coil):
+    """Return the copper outlines of a SaddleCoil: the edges of the trace and of the second leg.
+
+    The cuts of a SaddleCoil are the copper outlines offset by half the cutter diameter, both enclose their copper.
+    Undoing that offset gives the nominal outlines, independent of the cutter."""
+    stage = coil._stage("shiftedPoints")
+    outlines = []
+    for points, bends in ((stage["points"], stage["bends"]), (stage["points2"], stage["bends_leg"])):
+        cut = Outline([(p.x, p.y) for p in points], [coil.radii[b] for b in bends])
+        outlines.append(cut.offset(-coil.cD/2.))
+    return outlines
+
+
+def inside(points, polygon, chunkSize = 2000):
+    """Return for every point whether it lies inside the closed polygon ((m, 2) vertices), by counting crossings."""
+    a = polygon
+    b = np.roll(polygon, -1, axis = 0)
+    result = np.zeros(len(points), dtype = bool)
+    for k in range(0, len(points), chunkSize):
+        x = points[k:k + chunkSize, 0][:, np.newaxis]
+        y = points[k:k + chunkSize, 1][:, np.newaxis]
+        straddles = (a[:, 1] > y) != (b[:, 1] > y)
+        dy = np.where(b[:, 1] != a[:, 1], b[:, 1] - a[:, 1], 1.)
+        xCross = a[:, 0] + (y - a[:, 1])*(b[:, 0] - a[:, 0])/dy
+        result[k:k + chunkSize] = np.sum(straddles & (x < xCross), axis = 1) % 2 == 1
+    return result
+
+
+def gouges(toolpath, outlines, radius, step = 0.05, tolerance = 1e-6):
+    """Check that a cutter of the given radius moving along toolpath keeps off the material inside the outlines.
+
+    Returns the smallest distance of the cutter center from any outline (radius if it never comes closer, -1 if the
+    whole path lies inside the material) and the positions where it is closer than radius - tolerance."""
+    path = samplePath(toolpath, step)[0]
+    material = np.vstack([samplePath(o.toToolpath(), step)[0] for o in outlines])
+    points = np.vstack([path, material])
+    i, j, d = _neighbourPairs(points, radius)
+    #pairs of one sample on the path and one on an outline
+    cross = (i < len(path)) != (j < len(path))
+    onPath = np.where(i < len(path), i, j)[cross]
+    d = d[cross]
+
+    close = d < radius - tolerance
+    bad = np.zeros(len(path), dtype = bool)
+    bad[onPath[close]] = True
+
+    #a path that enters the material crosses an outline and comes close to it. One that never comes close is
+    #either outside or entirely inside, which shows at its first point.
+    smallest = float(d.min()) if len(d) else radius
+    if not bad.any() and any(inside(path[:1], samplePath(o.toToolpath(), max(step, radius/4.))[0])[0] for o in outlines):
+        bad[:] = True
+        smallest = -1.
+    positions = np.round(path[bad], 3)
+    return min(smallest, radius), np.unique(positions, axis = 0) if len(positions) else positions
@@ -0,0 +1,140 @@
+import numpy as np
+
+#Ordering of independent cuts to reduce non-cutting moves.
+#
+#SimpleSaddleCoil cuts each of its line segments on its own: rapid to the start, plunge, cut, retract.
+#Many segments share end points, so they can be joined into polylines that are cut with a single plunge.
+#The polylines are then ordered (and reversed where useful) to minimize the rapid travel between them,
+#starting with a nearest neighbour tour that is improved by 2-opt moves.
+
+
+def _key(point, tolerance):
+    return (int(round(point[0]/tolerance)), int(round(point[1]/tolerance)))
+
+
+def chainSegments(lines, tolerance = 1e-6):
+    """Join line segments that share end points into polylines.
+
+    - lines: list of segments [[x1, y1], [x2, y2]]
+    - tolerance: end points closer than this (in mm) are considered identical
+
+    Returns a list of polylines, each a list of points [x, y]."""
+    ends = {}
+    for n, (p1, p2) in enumerate(lines):
+        ends.setdefault(_key(p1, tolerance), []).append(n)
+        ends.setdefault(_key(p2, tolerance), []).append(n)
+
+    used = [False]*len(lines)
+
+    def nextSegment(point):
+        for n in ends[_key(point, tolerance)]:
+            if not used[n]:
+                return n
+        return None
+
+    def extend(chain):
+        #follow unused segments from the last point of the chain
+        n = nextSegment(chain[-1])
+        while n is not None:
+            used[n] = True
+            p1, p2 = lines[n]
+            if _key(p1, tolerance) == _key(chain[-1], tolerance):
+                chain.append(list(p2))
+            else:
+                chain.append(list(p1))
+            n = nextSegment(chain[-1])
+
+    chains = []
+    for n, (p1, p2) in enumerate(lines):
+        if used[n]:
+            continue
+        used[n] = True
+        chain = [list(p1), list(p2)]
+        extend(chain)
+        chain.reverse()
+        extend(chain)
+        chain.reverse()
+        chains.append(chain)
+
+    return chains
+
+
+def _distance(p, q):
+    return np.sqrt((p[0] - q[0])**2 + (p[1] - q[1])**2)
+
+
+def rapidLength(chains, start = (0, 0)):
+    """Return the length of the rapid moves needed to cut the chains in the given order and direction."""
+    position = start
+    length = 0
+    for chain in chains:
+        length += _distance(position, chain[0])
+        position = chain[-1]
+    return length
+
+
+def orderChains(chains, start = (0, 0), iterations = 100):
+    """Order and orient the chains to minimize the rapid travel between them.
+
+    A nearest neighbour tour starting at start is improved by 2-opt moves. Reversing a part of the tour
+    also reverses the direction in which each of its chains is cut.
+
+    Returns the reordered list of chains."""
+    remaining = list(chains)
+    tour = []
+    position = start
+    while remaining:
+        #pick the chain with the closest end, reverse it if the closest end is its last point
+        best = None
+        for n, chain in enumerate(remaining):
+            for reverse, end in ((False, chain[0]), (True, chain[-1])):
+                d = _distance(position, end)
+                if best is None or d < best[0]:
+                    best = (d, n, reverse)
+        d, n, reverse = best
+        chain = remaining.pop(n)
+        if reverse:
+            chain = chain[::-1]
+        tour.append(chain)
+        position = chain[-1]
+
+    for iteration in range(iterations):
+        improved = False
+        for i in range(len(tour) - 1):
+            for j in range(i + 1, len(tour)):
+                before = tour[i - 1][-1] if i > 0 else start
+                after = tour[j + 1][0] if j + 1 < len(tour) else None
+
+                old = _distance(before, tour[i][0])
+                new = _distance(before, tour[j][-1])
+                if after is not None:
+                    old += _distance(tour[j][-1], after)
+                    new += _distance(tour[i][0], after)
+
+                if new < old - 1e-9:
+                    tour[i:j + 1] = [chain[::-1] for chain in reversed(tour[i:j + 1])]
+                    improved = True
+        if not improved:
+            break
+
+    return tour
+
+
+def optimizeLines(lines, start = (0, 0), tolerance = 1e-6):
+    """Chain and order line segments.
+
+    Returns the ordered polylines and a report comparing them with cutting the lines one by one in the given order:
+    plunges and rapid travel (in mm) before and after, and the savings."""
+    chains = orderChains(chainSegments(lines, tolerance), start)
+
+    rapidBefore = rapidLength(lines, start)
+    rapidAfter = rapidLength(chains, start)
+
+    report = {"plungesBefore" : len(lines),
+              "plungesAfter" : len(chains),
+              "plungesSaved" : len(lines) - len(chains),
+              "rapidBefore" : rapidBefore,
+              "rapidAfter" : rapidAfter,
+              "rapidSaved" : rapidBefore - rapidAfter}
+
+    return chains, report
@@ -0,0 +1,145 @@
+import threading
+import time
+
+#Opt-in timers and counters for the stages of the coil generators.
+#
+#The generators report to this module: SaddleCoil times the computation of every stage (points, shiftedPoints, cuts,
+#gCode, tikz), generatePathFromPoints counts the segments it creates, writeGCode and generateTikzCode count the bytes
+#written and the pdflatex calls are timed. Nothing is recorded unless the profiler is enabled.
+#
+#Stages nest, e.g. SaddleCoil.cuts computes shiftedPoints and points. The time of a stage includes the stages
+#called from it; its self time does not. Only the self times add up to the total run time.
+#
+#Example:
+#  profiler.enable()
+#  SaddleCoil(12, 6, 120, 2.5, 1, cornerRadius = 1).generateGCode(filename = "standardCoil.txt")
+#  print profiler.formatReport()
+
+enabled = False
+
+#stage name -> {"calls" : n, "time" : seconds including nested stages, "self" : seconds without them}
+timers = {}
+#stages currently running in each thread, innermost last
+_running = threading.local()
+#counter name -> value
+counters = {}
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def reset():
+    timers.clear()
+    counters.clear()
+
+
+class _Stage(object):
+    """Context manager that adds the time spent inside to a timer."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.nested = 0.
+        if not hasattr(_running, "stages"):
+            _running.stages = []
+        _running.stages.append(self)
+        self.start = time.time()
+        return self
+
+    def __exit__(self, kind, value, traceback):
+        elapsed = time.time() - self.start
+        _running.stages.pop()
+        if _running.stages:
+            _running.stages[-1].nested += elapsed
+
+        timer = timers.setdefault(self.name, {"calls" : 0, "time" : 0., "self" : 0.})
+        timer["calls"] += 1
+        timer["time"] += elapsed
+        timer["self"] += elapsed - self.nested
+        return False
+
+
+class _NoStage(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, kind, value, traceback):
+        return False
+
+_noStage = _NoStage()
+
+
+def stage(name):
+    """Time a block: with profiler.stage("cuts"): ...
+
+    Returns a shared do-nothing context manager while the profiler is disabled."""
+    if enabled:
+        return _Stage(name)
+    return _noStage
+
+
+def timed(name):
+    """Decorator that times every call of a function as a stage."""
+    def decorator(function):
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            with _Stage(name):
+                return function(*args, **kwargs)
+        wrapper.__name__ = function.__name__
+        wrapper.__doc__ = function.__doc__
+        #the undecorated function, e.g. for its argument list
+        wrapper.__wrapped__ = function
+        return wrapper
+    return decorator
+
+
+def count(name, n = 1):
+    """Add n to a counter, if the profiler is enabled."""
+    if enabled:
+        counters[name] = counters.get(name, 0) + n
+
+
+def report():
+    """Return the timers and counters as a dictionary {"timers" : ..., "counters" : ...}."""
+    return {"timers" : dict((k, dict(v)) for k, v in timers.items()), "counters" : dict(counters)}
+
+
+def merge(reports):
+    """Add up several reports, e.g. those of the workers of a process pool."""
+    merged = {"timers" : {}, "counters" : {}}
+    for r in reports:
+        for name, timer in r["timers"].items():
+            m = merged["timers"].setdefault(name, {"calls" : 0, "time" : 0., "self" : 0.})
+            m["calls"] += timer["calls"]
+            m["time"] += timer["time"]
+            m["self"] += timer.get("self", timer["time"])
+        for name, value in r["counters"].items():
+            merged["counters"][name] = merged["counters"].get(name, 0) + value
+    return merged
+
+
+def formatReport(r = None):
+    """Return a report as a table, the stage with the largest self time first.
+
+    "self ms" leaves out nested stages and adds up to the total, "incl. ms" includes them."""
+    if r is None:
+        r = report()
+    lines = ["{0:<36} {1:>8} {2:>12} {3:>12} {4:>12}".format("stage", "calls", "self ms", "incl. ms", "per call ms")]
+    for name, timer in sorted(r["timers"].items(), key = lambda item: -item[1].get("self", item[1]["time"])):
+        lines.append("{0:<36} {1:>8} {2:>12.3f} {3:>12.3f} {4:>12.4f}".format(name, timer["calls"], 1e3*timer.get("self", timer["time"]),
+                     1e3*timer["time"], 1e3*timer["time"]/max(timer["calls"], 1)))
+    if r["counters"]:
+        lines.append("")
+        lines.append("{0:<36} {1:>12}".format("counter", "value"))
+        for name, value in sorted(r["counters"].items()):
+            lines.append("{0:<36} {1:>12}".format(name, value))
+    return "\n".join(lines)
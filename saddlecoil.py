@@ -0,0 +1,145 @@
+import argparse
+import sys
+
+#Command line interface of the coil generator.
+#
+#  python saddlecoil.py gcode|tikz|svg h r alpha width cutterDiameter [options]
+#
+#The options are those of the SaddleCoil constructor (--gap, --leg-length, --corner-radius, --compact) and of the
+#output. G-Code and SVG are written to STDOUT unless an output file is given with -o, TikZ always goes to a file.
+#
+#The interpreter start dominates the run time of a single coil. Modules are therefore only imported when a command
+#needs them (coilCalculator does not need NumPy), and many coils can be made in one process: with "-" as the only
+#argument every line of STDIN is read as one command. Empty lines and lines starting with # are skipped, a failing
+#line is reported on STDERR and does not stop the others.
+#
+#Example:
+#  python saddlecoil.py gcode 12 6 120 2.5 1 --corner-radius 1 -o standardCoil.txt
+#  python saddlecoil.py svg 8 2.05 100 1.5 1 --corner-radius 1 --compact -o compactCoil.svg
+#  printf "gcode 12 6 120 2.5 1 --corner-radius 1 -o a.txt\ngcode 12 6 110 2.5 1 --corner-radius 1 -o b.txt\n" | python saddlecoil.py -
+
+
+class CommandError(Exception):
+    """Raised instead of exiting when a command line cannot be parsed."""
+    pass
+
+
+class _Parser(argparse.ArgumentParser):
+    def error(self, message):
+        raise CommandError(message)
+
+
+def buildParser():
+    parser = _Parser(prog = "saddlecoil", description = "Generate G-Code, TikZ or SVG of a saddle coil. "
+                     "Use - as the only argument to read one command per line from STDIN.")
+    commands = parser.add_subparsers(dest = "command")
+
+    coil = argparse.ArgumentParser(add_help = False)
+    coil.add_argument("h", type = float, help = "height of the coil in mm")
+    coil.add_argument("r", type = float, help = "radius of the coil in mm")
+    coil.add_argument("alpha", type = float, help = "angle spanned by one loop in degrees")
+    coil.add_argument("width", type = float, help = "width of the copper trace in mm")
+    coil.add_argument("cutterDiameter", type = float, help = "diameter of the cutter in mm")
+    coil.add_argument("--gap", type = float, default = 1, help = "gap between the traces of the legs in mm")
+    coil.add_argument("--leg-length", type = float, default = 10, help = "length of the legs in mm")
+    coil.add_argument("--corner-radius", type = float, default = 0.5, help = "radius of the corners, at least the cutter diameter")
+    coil.add_argument("--compact", action = "store_true", help = "connect the first leg directly to the left loop")
+
+    gcode = commands.add_parser("gcode", parents = [coil], help = "write the G-Code")
+    gcode.add_argument("--feed", type = float, default = 7.5, help = "feed of the cutting moves")
+    gcode.add_argument("--arc-tolerance", type = float, default = None, help = "cut arcs as straight chords within this distance in mm, for controllers without G2/G3")
+    gcode.add_argument("--max-segments", type = int, default = None, help = "limit for the number of segments with --arc-tolerance")
+    gcode.add_argument("-o", "--output", default = "-", help = "output file, - for STDOUT")
+
+    tikz = commands.add_parser("tikz", parents = [coil], help = "write a TeX file with a TikZ drawing")
+    tikz.add_argument("--scale", type = float, default = 1)
+    tikz.add_argument("--include-points", action = "store_true", help = "mark the corner points")
+    tikz.add_argument("--include-points-text", action = "store_true", help = "list the corner points")
+    tikz.add_argument("--include-gcode", action = "store_true", help = "append the G-Code")
+    tikz.add_argument("--compile", action = "store_true", help = "run pdflatex on the file")
+    tikz.add_argument("-o", "--output", default = "temp.tex", help = "output file")
+
+    svg = commands.add_parser("svg", parents = [coil], help = "write an SVG drawing")
+    svg.add_argument("--scale", type = float, default = 1)
+    svg.add_argument("--include-points", action = "store_true", help = "mark the corner points")
+    svg.add_argument("-o", "--output", default = "-", help = "output file, - for STDOUT")
+    return parser
+
+
+def run(args, stdout = None):
+    """Make the coil of parsed arguments and write the requested output."""
+    if stdout is None:
+        stdout = sys.stdout
+
+    from coilCalculator import SaddleCoil
+    coil = SaddleCoil(args.h, args.r, args.alpha, args.width, args.cutterDiameter, gap = args.gap,
+                      legLength = args.leg_length, cornerRadius = args.corner_radius, compact = args.compact)
+
+    if args.command == "gcode":
+        if args.output == "-":
+            coil.writeGCode(stdout, args.feed, args.arc_tolerance, args.max_segments)
+        else:
+            coil.generateGCode(args.feed, args.output, args.arc_tolerance, args.max_segments)
+    elif args.command == "tikz":
+        coil.generateTikzCode(args.output, args.compile, args.include_points, args.scale, args.include_points_text,
+                              args.include_gcode, verbose = False)
+    elif args.command == "svg":
+        code = coil.generateSVG("" if args.output == "-" else args.output, args.include_points, args.scale)
+        if args.output == "-":
+            stdout.write(code)
+
+
+def runLines(lines, parser = None, stdout = None, stderr = None):
+    """Run one command per line. Returns the number of failed lines."""
+    import shlex
+    if parser is None:
+        parser = buildParser()
+    if stderr is None:
+        stderr = sys.stderr
+
+    failed = 0
+    for n, line in enumerate(lines):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            run(parser.parse_args(shlex.split(line)), stdout)
+        except (CommandError, AssertionError, ValueError, IOError) as e:
+            failed += 1
+            stderr.write("line {0}: {1}\n".format(n + 1, e))
+        except Exception as e:
+            #e.g. a ZeroDivisionError from degenerate geometry
+            failed += 1
+            stderr.write("line {0}: {1}: {2}\n".format(n + 1, type(e).__name__, e))
+        except SystemExit as e:
+            #--help or --version in a line, argparse has already printed its text
+            if e.code:
+                failed += 1
+                stderr.write("line {0}: exit status {1}\n".format(n + 1, e.code))
+    return failed
+
+
+def main(argv = None):
+    if argv is None:
+        argv = sys.argv[1:]
+    parser = buildParser()
+
+    if argv == ["-"]:
+        return 1 if runLines(sys.stdin, parser) else 0
+
+    try:
+        args = parser.parse_args(argv)
+    except CommandError as e:
+        parser.print_usage(sys.stderr)
+        sys.stderr.write("saddlecoil: error: {0}\n".format(e))
+        return 2
+    try:
+        run(args)
+    except (AssertionError, ValueError) as e:
+        sys.stderr.write("saddlecoil: {0}\n".format(e))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,277 @@
+from coilCalculator import SaddleCoil, writeFile
+from toolpath import Toolpath, STRAIGHT, SEGMENT
+
+import numpy as np
+
+#Pack many coils onto one copper sheet and cut them with a single program.
+#
+#The bounding box of every coil, i.e. the area touched by the cutter, enlarged by a kerf margin between
+#neighbouring coils, is packed onto the sheet with a shelf or a maxrects strategy, optionally rotated by
+#90 degrees. Coils that do not fit
+#on one sheet go onto the next. Each sheet gives one program with a single header and footer.
+#
+#Example:
+#  nester = SheetNester(100, 80, kerf = 2)
+#  sheets = nester.pack([standardCoil, compactCoil, compactCoil])
+#  for n, sheet in enumerate(sheets):
+#      print sheet.utilization()
+#      sheet.generateGCode(filename = "sheet{0}.txt".format(n))
+
+
+class Placement(object):
+    """Position of one coil on a sheet.
+
+    - coil: the SaddleCoil or SimpleSaddleCoil
+    - x, y: lower left corner of the coil's bounding box on the sheet
+    - rotated: True if the coil is rotated by 90 degrees counterclockwise
+    - width, height: size of the coil's bounding box on the sheet, without kerf"""
+
+    def __init__(self, coil, x, y, rotated, width, height):
+        self.coil = coil
+        self.x = x
+        self.y = y
+        self.rotated = rotated
+        self.width = width
+        self.height = height
+
+    def toolpaths(self):
+        """Return the cuts of the coil as Toolpaths, rotated and shifted to their position on the sheet."""
+        return self.place(coilToolpaths(self.coil))
+
+    def place(self, paths):
+        """Move Toolpaths in the coordinates of the coil, e.g. its cuts or other passes, to the position on the sheet."""
+        xMin, yMin, xMax, yMax = coilExtent(self.coil)
+        paths = [p.translated(-xMin, -yMin) for p in paths]
+        if self.rotated:
+            #after the rotation the coil spans x from -height to 0, shift it back to x >= 0
+            paths = [p.rotated90().translated(self.width, 0) for p in paths]
+        return [p.translated(self.x, self.y) for p in paths]
+
+
+def coilExtent(coil):
+    """Return xMin, yMin, xMax, yMax of the area of a coil that is touched by the cutter.
+
+    The cuts of a SaddleCoil start at half the cutter diameter, those of a SimpleSaddleCoil at zero."""
+    cD2 = coil.cD/2.
+    x = []
+    y = []
+    for p in coilToolpaths(coil):
+        x += [p.p0[0], p.segments["x"].min(), p.segments["x"].max()]
+        y += [p.p0[1], p.segments["y"].min(), p.segments["y"].max()]
+    return min(x) - cD2, min(y) - cD2, max(x) + cD2, max(y) + cD2
+
+
+def coilSize(coil):
+    """Return the size of the area of a coil that is touched by the cutter."""
+    xMin, yMin, xMax, yMax = coilExtent(coil)
+    return xMax - xMin, yMax - yMin
+
+
+def coilToolpaths(coil):
+    """Return the cuts of a SaddleCoil or the lines of a SimpleSaddleCoil as a list of Toolpaths."""
+    if isinstance(coil, SaddleCoil):
+        return [Toolpath.fromPath(p) for p in coil.cuts]
+
+    paths = []
+    for p1, p2 in coil.lines:
+        segments = np.zeros(1, dtype = SEGMENT)
+        segments[0] = (STRAIGHT, p2[0], p2[1], 0, 0)
+        paths.append(Toolpath(p1, segments))
+    return paths
+
+
+class Sheet(object):
+    """A sheet of copper with the coils placed on it."""
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.placements = []
+
+    def usedArea(self):
+        return sum(p.width*p.height for p in self.placements)
+
+    def utilization(self):
+        """Return the fraction of the sheet covered by the bounding boxes of the coils."""
+        return self.usedArea()/float(self.width*self.height)
+
+    def gCodeLines(self, feed = 7.5):
+        """Yield the G-Code for all coils on the sheet line by line."""
+        yield ";G-Code generated by sheetNesting.py\n"
+        yield ";sheet : {0:.3f} x {1:.3f}\n".format(self.width, self.height)
+        yield ";coils : {0}\n".format(len(self.placements))
+        yield ";utilization : {0:.1f} %\n".format(100*self.utilization())
+        yield "G90\n"
+        yield "G00 Z5.00\n"
+        yield "M10 O6.1\n"
+
+        for p in self.placements:
+            yield ";coil at X{0:.3f} Y{1:.3f}{2}\n".format(p.x, p.y, " rotated" if p.rotated else "")
+            for path in p.toolpaths():
+                for line in path.gCodeLines(feed):
+                    yield line
+
+        yield "M10 O6.0\n"
+
+    def writeGCode(self, sink, feed = 7.5):
+        for line in self.gCodeLines(feed):
+            sink.write(line)
+
+    def gCode(self, feed = 7.5):
+        return "".join(self.gCodeLines(feed))
+
+    def generateGCode(self, feed = 7.5, filename = ""):
+        """Generate the G-Code for the sheet.
+
+        - feed: optional argument, defaults to 7.5
+        - filename: if specified, the g code is streamed to the file, if not it is printed to STDOUT and returned."""
+        if len(filename) > 0:
+            writeFile(filename, lambda f: self.writeGCode(f, feed))
+        else:
+            code = self.gCode(feed)
+            print code
+            return code
+
+
+class SheetNester(object):
+    """Pack the bounding boxes of coils onto sheets of a given size."""
+
+    def __init__(self, sheetWidth, sheetHeight, kerf = 1., allowRotation = True, strategy = "maxrects"):
+        """- sheetWidth, sheetHeight: size of the sheet in mm
+        - kerf: margin in mm between neighbouring coils and between the coils and the edge of the sheet
+        - allowRotation: allow rotating coils by 90 degrees
+        - strategy: "maxrects" (best short side fit) or "shelf" (first fit decreasing height)"""
+        assert strategy in ("maxrects", "shelf"), "Unknown packing strategy " + strategy
+        self.sheetWidth = sheetWidth
+        self.sheetHeight = sheetHeight
+        self.kerf = kerf
+        self.allowRotation = allowRotation
+        self.strategy = strategy
+
+    def _orientations(self, w, h):
+        if self.allowRotation and w != h:
+            return [(w, h, False), (h, w, True)]
+        return [(w, h, False)]
+
+    def _fitting(self, w, h):
+        """Return the orientations (width, height, rotated) in which a coil fits onto an empty sheet."""
+        return [(a, b, r) for a, b, r in self._orientations(w, h)
+                if a + 2*self.kerf <= self.sheetWidth and b + 2*self.kerf <= self.sheetHeight]
+
+    def pack(self, coils):
+        """Place all coils. Returns a list of Sheets."""
+        items = []
+        for coil in coils:
+            w, h = coilSize(coil)
+            if not self._fitting(w, h):
+                raise ValueError("A coil of {0:.3f} x {1:.3f} mm does not fit onto the sheet.".format(w, h))
+            items.append((coil, w, h))
+
+        if self.strategy == "shelf":
+            return self._packShelves(items)
+        return self._packMaxRects(items)
+
+    def _packShelves(self, items):
+        k = self.kerf
+        #lay every coil as flat as the sheet allows and sort by decreasing height
+        flat = []
+        for coil, w, h in items:
+            a, b, rotated = min(self._fitting(w, h), key = lambda o: o[1])
+            flat.append((coil, a, b, rotated))
+        flat.sort(key = lambda item: -item[2])
+
+        sheets = []
+        for coil, w, h, rotated in flat:
+            placed = False
+            for sheet, shelves in sheets:
+                for shelf in shelves:
+                    #shelf: [y, height, used width]
+                    if h <= shelf[1] and shelf[2] + w + k <= self.sheetWidth:
+                        sheet.placements.append(Placement(coil, shelf[2], shelf[0], rotated, w, h))
+                        shelf[2] += w + k
+                        placed = True
+                        break
+                if not placed:
+                    top = shelves[-1][0] + shelves[-1][1] + k
+                    if top + h + k <= self.sheetHeight:
+                        shelves.append([top, h, k + w + k])
+                        sheet.placements.append(Placement(coil, k, top, rotated, w, h))
+                        placed = True
+                if placed:
+                    break
+
+            if not placed:
+                sheet = Sheet(self.sheetWidth, self.sheetHeight)
+                sheet.placements.append(Placement(coil, k, k, rotated, w, h))
+                sheets.append((sheet, [[k, h, k + w + k]]))
+
+        return [sheet for sheet, shelves in sheets]
+
+    def _packMaxRects(self, items):
+        k = self.kerf
+        #free rectangles are (x, y, w, h) on a sheet whose border is already reduced by the kerf.
+        #Every coil occupies its size plus the kerf to its right and top.
+        items = sorted(items, key = lambda item: -item[1]*item[2])
+
+        sheets = []
+        for coil, w, h in items:
+            best = None
+            for n, (sheet, free) in enumerate(sheets):
+                for fx, fy, fw, fh in free:
+                    for a, b, rotated in self._orientations(w, h):
+                        if a + k <= fw and b + k <= fh:
+                            shortSide = min(fw - a - k, fh - b - k)
+                            if best is None or shortSide < best[0]:
+                                best = (shortSide, n, fx, fy, a, b, rotated)
+
+            if best is None:
+                sheet = Sheet(self.sheetWidth, self.sheetHeight)
+                sheets.append((sheet, [(k, k, self.sheetWidth - k, self.sheetHeight - k)]))
+                a, b, rotated = self._fitting(w, h)[0]
+                best = (0, len(sheets) - 1, k, k, a, b, rotated)
+
+            shortSide, n, x, y, a, b, rotated = best
+            sheet, free = sheets[n]
+            sheet.placements.append(Placement(coil, x, y, rotated, a, b))
+            sheets[n] = (sheet, self._splitFree(free, (x, y, a + k, b + k)))
+
+        return [sheet for sheet, free in sheets]
+
+    def _splitFree(self, free, used):
+        ux, uy, uw, uh = used
+        result = []
+        for fx, fy, fw, fh in free:
+            if ux >= fx + fw or ux + uw <= fx or uy >= fy + fh or uy + uh <= fy:
+                result.append((fx, fy, fw, fh))
+                continue
+            #up to four maximal rectangles around the used one
+            if ux > fx:
+                result.append((fx, fy, ux - fx, fh))
+            if ux + uw < fx + fw:
+                result.append((ux + uw, fy, fx + fw - ux - uw, fh))
+            if uy > fy:
+                result.append((fx, fy, fw, uy - fy))
+            if uy + uh < fy + fh:
+                result.append((fx, uy + uh, fw, fy + fh - uy - uh))
+
+        #drop rectangles that are contained in others
+        pruned = []
+        for i, a in enumerate(result):
+            contained = False
+            for j, b in enumerate(result):
+                if i != j and a[0] >= b[0] and a[1] >= b[1] and a[0] + a[2] <= b[0] + b[2] and a[1] + a[3] <= b[1] + b[3]:
+                    if a != b or i > j:
+                        contained = True
+                        break
+            if not contained:
+                pruned.append(a)
+        return pruned
+
+
+def compareStrategies(coils, sheetWidth, sheetHeight, kerf = 1., allowRotation = True):
+    """Pack the coils with every strategy and return a dictionary strategy -> (number of sheets, utilization per sheet)."""
+    result = {}
+    for strategy in ("shelf", "maxrects"):
+        sheets = SheetNester(sheetWidth, sheetHeight, kerf, allowRotation, strategy).pack(coils)
+        result[strategy] = (len(sheets), [s.utilization() for s in sheets])
+    return result
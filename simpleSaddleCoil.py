@@ -1,3 +1,10 @@
+from subprocess import call
+
+import coilGeometry
+import profiler
+
+from coilCalculator import writeFile
+
 class SimpleSaddleCoil(object):
     """A base class to represent a simple saddle coil, as machined from a 2D sheet.
 
@@ -20,36 +27,40 @@ class SimpleSaddleCoil(object):
 
         All units are in mm."""
 
-        self.circumference = 2*np.pi*r
+        #the coordinates are shared with SaddleCoil, see coilGeometry
+        t = coilGeometry.table(h, r, alpha, width, cutterDiameter)
+        self.circumference = t["circumference"]
         self.startAngle = startAngle
 
         self.cD = cutterDiameter
         self.width = width
 
-        cD2 = self.cD/2.
-        w2 = self.width/2.
+        cD2 = t["cD2"]
+        w2 = t["w2"]
 
-        yInnerBottom = w2 + cD2
-        yInnerTop = h - w2 - cD2
+        yInnerBottom = t["yInnerBottom"]
+        yInnerTop = t["yInnerTop"]
 
-        yOuterBottom = 0 - w2 - cD2
-        yOuterTop = h + w2 + cD2
+        yOuterBottom = t["yOuterBottom"]
+        yOuterTop = t["yOuterTop"]
 
         #xInnerLeft: first or left loop of the coil, inside left cutter coordinates
-        xInnerLeft_Left = self.angleToX(0) + w2 + cD2 
-        xInnerLeft_Right = self.angleToX(alpha) - w2 - cD2
+        xInnerLeft_Left = t["xInnerLeft_Left"]
+        xInnerLeft_Right = t["xInnerLeft_Right"]
 
-        xOuterLeft_Right = self.angleToX(alpha) + w2 + cD2
-        xOuterLeft_Left = self.angleToX(0) - w2 - cD2
+        xOuterLeft_Right = t["xOuterLeft_Right"]
+        xOuterLeft_Left = t["xOuterLeft_Left"]
 
         #xInnerRight: second or right loop of the coil
-        xInnerRight_Left = self.angleToX(180) + w2 + cD2 
-        xInnerRight_Right = self.angleToX(180 + alpha) - w2 - cD2
+        xInnerRight_Left = t["xInnerRight_Left"]
+        xInnerRight_Right = t["xInnerRight_Right"]
 
-        xOuterRight_Left = self.angleToX(180) - w2 - cD2 
-        xOuterRight_Right = self.angleToX(180 + alpha) + w2 + cD2
+        xOuterRight_Left = t["xOuterRight_Left"]
+        xOuterRight_Right = t["xOuterRight_Right"]
+
+        x180 = t["x180"]
+        xAlpha = t["xAlpha"]
 
-        
         self.lines = [
             # 3 inner cuts on first loop, starting at bottom right, clockwise
             [[xInnerLeft_Right, yInnerBottom], [xInnerLeft_Left, yInnerBottom]],
@@ -63,16 +74,16 @@ class SimpleSaddleCoil(object):
             [[xOuterLeft_Right, yInnerBottom], [xOuterLeft_Right, yOuterTop]],
             [[xOuterLeft_Right, yOuterTop], [xOuterLeft_Left, yOuterTop]],
             [[xOuterLeft_Left, yOuterTop], [xOuterLeft_Left, yOuterBottom]],
-            [[xOuterLeft_Left, yOuterBottom], [self.angleToX(alpha) - 3*w2 - 3*cD2 - gap, yOuterBottom]],
+            [[xOuterLeft_Left, yOuterBottom], [xAlpha - 3*w2 - 3*cD2 - gap, yOuterBottom]],
             #now follows the leg at the left, outer side
-            [[self.angleToX(alpha) - 3*w2 - 3*cD2 - gap, yOuterBottom],[self.angleToX(alpha) - 3*w2 - 3*cD2 - gap, yOuterBottom - 3*w2 - 3*cD2 - gap]],
-            [[self.angleToX(alpha) - 3*w2 - 3*cD2 - gap, yOuterBottom - 3*w2 - 3*cD2 - gap],[self.angleToX(180) - 3*w2 - 3*cD2 - gap, yOuterBottom - 3*w2 - 3*cD2 - gap]],
-            [[self.angleToX(180) - 3*w2 - 3*cD2 - gap, yOuterBottom - 3*w2 - 3*cD2 - gap],[self.angleToX(180) - 3*w2 - 3*cD2 - gap, yOuterBottom - legLength]],
+            [[xAlpha - 3*w2 - 3*cD2 - gap, yOuterBottom],[xAlpha - 3*w2 - 3*cD2 - gap, yOuterBottom - 3*w2 - 3*cD2 - gap]],
+            [[xAlpha - 3*w2 - 3*cD2 - gap, yOuterBottom - 3*w2 - 3*cD2 - gap],[x180 - 3*w2 - 3*cD2 - gap, yOuterBottom - 3*w2 - 3*cD2 - gap]],
+            [[x180 - 3*w2 - 3*cD2 - gap, yOuterBottom - 3*w2 - 3*cD2 - gap],[x180 - 3*w2 - 3*cD2 - gap, yOuterBottom - legLength]],
 
             #cut along the left leg - innser side
             [[xInnerLeft_Right - gap, yInnerBottom],[xInnerLeft_Right - gap, yInnerBottom - 2*w2 - 2*cD2 -gap]],
-            [[xInnerLeft_Right - gap, yInnerBottom - 2*w2 - 2*cD2 -gap],[self.angleToX(180) -  w2 - cD2 - gap, yInnerBottom - 2*w2 - 2*cD2 -gap]],
-            [[self.angleToX(180) -  w2 - cD2 - gap, yInnerBottom - 2*w2 - 2*cD2 -gap],[self.angleToX(180) -  w2 - cD2 - gap, yOuterBottom - legLength]],
+            [[xInnerLeft_Right - gap, yInnerBottom - 2*w2 - 2*cD2 -gap],[x180 -  w2 - cD2 - gap, yInnerBottom - 2*w2 - 2*cD2 -gap]],
+            [[x180 -  w2 - cD2 - gap, yInnerBottom - 2*w2 - 2*cD2 -gap],[x180 -  w2 - cD2 - gap, yOuterBottom - legLength]],
 
             #cut along right inner side of left loop to outer right bottom of right loop and counter-clockwise around the outside of the right loop
             [[xInnerLeft_Right, yInnerTop],[xInnerLeft_Right, yOuterBottom]],
@@ -85,11 +96,11 @@ class SimpleSaddleCoil(object):
             [[xOuterRight_Left, yInnerBottom + gap],[xInnerRight_Left, yInnerBottom + gap]],
 
             #add the cuts for the other leg
-            [[self.angleToX(180) -w2 - cD2, yOuterBottom], [self.angleToX(180) - w2 - cD2, yOuterBottom - legLength]],
-            [[self.angleToX(180) +w2 + cD2, yOuterBottom], [self.angleToX(180) + w2 + cD2, yOuterBottom - legLength]],
+            [[x180 -w2 - cD2, yOuterBottom], [x180 - w2 - cD2, yOuterBottom - legLength]],
+            [[x180 +w2 + cD2, yOuterBottom], [x180 + w2 + cD2, yOuterBottom - legLength]],
 
             #and the final cut to below the legs
-            [[self.angleToX(alpha) -  w2 - cD2 - gap, yOuterBottom - legLength],[self.angleToX(180) +w2 + cD2, yOuterBottom - legLength]]
+            [[xAlpha -  w2 - cD2 - gap, yOuterBottom - legLength],[x180 +w2 + cD2, yOuterBottom - legLength]]
             ]
 
         minX = min([l[0][0] for l in self.lines] + [l[1][0] for l in self.lines])
@@ -113,37 +124,86 @@ class SimpleSaddleCoil(object):
         
                         
 
-    def generateGCode(self, feed = 7.5, filename = ""):
-        """Generate GCode for the specified coil.
+    def optimizedCuts(self):
+        """Join the lines into polylines and order them to minimize plunges and rapid travel.
+
+        Returns the list of polylines. The comparison with the unoptimized order is stored in self.optimizationReport."""
+        from pathOptimizer import optimizeLines
+
+        chains, self.optimizationReport = optimizeLines(self.lines)
+        return chains
+
+    def gCodeLines(self, feed = 7.5, optimize = False):
+        """Yield the GCode for the specified coil line by line, each line terminated by a newline.
 
         - feed: optional argument, defaults to 7.5
-        - filename: if specified, the g code is saved, if not it is printed to STDOUT."""
-        
-        code = """;G-Code generated by coilGenerator.py
-;maxX : {0:.3f}
-;maxY : {1:.3f}
-G90
-M10 O6.1
-G00 Z5.00\n""".format(self.maxX, self.maxY)
+        - optimize: if True, connected lines are cut without retracting and the cuts are reordered, see optimizedCuts"""
+        yield ";G-Code generated by coilGenerator.py\n"
+        yield ";maxX : {0:.3f}\n".format(self.maxX)
+        yield ";maxY : {0:.3f}\n".format(self.maxY)
+        yield "G90\n"
+        yield "M10 O6.1\n"
+        yield "G00 Z5.00\n"
+
+        if optimize:
+            cuts = self.optimizedCuts()
+        else:
+            cuts = self.lines
 
-        for l in self.lines:
-            p1 = l[0]
-            p2 = l[1]
+        for cut in cuts:
+            p1 = cut[0]
+
+            yield "G00 X{0:.3f} Y{1:.3f}\n".format(p1[0], p1[1])
+            yield "G00 Z0.500\n"
+            yield "G01 Z-0.3 F{:.3f}\n".format(feed)
+            for p2 in cut[1:]:
+                yield "G01 X{0:.3f} Y{1:.3f}\n".format(p2[0], p2[1])
+            yield "G00 Z0.500\n"
+
+        yield "M10 O6.0\n"
+
+    def writeGCode(self, sink, feed = 7.5, optimize = False):
+        """Write the GCode for the specified coil to a file-like object.
 
-            code += "G00 X{0:.3f} Y{1:.3f}\n".format(p1[0], p1[1])
-            code += "G00 Z0.500\n"
-            code += "G01 Z-0.3 F{:.3f}\n".format(feed)
-            code += "G01 X{0:.3f} Y{1:.3f}\n".format(p2[0], p2[1])
-            code += "G00 Z0.500\n"
+        - sink: any object with a write method, e.g. an open file.
+        - feed: optional argument, defaults to 7.5
+        - optimize: optional, see gCodeLines"""
+        for line in self.gCodeLines(feed, optimize):
+            sink.write(line)
+
+    def gCode(self, feed = 7.5, optimize = False):
+        """Return the GCode for the specified coil as a string.
 
-        code += "M10 O6.0\n"
+        - feed: optional argument, defaults to 7.5
+        - optimize: optional, see gCodeLines"""
+        return "".join(self.gCodeLines(feed, optimize))
+
+    def generateGCode(self, feed = 7.5, filename = "", optimize = False):
+        """Generate GCode for the specified coil.
 
+        - feed: optional argument, defaults to 7.5
+        - filename: if specified, the g code is streamed to the file, if not it is printed to STDOUT.
+        - optimize: optional, see gCodeLines"""
         if len(filename) > 0:
-            f = open(filename, "w")
-            f.write(code)
-            f.close()
+            writeFile(filename, lambda f: self.writeGCode(f, feed, optimize))
         else:
-            print code
+            print self.gCode(feed, optimize)
+
+    def generateSVG(self, filename = "temp.svg", scale = 1):
+        """Export Coil to an SVG file. Unlike generateTikzCode, this does not need LaTeX.
+
+        Returns the SVG code, see svgRenderer.renderSVG."""
+        from svgRenderer import renderSVG
+        return renderSVG(self, filename, scale = scale)
+
+    def tikzCode(self):
+        """Return the TikZ commands that draw the cuts, one line per cut."""
+        code = ""
+        for l in self.lines:
+            p1 = l[0]
+            p2 = l[1]
+            code += "   \draw[thick] ( {0:.3f}, {1:.3f} ) -- ( {2:.3f}, {3:.3f} );\n".format(p1[0], p1[1], p2[0], p2[1])
+        return code
 
     def generateTikzCode(self, filename = "temp.tex", compileFile = False):
         """Export Coil to a TeX file. 
@@ -164,14 +224,9 @@ G00 Z5.00\n""".format(self.maxX, self.maxY)
 
         file.write(header)
 
-        for l in self.lines:
-            p1 = l[0]
-            p2 = l[1]
-
-            command = "   \draw[thick] ( {0:.3f}, {1:.3f} ) -- ( {2:.3f}, {3:.3f} );".format(p1[0], p1[1], p2[0], p2[1])
-            file.write(command + "\n")
-
-            print command
+        code = self.tikzCode()
+        file.write(code)
+        print code,
 
         command = " \draw[fill = red] (0,0) circle(0.15);"
         file.write(command + "\n")
@@ -181,7 +236,8 @@ G00 Z5.00\n""".format(self.maxX, self.maxY)
 
         if compileFile == True:
             print "Compiling TeX-File using pdflatex"
-            call(["pdflatex", filename])
+            with profiler.stage("pdflatex"):
+                call(["pdflatex", filename])
 
             call(["open", filename[:-4] + ".pdf"])
 
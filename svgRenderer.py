@@ -0,0 +1,200 @@
+import math
+import struct
+import zlib
+
+from coilCalculator import SaddleCoil, STRAIGHT, CLOCKWISE, COUNTERCLOCKWISE, coilSegments
+
+#Draw coils as SVG (and PNG) without going through LaTeX.
+#
+#The drawing shows the same content as SaddleCoil.generateTikzCode: the straight and arc segments of the cuts,
+#optionally the numbered points and points2, and the maxX / maxY dimension arrows. SimpleSaddleCoil is drawn
+#from its lines. All lengths in the SVG are in mm.
+#
+#Example:
+#  renderSVG(standardCoil, "standardCoil.svg", includePoints = True)
+#  renderPNG(standardCoil, "standardCoil.png", pixelsPerMM = 20)
+#  contactSheet(coils, "sweep.svg", labels = ["alpha = {0}".format(a) for a in alphas])
+
+#space around the coil for the dimension arrows, in mm
+MARGIN = 6
+
+
+def _sweep(x0, y0, kind, x, y, i, j):
+    """Return the sweep angle in radians of an arc starting at x0, y0."""
+    start = math.atan2(-j, -i)
+    stop = math.atan2(y - y0 - j, x - x0 - i)
+    if kind == COUNTERCLOCKWISE:
+        return (stop - start) % (2*math.pi)
+    return (start - stop) % (2*math.pi)
+
+
+def _svgPath(p0, segments, flip):
+    """Return the d attribute of an SVG path. flip(y) maps the coil's y to the SVG's downward y."""
+    x0, y0 = p0
+    d = ["M {0:.3f} {1:.3f}".format(x0, flip(y0))]
+    for kind, x, y, i, j in segments:
+        if kind == STRAIGHT:
+            d.append("L {0:.3f} {1:.3f}".format(x, flip(y)))
+        else:
+            r = math.sqrt(i**2 + j**2)
+            large = 1 if _sweep(x0, y0, kind, x, y, i, j) > math.pi else 0
+            #the y axis points down in SVG, a clockwise arc on the sheet has a positive sweep on the screen
+            sweep = 1 if kind == CLOCKWISE else 0
+            d.append("A {0:.3f} {0:.3f} 0 {1} {2} {3:.3f} {4:.3f}".format(r, large, sweep, x, flip(y)))
+        x0, y0 = x, y
+    return " ".join(d)
+
+
+def svgElements(coil, includePoints = False, includeDimensions = True):
+    """Return the SVG elements of a coil (without the svg element itself) and the viewBox (x, y, width, height)."""
+    maxX = coil.maxX
+    maxY = coil.maxY
+
+    def flip(y):
+        return maxY - y
+
+    elements = ['<g fill="none" stroke="black" stroke-width="0.15">']
+    for p0, segments in coilSegments(coil):
+        elements.append('<path d="{0}"/>'.format(_svgPath(p0, segments, flip)))
+    elements.append('</g>')
+
+    if includePoints and isinstance(coil, SaddleCoil):
+        elements.append('<g font-size="0.8" text-anchor="middle" dominant-baseline="central" font-family="sans-serif">')
+        for points in (coil.points, coil.points2):
+            for n, p in enumerate(points):
+                elements.append('<circle cx="{0:.3f}" cy="{1:.3f}" r="0.5" fill="none" stroke="gray" stroke-width="0.05"/>'.format(p.x, flip(p.y)))
+                elements.append('<text x="{0:.3f}" y="{1:.3f}">{2}</text>'.format(p.x, flip(p.y), n))
+        elements.append('</g>')
+
+    if includeDimensions:
+        elements.append('<g stroke="black" stroke-width="0.1" font-size="1.2" font-family="sans-serif" text-anchor="middle">')
+        #vertical arrow for maxY at x = -3, horizontal arrow for maxX at y = -3, as in the TikZ drawing
+        elements.append('<path d="M -3 {0:.3f} L -3 {1:.3f} M -3.4 {0:.3f} L -2.6 {0:.3f} M -3.4 {1:.3f} L -2.6 {1:.3f}"/>'.format(flip(0), flip(maxY)))
+        elements.append('<text x="-3.4" y="{0:.3f}" stroke="none" transform="rotate(-90 -3.4 {0:.3f})">{1:.2f} mm</text>'.format(flip(maxY/2.), maxY))
+        elements.append('<path d="M 0 {0:.3f} L {1:.3f} {0:.3f} M 0 {2:.3f} L 0 {3:.3f} M {1:.3f} {2:.3f} L {1:.3f} {3:.3f}"/>'.format(flip(-3), maxX, flip(-3.4), flip(-2.6)))
+        elements.append('<text x="{0:.3f}" y="{1:.3f}" stroke="none">{2:.2f} mm</text>'.format(maxX/2., flip(-3) + 1.5, maxX))
+        elements.append('</g>')
+
+    viewBox = (-MARGIN, -2, maxX + MARGIN + 2, maxY + MARGIN + 2)
+    return elements, viewBox
+
+
+def renderSVG(coil, filename = "", includePoints = False, includeDimensions = True, scale = 1):
+    """Draw a coil as SVG.
+
+    - filename: if specified, the SVG is written to the file
+    - includePoints: draw the numbered points of a SaddleCoil
+    - includeDimensions: draw the maxX / maxY arrows
+    - scale: size of one mm of the coil in mm of the drawing
+
+    Returns the SVG as a string."""
+    elements, viewBox = svgElements(coil, includePoints, includeDimensions)
+
+    svg = ['<svg xmlns="http://www.w3.org/2000/svg" width="{0:.3f}mm" height="{1:.3f}mm" viewBox="{2:.3f} {3:.3f} {4:.3f} {5:.3f}">'.format(
+        viewBox[2]*scale, viewBox[3]*scale, *viewBox)]
+    svg += elements
+    svg.append('</svg>\n')
+    code = "\n".join(svg)
+
+    if len(filename) > 0:
+        f = open(filename, "w")
+        f.write(code)
+        f.close()
+    return code
+
+
+def contactSheet(coils, filename = "", labels = None, columns = 6, cellSize = 60, includeDimensions = False):
+    """Draw thumbnails of many coils, e.g. of a parameter sweep, on one SVG page.
+
+    - coils: list of coils
+    - labels: optional list of captions, one per coil
+    - columns: number of thumbnails per row
+    - cellSize: size of every thumbnail in mm
+
+    Returns the SVG as a string."""
+    rows = (len(coils) + columns - 1)//columns
+    caption = 5 if labels else 0
+
+    svg = ['<svg xmlns="http://www.w3.org/2000/svg" width="{0}mm" height="{1}mm" viewBox="0 0 {0} {1}">'.format(
+        columns*cellSize, rows*(cellSize + caption))]
+    for n, coil in enumerate(coils):
+        x = (n % columns)*cellSize
+        y = (n//columns)*(cellSize + caption)
+        elements, viewBox = svgElements(coil, False, includeDimensions)
+        #a nested svg scales the coil into its cell and keeps the aspect ratio
+        svg.append('<svg x="{0}" y="{1}" width="{2}" height="{2}" viewBox="{3:.3f} {4:.3f} {5:.3f} {6:.3f}">'.format(x, y, cellSize, *viewBox))
+        svg += elements
+        svg.append('</svg>')
+        if labels:
+            svg.append('<text x="{0:.1f}" y="{1:.1f}" font-size="3" text-anchor="middle" font-family="sans-serif">{2}</text>'.format(
+                x + cellSize/2., y + cellSize + 3.5, labels[n]))
+    svg.append('</svg>\n')
+    code = "\n".join(svg)
+
+    if len(filename) > 0:
+        f = open(filename, "w")
+        f.write(code)
+        f.close()
+    return code
+
+
+def renderPNG(coil, filename, pixelsPerMM = 10, lineWidth = 2):
+    """Draw the cuts of a coil into a grayscale PNG file. Text and dimensions are not drawn.
+
+    - pixelsPerMM: resolution
+    - lineWidth: width of the lines in pixels"""
+    #numpy is only needed here, SVG output does not pay for importing it
+    import numpy as np
+
+    width = int(math.ceil((coil.maxX + 2)*pixelsPerMM))
+    height = int(math.ceil((coil.maxY + 2)*pixelsPerMM))
+    image = np.full((height, width), 255, dtype = np.uint8)
+
+    step = 0.5/pixelsPerMM
+    xs = []
+    ys = []
+    for (x0, y0), segments in coilSegments(coil):
+        for kind, x, y, i, j in segments:
+            if kind == STRAIGHT:
+                n = max(2, int(math.hypot(x - x0, y - y0)/step) + 1)
+                t = np.linspace(0, 1, n)
+                xs.append(x0 + t*(x - x0))
+                ys.append(y0 + t*(y - y0))
+            else:
+                r = math.sqrt(i**2 + j**2)
+                sweep = _sweep(x0, y0, kind, x, y, i, j)
+                n = max(2, int(r*sweep/step) + 1)
+                start = math.atan2(-j, -i)
+                angles = start + np.linspace(0, sweep if kind == COUNTERCLOCKWISE else -sweep, n)
+                xs.append(x0 + i + r*np.cos(angles))
+                ys.append(y0 + j + r*np.sin(angles))
+            x0, y0 = x, y
+
+    if xs:
+        px = np.concatenate(xs)*pixelsPerMM + pixelsPerMM
+        py = height - 1 - (np.concatenate(ys)*pixelsPerMM + pixelsPerMM)
+        half = lineWidth/2.
+        for dx in np.arange(-half, half + 0.5, 1.):
+            for dy in np.arange(-half, half + 0.5, 1.):
+                u = np.clip(np.round(px + dx).astype(int), 0, width - 1)
+                v = np.clip(np.round(py + dy).astype(int), 0, height - 1)
+                image[v, u] = 0
+
+    writePNG(filename, image)
+
+
+def writePNG(filename, image):
+    """Write a 2D uint8 numpy array as a grayscale PNG file."""
+    height, width = image.shape
+    #every row starts with filter type 0
+    raw = b"".join(b"\x00" + image[row].tobytes() for row in range(height))
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+
+    f = open(filename, "wb")
+    f.write(b"\x89PNG\r\n\x1a\n")
+    f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)))
+    f.write(chunk(b"IDAT", zlib.compress(raw, 6)))
+    f.write(chunk(b"IEND", b""))
+    f.close()
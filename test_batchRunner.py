@@ -0,0 +1,37 @@
+import shutil
+import tempfile
+import unittest
+
+from batchRunner import normalizeSpec, invalidSpec, runBatch
+
+
+class RunBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_failing_jobs_do_not_stop_the_batch(self):
+        rows = [{"name" : "good", "h" : "12", "r" : "6", "alpha" : "120", "width" : "2.5", "cutterDiameter" : "1", "cornerRadius" : "1"},
+                {"name" : "degenerate", "h" : "4", "r" : "6", "alpha" : "120", "width" : "3", "cutterDiameter" : "1", "cornerRadius" : "1.5"},
+                {"name" : "unreadable", "h" : "abc", "r" : "6", "alpha" : "120", "width" : "2.5", "cutterDiameter" : "1"}]
+        specs = []
+        for i, row in enumerate(rows):
+            try:
+                specs.append(normalizeSpec(row, i))
+            except Exception as e:
+                specs.append(invalidSpec(row, i, e))
+
+        result = runBatch(specs, self.directory, processes = 1, manifest = "")
+        self.assertEqual(result["succeeded"], 1)
+        self.assertEqual(result["failed"], 2)
+        status = dict((e["name"], e) for e in result["jobs"])
+        self.assertEqual(status["good"]["status"], "ok")
+        self.assertTrue(status["degenerate"]["error"].startswith("ZeroDivisionError"))
+        self.assertTrue(status["unreadable"]["error"].startswith("ValueError"))
+
+
+if __name__ == "__main__":
+    unittest.main()
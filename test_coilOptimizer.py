@@ -0,0 +1,28 @@
+import unittest
+
+from coilOptimizer import CoilOptimizer, evaluate
+
+
+class EvaluateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.optimizer = CoilOptimizer(6, 1, 3, 1, processes = 1, gridPoints = 5)
+
+    def test_degenerate_candidate_is_not_feasible(self):
+        #the geometry of this design cannot be computed (division by zero)
+        parameters = {"h" : 4, "alpha" : 120, "width" : 3, "cornerRadius" : 1.5}
+        result = evaluate((parameters, self.optimizer.settings))
+        self.assertFalse(result["feasible"])
+        self.assertIn("Error", result["reason"])
+
+    def test_degenerate_candidate_does_not_stop_the_batch(self):
+        good = {"h" : 12, "alpha" : 120, "width" : 2, "cornerRadius" : 1.5}
+        bad = {"h" : 4, "alpha" : 120, "width" : 3, "cornerRadius" : 1.5}
+        results = self.optimizer.evaluate([good, bad])
+        self.assertEqual(len(results), 2)
+        self.assertFalse(results[1]["feasible"])
+        self.assertEqual(self.optimizer.stats["evaluations"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from StringIO import StringIO
+
+from batchCalculator import SaddleCoilBatch
+from coilCalculator import SaddleCoil
+from designCatalog import DesignCatalog, batchEntries, designEntry, main
+
+COMPARED = ["key", "h", "r", "alpha", "width", "cutterDiameter", "cornerRadius", "maxX", "maxY", "cutLength",
+            "segments", "arcs", "gcodeSha1"]
+
+
+class DesignCatalogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_batch_entries_match_single_entries(self):
+        batch = SaddleCoilBatch([12, 14], [6, 7], [120, 110], [2.5, 2], [1, 1], cornerRadius = [1, 1.5])
+        for k, entry in enumerate(batchEntries(batch)):
+            parameters = {"h" : batch.h[k], "r" : batch.r[k], "alpha" : batch.alpha[k], "width" : batch.width[k],
+                          "cutterDiameter" : batch.cD[k], "cornerRadius" : batch.cornerRadius[k]}
+            single = designEntry(SaddleCoil, dict((p, float(v)) for p, v in parameters.items()))
+            for column in COMPARED:
+                if isinstance(single[column], float):
+                    self.assertAlmostEqual(entry[column], single[column], 9, column)
+                else:
+                    self.assertEqual(entry[column], single[column], column)
+
+    def test_query_by_range_and_size(self):
+        catalog = DesignCatalog(":memory:")
+        small = catalog.add(SaddleCoil, {"h" : 12, "r" : 6, "alpha" : 120, "width" : 2.5, "cutterDiameter" : 1, "cornerRadius" : 1})
+        catalog.add(SaddleCoil, {"h" : 12, "r" : 9, "alpha" : 120, "width" : 2.5, "cutterDiameter" : 1, "cornerRadius" : 1})
+        self.assertEqual(len(catalog), 2)
+        found = catalog.query(r = (5, 8), fitsIn = (small["maxX"], small["maxY"]))
+        self.assertEqual([e["key"] for e in found], [small["key"]])
+        catalog.close()
+
+    def test_failing_spec_does_not_stop_the_import(self):
+        specs = os.path.join(self.directory, "specs.csv")
+        f = open(specs, "w")
+        f.write("name,h,r,alpha,width,cutterDiameter,cornerRadius\n"
+                "good,12,6,120,2.5,1,1\n"
+                "degenerate,4,6,120,3,1,1.5\n"
+                "also good,12,6,110,2.5,1,1\n")
+        f.close()
+        filename = os.path.join(self.directory, "designs.sqlite")
+
+        stdout, stderr = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = StringIO(), StringIO()
+        try:
+            status = main(["--catalog", filename, "add", specs])
+            errors = sys.stderr.getvalue()
+        finally:
+            sys.stdout, sys.stderr = stdout, stderr
+
+        self.assertEqual(status, 1)
+        self.assertIn("degenerate skipped: ZeroDivisionError", errors)
+        catalog = DesignCatalog(filename)
+        self.assertEqual(sorted(e["name"] for e in catalog.query()), ["also good", "good"])
+        catalog.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
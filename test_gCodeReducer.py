@@ -0,0 +1,34 @@
+import unittest
+
+from coilCalculator import SaddleCoil
+from gCodeReducer import reduceProgram, verifyReduction, trimNumber
+
+
+class ReduceProgramTest(unittest.TestCase):
+
+    def test_coil_round_trip(self):
+        code = SaddleCoil(12, 6, 120, 2.5, 1, cornerRadius = 1).gCode()
+        reduced, report = reduceProgram(code)
+        self.assertTrue(report["verified"])
+        self.assertLess(report["bytesAfter"], report["bytesBefore"])
+        #reducing again changes nothing
+        self.assertEqual(reduceProgram(reduced)[0], reduced)
+
+    def test_collinear_moves_are_merged(self):
+        code = "G1 X0 Y0 Z-1 F5\nG1 X1 Y0\nG1 X2 Y0\nG1 X3 Y0\n"
+        reduced, report = reduceProgram(code)
+        self.assertEqual(report["linesAfter"], 2)
+        self.assertIn("X3", reduced)
+
+    def test_changed_path_is_rejected(self):
+        code = "G1 X0 Y0 Z-1 F5\nG1 X1 Y0\nG1 X2 Y1\n"
+        self.assertFalse(verifyReduction(code, "G1 X0 Y0 Z-1 F5\nG1 X2 Y1\n"))
+
+    def test_trim_number(self):
+        self.assertEqual(trimNumber("14.850"), "14.85")
+        self.assertEqual(trimNumber("5.00"), "5")
+        self.assertEqual(trimNumber("-0.000"), "0")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+
+from coilCalculator import SaddleCoil
+from passPlanner import Tool
+from jobScheduler import Job, JobScheduler
+
+
+def standardCoil():
+    return SaddleCoil(12, 6, 120, 2.5, 1, cornerRadius = 1)
+
+
+def compactCoil():
+    return SaddleCoil(8, 2.05, 100, 1.5, 1, cornerRadius = 1, compact = True)
+
+
+def wireCoil():
+    return SaddleCoil(11, 7.5, 120, 3, 0, cornerRadius = 1, legLength = 35)
+
+
+class ScheduleTest(unittest.TestCase):
+
+    def batches(self):
+        roughed = Job(SaddleCoil(12, 6, 110, 2.5, 1, cornerRadius = 1), depth = 1.,
+                      tools = [Tool(2., 600, 0.5), Tool(1., 300, 0.2, finishStepDown = 1.)])
+        return [[Job(standardCoil()), Job(compactCoil()), roughed],
+                [Job(standardCoil()), Job(wireCoil(), feed = 3.5), Job(compactCoil()), Job(wireCoil(), feed = 3.5),
+                 Job(standardCoil()), Job(SaddleCoil(11, 7.5, 120, 3, 1, cornerRadius = 1, legLength = 35), depth = 1.2,
+                                          tools = [Tool(1.5, 450, 0.4), Tool(1., 300, 0.2, finishStepDown = 1.2)])],
+                [Job(standardCoil(), depth = 0.6, stepDown = 0.2), Job(wireCoil(), feed = 3.5)]*2]
+
+    def test_never_worse_than_coil_by_coil(self):
+        for jobs in self.batches():
+            stats = JobScheduler(150, 100, kerf = 2).schedule(jobs).stats
+            self.assertLessEqual(stats["toolChanges"], stats["naiveToolChanges"])
+            self.assertLessEqual(stats["rapidLength"], stats["naiveRapidLength"] + 1e-9)
+
+    def test_grouping_saves_tool_changes(self):
+        stats = JobScheduler(150, 100, kerf = 2).schedule(self.batches()[1]).stats
+        self.assertGreater(stats["toolChangesAvoided"], 0)
+
+    def test_every_operation_is_cut_once(self):
+        for jobs in self.batches():
+            schedule = JobScheduler(150, 100, kerf = 2).schedule(jobs)
+            expected = sum(len(j.operations()) for j in jobs)
+            self.assertEqual(sum(len(b.items) for blocks in schedule.blocks for b in blocks), expected)
+
+    def test_roughing_before_finishing(self):
+        schedule = JobScheduler(150, 100, kerf = 2).schedule(self.batches()[1])
+        for blocks in schedule.blocks:
+            diameters = [b.tool.diameter for b in blocks if b.tool.diameter > 0]
+            if 1.5 in diameters:
+                self.assertLess(max(k for k, d in enumerate(diameters) if d == 1.5),
+                                min(k for k, d in enumerate(diameters) if d == 1.))
+
+
+if __name__ == "__main__":
+    unittest.main()
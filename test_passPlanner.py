@@ -0,0 +1,39 @@
+import unittest
+
+from coilCalculator import SaddleCoil
+from passPlanner import Tool, compare, planPasses
+from pathOffset import coilOutlines, gouges
+
+
+class PlanTest(unittest.TestCase):
+
+    def setUp(self):
+        self.coil = SaddleCoil(12, 6, 120, 2.5, 1, cornerRadius = 1)
+        self.tools = [Tool(2., 600, 0.5, number = 1), Tool(1., 300, 0.2, finishStepDown = 1., number = 2)]
+
+    def test_wide_tool_roughs_where_it_fits(self):
+        result = compare(self.coil, self.tools, depth = 1.)
+        self.assertGreater(result["timeSaved"], 0)
+        kinds = [p.kind for p in result["plan"].passes]
+        self.assertIn("roughing", kinds)
+        #the 2 mm tool is wider than the slot somewhere on the trace
+        self.assertTrue(any(outline == 0 for tool, outline, distance in result["plan"].rejected))
+
+    def test_passes_keep_off_the_copper(self):
+        outlines = coilOutlines(self.coil)
+        plan = planPasses(outlines, self.tools, 1.)
+        for p in plan.passes:
+            distance, positions = gouges(p.toolpath, outlines, p.tool.diameter/2.)
+            self.assertEqual(len(positions), 0)
+
+    def test_finisher_reaches_full_depth_everywhere(self):
+        outlines = coilOutlines(self.coil)
+        plan = planPasses(outlines, self.tools, 1.)
+        for k, outline in enumerate(outlines):
+            finishing = [p for p in plan.passes if p.kind == "finishing" and p.outline == k]
+            self.assertEqual(sum(len(p.toolpath) for p in finishing), len(outline.offset(0.5).toToolpath()))
+            self.assertTrue(all(p.depths[-1] == 1. for p in finishing))
+
+
+if __name__ == "__main__":
+    unittest.main()
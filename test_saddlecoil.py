@@ -0,0 +1,42 @@
+import sys
+import unittest
+
+from StringIO import StringIO
+
+from saddlecoil import runLines
+
+
+class RunLinesTest(unittest.TestCase):
+
+    def runBatch(self, lines):
+        stdout = StringIO()
+        stderr = StringIO()
+        failed = runLines(lines, stdout = stdout, stderr = stderr)
+        return failed, stdout.getvalue(), stderr.getvalue()
+
+    def test_bad_lines_do_not_stop_the_batch(self):
+        lines = ["gcode 12 6 120 2.5 1 --corner-radius 1 -o -",
+                 "gcode 4 6 120 3 1 --corner-radius 1.5 -o -",
+                 "gcode 12 6 120 2.5 1 --corner-radius 0.5 -o -",
+                 "gcode twelve 6 120 2.5 1 -o -",
+                 "gcode 12 6 110 2.5 1 --corner-radius 1 -o -"]
+        failed, stdout, stderr = self.runBatch(lines)
+        self.assertEqual(failed, 3)
+        self.assertEqual(stdout.count("M10 O6.0"), 2)
+        self.assertIn("line 2: ZeroDivisionError", stderr)
+        self.assertIn("line 3:", stderr)
+        self.assertIn("line 4:", stderr)
+
+    def test_help_in_a_line(self):
+        realStdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            failed, stdout, stderr = self.runBatch(["gcode --help", "gcode 12 6 120 2.5 1 --corner-radius 1 -o -"])
+        finally:
+            sys.stdout = realStdout
+        self.assertEqual(failed, 0)
+        self.assertEqual(stdout.count("M10 O6.0"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+
+from coilCalculator import SaddleCoil
+from sheetNesting import SheetNester, coilSize
+
+
+class PackTest(unittest.TestCase):
+
+    def setUp(self):
+        self.coil = SaddleCoil(12, 6, 120, 2.5, 1, cornerRadius = 1)
+
+    def assertInside(self, sheets, kerf):
+        for sheet in sheets:
+            for p in sheet.placements:
+                self.assertGreaterEqual(p.x, kerf - 1e-9)
+                self.assertGreaterEqual(p.y, kerf - 1e-9)
+                self.assertLessEqual(p.x + p.width + kerf, sheet.width + 1e-9)
+                self.assertLessEqual(p.y + p.height + kerf, sheet.height + 1e-9)
+
+    def test_coil_that_fits_only_rotated(self):
+        w, h = coilSize(self.coil)
+        self.assertGreater(w, h)
+        for strategy in ("shelf", "maxrects"):
+            sheets = SheetNester(h + 4, w + 4, kerf = 1, strategy = strategy).pack([self.coil])
+            self.assertEqual(len(sheets), 1)
+            self.assertTrue(sheets[0].placements[0].rotated, strategy)
+            self.assertInside(sheets, 1)
+
+    def test_many_coils_stay_on_the_sheet(self):
+        coils = [self.coil, SaddleCoil(8, 4, 110, 2, 1, cornerRadius = 1)]*5
+        for strategy in ("shelf", "maxrects"):
+            for rotation in (True, False):
+                sheets = SheetNester(80, 60, kerf = 2, allowRotation = rotation, strategy = strategy).pack(coils)
+                self.assertEqual(sum(len(s.placements) for s in sheets), len(coils))
+                self.assertInside(sheets, 2)
+
+    def test_coil_too_large(self):
+        self.assertRaises(ValueError, SheetNester(20, 20).pack, [self.coil])
+
+
+if __name__ == "__main__":
+    unittest.main()
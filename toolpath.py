@@ -0,0 +1,254 @@
+import numpy as np
+
+from coilCalculator import Coordinate, Path, Straight, ClockwiseArc, CounterClockwiseArc, STRAIGHT, CLOCKWISE, COUNTERCLOCKWISE
+
+#Compact, array backed representation of a Path.
+#
+#A Path holds one Straight, ClockwiseArc or CounterClockwiseArc object per segment, and every one of them
+#holds its own Coordinate objects. For batches of coils or whole sheets this object graph is large and slow.
+#A Toolpath stores the same information in a single structured numpy array with one record per segment.
+
+#kind: one of STRAIGHT, CLOCKWISE, COUNTERCLOCKWISE (see coilCalculator.Path.segments)
+#x, y: destination of the segment
+#i, j: offset of the arc center relative to the start of the segment (zero for straight segments)
+SEGMENT = np.dtype([("kind", np.int8), ("x", np.float64), ("y", np.float64), ("i", np.float64), ("j", np.float64)])
+
+
+class Toolpath(object):
+    """A path stored as a structured numpy array of segments.
+
+    Produces the same gCode and tikzCode output as the Path it was created from."""
+
+    __slots__ = ["p0", "segments"]
+
+    def __init__(self, p0, segments = None):
+        """- p0: starting point of the path, a Coordinate or a tuple (x, y)
+        - segments: optional, structured array with dtype SEGMENT"""
+        if isinstance(p0, Coordinate):
+            p0 = (p0.x, p0.y)
+        self.p0 = (float(p0[0]), float(p0[1]))
+
+        if segments is None:
+            segments = np.zeros(0, dtype = SEGMENT)
+        self.segments = segments
+
+    def __len__(self):
+        return len(self.segments)
+
+    @classmethod
+    def fromPath(cls, path):
+        """Convert a Path into a Toolpath."""
+        return cls(path.p0, np.array(path.segments(), dtype = SEGMENT))
+
+    @classmethod
+    def fromBatch(cls, batch, k):
+        """Return the two cuts of design k of a SaddleCoilBatch as Toolpaths, without building Path objects."""
+        return [cls._fromArcs(batch.points[k], batch.arcStarts[k], batch.arcStops[k], batch.arcOffsets[k], batch.clockwise[k]),
+                cls._fromArcs(batch.points2[k], batch.arcStarts2[k], batch.arcStops2[k], batch.arcOffsets2[k], batch.clockwise2[k])]
+
+    @classmethod
+    def _fromArcs(cls, points, arcStarts, arcStops, arcOffsets, clockwise):
+        #every corner contributes a straight segment to the start of its arc followed by the arc
+        segments = np.zeros(2*len(points), dtype = SEGMENT)
+        segments["kind"][0::2] = STRAIGHT
+        segments["x"][0::2] = arcStarts[:, 0]
+        segments["y"][0::2] = arcStarts[:, 1]
+
+        segments["kind"][1::2] = np.where(clockwise, CLOCKWISE, COUNTERCLOCKWISE)
+        segments["x"][1::2] = arcStops[:, 0]
+        segments["y"][1::2] = arcStops[:, 1]
+        segments["i"][1::2] = arcOffsets[:, 0]
+        segments["j"][1::2] = arcOffsets[:, 1]
+        return cls(points[0], segments)
+
+    def toPath(self):
+        """Convert the Toolpath into a Path made of Straight and Arc objects."""
+        path = Path(Coordinate(*self.p0))
+        for s in self.segments:
+            destination = Coordinate(float(s["x"]), float(s["y"]))
+            if s["kind"] == STRAIGHT:
+                path.path.append(Straight(destination))
+            elif s["kind"] == CLOCKWISE:
+                path.path.append(ClockwiseArc(destination, float(s["i"]), float(s["j"])))
+            else:
+                path.path.append(CounterClockwiseArc(destination, float(s["i"]), float(s["j"])))
+        return path
+
+    def startPoints(self):
+        """Return the (n, 2) array of the starting points of all segments."""
+        start = np.empty((len(self.segments), 2))
+        start[:1] = self.p0
+        start[1:, 0] = self.segments["x"][:-1]
+        start[1:, 1] = self.segments["y"][:-1]
+        return start
+
+    def translated(self, dx, dy):
+        """Return a copy of the path shifted by dx, dy."""
+        segments = self.segments.copy()
+        segments["x"] += dx
+        segments["y"] += dy
+        return Toolpath((self.p0[0] + dx, self.p0[1] + dy), segments)
+
+    def rotated90(self):
+        """Return a copy of the path rotated by 90 degrees counterclockwise about the origin.
+
+        The rotation keeps the orientation, so clockwise arcs stay clockwise."""
+        segments = self.segments.copy()
+        segments["x"], segments["y"] = -self.segments["y"], self.segments["x"]
+        segments["i"], segments["j"] = -self.segments["j"], self.segments["i"]
+        return Toolpath((-self.p0[1], self.p0[0]), segments)
+
+    def arcs(self):
+        """Return the geometry of all segments as arrays (start, radius, startAngle, sweep).
+
+        start: (n, 2) starting points, radius: arc radius, startAngle: angle of the start point as seen from the arc
+        center in radians, sweep: angle swept in the direction of the arc (0 to 2 pi). Meaningless for straight segments."""
+        start = self.startPoints()
+        s = self.segments
+        radius = np.sqrt(s["i"]**2 + s["j"]**2)
+        #sweep angle from the start and end vectors as seen from the arc center
+        startAngle = np.arctan2(-s["j"], -s["i"])
+        stopAngle = np.arctan2(s["y"] - (start[:, 1] + s["j"]), s["x"] - (start[:, 0] + s["i"]))
+        sweep = np.where(s["kind"] == COUNTERCLOCKWISE, stopAngle - startAngle, startAngle - stopAngle) % (2*np.pi)
+        return start, radius, startAngle, sweep
+
+    def length(self):
+        """Return the total cutting length of the path in mm."""
+        start, radius, startAngle, sweep = self.arcs()
+        s = self.segments
+        dx = s["x"] - start[:, 0]
+        dy = s["y"] - start[:, 1]
+        chord = np.sqrt(dx**2 + dy**2)
+
+        return float(np.sum(np.where(s["kind"] == STRAIGHT, chord, radius*sweep)))
+
+    def linearized(self, tolerance, maxSegments = None):
+        """Return a copy of the path in which every arc is replaced by straight chords. See linearize."""
+        return linearize([self], tolerance, maxSegments)[0][0]
+
+    def _chords(self, counts, start, radius, startAngle, sweep):
+        """Replace segment n by counts[n] straight segments, arcs by equal chords."""
+        s = self.segments
+        total = int(counts.sum())
+        owner = np.repeat(np.arange(len(s)), counts)
+        #k = 1 .. counts[n] within every original segment
+        k = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts) + 1
+
+        direction = np.where(s["kind"] == COUNTERCLOCKWISE, 1., -1.)[owner]
+        angle = startAngle[owner] + direction*sweep[owner]*k/counts[owner].astype(float)
+        segments = np.zeros(total, dtype = SEGMENT)
+        segments["x"] = start[owner, 0] + s["i"][owner] + radius[owner]*np.cos(angle)
+        segments["y"] = start[owner, 1] + s["j"][owner] + radius[owner]*np.sin(angle)
+
+        #the last chord (and every straight segment) ends exactly at the original destination
+        last = k == counts[owner]
+        segments["x"][last] = s["x"][owner[last]]
+        segments["y"][last] = s["y"][owner[last]]
+        return Toolpath(self.p0, segments)
+
+    def gCodeLines(self, feed = 7.5, depth = 0.3):
+        """Yield the gCode of the path line by line, identical to Path.gCodeLines.
+
+        - feed: optional, specify feed for cutting operations (defaults to 7.5)
+        - depth: optional, depth of the cut in mm (defaults to 0.3)
+        """
+        yield "G0 Z5\n"
+        yield "G0 X{0:.3f} Y{1:.3f}\n".format(*self.p0)
+        yield "G0 Z0.5\n"
+        yield "G01 Z-{0} F{1:.3f}\n".format("{0:.3f}".format(depth).rstrip("0").rstrip("."), feed)
+
+        for kind, x, y, i, j in self.segments.tolist():
+            if kind == STRAIGHT:
+                yield "G1 X{0:.3f} Y{1:.3f}\n".format(x, y)
+            else:
+                yield "G{0} X{1:.3f} Y{2:.3f} I{3:.3f} J{4:.3f}\n".format(kind + 1, x, y, i, j)
+
+        yield "G0 Z5\n"
+
+    def gCode(self, feed = 7.5, depth = 0.3):
+        """Return the gCode of the path, identical to Path.gCode.
+
+        - feed: optional, specify feed for cutting operations (defaults to 7.5)
+        - depth: optional, depth of the cut in mm (defaults to 0.3)
+        """
+        return "".join(self.gCodeLines(feed, depth))
+
+    def tikzCode(self):
+        """Return the TikZ code of the path, identical to Path.tikzCode."""
+        s = self.segments
+        r = np.sqrt(s["i"]**2 + s["j"]**2)
+        start = (np.angle(s["i"] + 1j*s["j"])/np.pi*180 + 180) % 360
+        stop = np.where(s["kind"] == COUNTERCLOCKWISE, start + 90, start - 90)
+
+        code = ["\draw ({0:.3f},{1:.3f}) ".format(*self.p0)]
+        for n in range(len(s)):
+            if s["kind"][n] == STRAIGHT:
+                code.append(" -- ({0:.3f}, {1:.3f})".format(s["x"][n], s["y"][n]))
+            else:
+                code.append(" arc ({0}:{1}:{2})".format(start[n], stop[n], r[n]))
+        code.append(";\n")
+        return "".join(code)
+
+
+def chordCounts(radius, sweep, tolerance):
+    """Return the fewest number of equal chords for arcs of the given radius and sweep (in radians), such that no chord
+    is further than tolerance from its arc."""
+    ratio = np.clip(1 - tolerance/np.maximum(radius, 1e-12), -1, 1)
+    #largest angle that one chord may span
+    step = 2*np.arccos(ratio)
+    return np.maximum(np.ceil(sweep/np.maximum(step, 1e-12) - 1e-9), 1).astype(int)
+
+
+def linearize(toolpaths, tolerance, maxSegments = None):
+    """Replace all arcs of a program by straight chords, for controllers that do not handle G2/G3.
+
+    Every arc gets the fewest equal chords that stay within tolerance (in mm) of the arc. The chords lie inside the
+    arc, their ends are on it. All arcs of all toolpaths are computed at once.
+
+    - toolpaths: list of Toolpaths that form one program
+    - tolerance: largest distance in mm between a chord and its arc
+    - maxSegments: optional limit for the number of segments of the program. If the tolerance needs more segments,
+      it is increased until the program fits.
+
+    Returns the list of linearized Toolpaths and a report with tolerance (the one used), maxDeviation, segments and arcs.
+    Raises ValueError if the program does not fit into maxSegments even with one chord per arc."""
+    geometry = [t.arcs() for t in toolpaths]
+    isArc = np.concatenate([t.segments["kind"] != STRAIGHT for t in toolpaths] + [np.zeros(0, dtype = bool)])
+    radius = np.concatenate([g[1] for g in geometry] + [np.zeros(0)])[isArc]
+    sweep = np.concatenate([g[3] for g in geometry] + [np.zeros(0)])[isArc]
+    straights = len(isArc) - len(radius)
+
+    def total(t):
+        return straights + int(chordCounts(radius, sweep, t).sum())
+
+    used = float(tolerance)
+    if maxSegments is not None and total(used) > maxSegments:
+        if straights + len(radius) > maxSegments:
+            raise ValueError("The program needs at least {0} segments, more than maxSegments = {1}.".format(straights + len(radius), maxSegments))
+        #with 2*radius every arc of up to 360 degrees is a single chord
+        lo, hi = used, max(used, 2*float(radius.max()))
+        for n in range(60):
+            mid = (lo + hi)/2.
+            if total(mid) > maxSegments:
+                lo = mid
+            else:
+                hi = mid
+        used = hi
+
+    counts = chordCounts(radius, sweep, used)
+    deviation = radius*(1 - np.cos(sweep/(2*counts)))
+
+    result = []
+    offset = 0
+    for t, (start, r, startAngle, s) in zip(toolpaths, geometry):
+        arc = t.segments["kind"] != STRAIGHT
+        c = np.ones(len(t.segments), dtype = int)
+        c[arc] = counts[offset:offset + arc.sum()]
+        offset += arc.sum()
+        result.append(t._chords(c, start, r, startAngle, s))
+
+    report = {"tolerance" : used,
+              "maxDeviation" : float(deviation.max()) if len(deviation) else 0.,
+              "segments" : straights + int(counts.sum()),
+              "arcs" : len(radius)}
+    return result, report